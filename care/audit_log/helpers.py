@@ -1,5 +1,10 @@
 # ruff: noqa: SLF001
+import copy
+import random
 import re
+import threading
+import time
+from collections import defaultdict
 from fnmatch import fnmatch
 from functools import lru_cache
 from typing import NamedTuple
@@ -19,16 +24,63 @@ def instance_finder(v):
     )
 
 
-def seperate_hashable_dict(d: dict):
-    non_hashable = {k: v for k, v in d.items() if instance_finder(v)}
-    hashable = {k: v for k, v in d.items() if k not in non_hashable}
-    return hashable, non_hashable
+def get_field_values(instance):
+    """
+    Values of the loaded concrete fields, mutable values are copied so that in
+    place changes to them show up in the diff
+    """
+    values = {}
+    for field in instance._meta.concrete_fields:
+        if field.attname not in instance.__dict__:
+            # deferred
+            continue
+        value = instance.__dict__[field.attname]
+        if instance_finder(value):
+            value = copy.deepcopy(value)
+        values[field.attname] = value
+    return values
+
+
+_snapshot_stats = defaultdict(float)
+_snapshot_stats_lock = threading.Lock()
+
+
+def track_original_values(instance):
+    start = time.perf_counter()
+    instance._dal_original = get_field_values(instance)
+    snapshot_ms = (time.perf_counter() - start) * 1000
+    with _snapshot_stats_lock:
+        _snapshot_stats["snapshots"] += 1
+        _snapshot_stats["snapshot_ms"] += snapshot_ms
+        _snapshot_stats["max_snapshot_ms"] = max(
+            _snapshot_stats["max_snapshot_ms"], snapshot_ms
+        )
 
 
-def get_or_create_meta(instance):
-    if not hasattr(instance._meta, "dal"):
-        instance._meta.dal = MetaDataContainer()
-    return instance
+def get_snapshot_stats():
+    """
+    Returns the in process count and time spent taking the snapshots of audited
+    instances
+    """
+    with _snapshot_stats_lock:
+        return dict(_snapshot_stats)
+
+
+def reset_snapshot_stats():
+    with _snapshot_stats_lock:
+        _snapshot_stats.clear()
+
+
+def get_changes(original: dict, instance, update_fields=None):
+    changes = {
+        attname: value
+        for attname, value in get_field_values(instance).items()
+        if attname not in original or original[attname] != value
+    }
+    if update_fields is not None:
+        attnames = {instance._meta.get_field(name).attname for name in update_fields}
+        changes = {k: v for k, v in changes.items() if k in attnames}
+    return changes
 
 
 def get_model_name(instance):
@@ -98,12 +150,17 @@ def exclude_model(model_name):
     )
 
 
-class MetaDataContainer(dict):
-    def __getattr__(self, item):
-        return self[item]
+@lru_cache
+def get_sample_rate(model_name):
+    for scope, rate in settings.AUDIT_LOG["models"].get("sample_rates", {}).items():
+        if candidate_in_scope(model_name, [scope]):
+            return rate
+    return 1
+
 
-    def __setattr__(self, key, value):
-        self[key] = value
+def is_sampled(model_name):
+    rate = get_sample_rate(model_name)
+    return rate >= 1 or random.random() < rate  # noqa: S311
 
 
 class LogJsonEncoder(JSONEncoder):
@@ -8,6 +8,8 @@ from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.http import HttpRequest, HttpResponse
 
+from care.audit_log import writer
+
 
 class RequestInformation(NamedTuple):
     request_id: str
@@ -25,6 +27,8 @@ class AuditLogMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
         AuditLogMiddleware.thread.__dal__ = None
+        AuditLogMiddleware.thread.__dal_events__ = []
+        AuditLogMiddleware.thread.__dal_snapshots__ = 0
 
     @staticmethod
     def is_request():
@@ -77,13 +81,45 @@ class AuditLogMiddleware:
         environ = RequestInformation(*AuditLogMiddleware.thread.__dal__)
         return environ.request
 
+    @staticmethod
+    def add_event(event):
+        """
+        Buffers an audit event of the current request until the request ends
+        """
+        events = getattr(AuditLogMiddleware.thread, "__dal_events__", None)
+        if events is None:
+            events = AuditLogMiddleware.thread.__dal_events__ = []
+        events.append(event)
+
+    @staticmethod
+    def reserve_snapshot():
+        """
+        Counts the instances of the current request snapshotted on load, returns
+        False once AUDIT_LOG_MAX_SNAPSHOTS is reached
+        """
+        snapshots = getattr(AuditLogMiddleware.thread, "__dal_snapshots__", 0)
+        if snapshots >= settings.AUDIT_LOG_MAX_SNAPSHOTS:
+            return False
+        AuditLogMiddleware.thread.__dal_snapshots__ = snapshots + 1
+        return True
+
+    @staticmethod
+    def flush_events():
+        events = getattr(AuditLogMiddleware.thread, "__dal_events__", None)
+        AuditLogMiddleware.thread.__dal_events__ = []
+        writer.flush(events)
+
     def __call__(self, request: HttpRequest):
         if request.method.lower() == "get":
             return self.get_response(request)
 
         self.save(request)
-        response: HttpResponse = self.get_response(request)
-        self.save(request, response)
+        try:
+            response: HttpResponse = self.get_response(request)
+            self.save(request, response)
+        finally:
+            self.flush_events()
+            self.cleanup()
 
         if getattr(request.user, "is_alternative_login", False):
             current_user_str = f"patient|{request.user.phone_number[-4:]}"
@@ -114,3 +150,4 @@ class AuditLogMiddleware:
         :return: -
         """
         AuditLogMiddleware.thread.__dal__ = None
+        AuditLogMiddleware.thread.__dal_snapshots__ = 0
@@ -1,23 +1,21 @@
 # ruff: noqa: SLF001
-import json
 import logging
 from typing import NamedTuple
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import transaction
-from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
 
 from care.audit_log.enums import Operation
 from care.audit_log.helpers import (
-    LogJsonEncoder,
     exclude_model,
+    get_changes,
+    get_field_values,
     get_model_name,
-    get_or_create_meta,
+    is_sampled,
     remove_non_member_fields,
-    seperate_hashable_dict,
+    track_original_values,
 )
 from care.audit_log.middleware import AuditLogMiddleware
 
@@ -29,59 +27,59 @@ class Event(NamedTuple):
     actor: AbstractUser
     entity_id: int | str
     changes: dict
+    operation: Operation = Operation.UPDATE
+    request_id: str | None = None
 
 
-@receiver(pre_delete, weak=False)
-@receiver(pre_save, weak=False)
-@transaction.atomic
-def pre_save_signal(sender, instance, **kwargs) -> None:
+def get_audited_model_name(instance):
+    """
+    Returns the model name when changes to the instance are audited
+    """
     if not settings.AUDIT_LOG_ENABLED:
-        return
+        return None
 
     if not AuditLogMiddleware.is_request():
         logger.debug("Not a request")
-        return
+        return None
 
     model_name = get_model_name(instance)
     if exclude_model(model_name):
         logger.debug("%s ignored as per settings", model_name)
-        return
+        return None
+    return model_name
 
-    get_or_create_meta(instance)
-    instance._meta.dal.event = None
 
-    operation = Operation.UPDATE
-    try:
-        pre = sender.objects.get(pk=instance.pk)
-    except ObjectDoesNotExist:
-        # __dict__ is used on pre, therefore we need to create a function
-        # that uses __dict__ too, but returns nothing.
+@receiver(post_init, weak=False)
+def post_init_signal(sender, instance, **kwargs) -> None:
+    # The values an instance is loaded with are the base of its diff on save,
+    # so that saving does not have to read the row again. Requests loading more
+    # than AUDIT_LOG_MAX_SNAPSHOTS instances read the row of the others on save.
+    if get_audited_model_name(instance) and AuditLogMiddleware.reserve_snapshot():
+        track_original_values(instance)
 
-        pre = lambda _: None  # noqa: E731
-        operation = Operation.INSERT
 
-    changes = {}
+@receiver(pre_save, weak=False)
+def pre_save_signal(sender, instance, update_fields=None, **kwargs) -> None:
+    model_name = get_audited_model_name(instance)
+    if not model_name:
+        return
 
-    if operation not in {Operation.INSERT, Operation.DELETE}:
-        old, new = (
-            remove_non_member_fields(pre.__dict__),
-            remove_non_member_fields(instance.__dict__),
-        )
+    instance._dal_event = None
+
+    if not is_sampled(model_name):
+        logger.debug("%s not sampled", model_name)
+        return
 
-        try:
-            changes = dict(set(new.items()).difference(old.items()))
-        except TypeError:  # handle non-hashable types
-            old_hashable, old_non_hashable = seperate_hashable_dict(old)
-            new_hashable, new_non_hashable = seperate_hashable_dict(new)
-
-            changes = dict(set(new_hashable.items()).difference(old_hashable.items()))
-            changes.update(
-                {
-                    k: v
-                    for k, v in new_non_hashable.items()
-                    if v != old_non_hashable.get(k)
-                }
-            )
+    operation = Operation.INSERT if instance._state.adding else Operation.UPDATE
+    changes = {}
+
+    if operation == Operation.UPDATE:
+        original = getattr(instance, "_dal_original", None)
+        if original is None:
+            # Loaded before the request started or created with an existing pk
+            pre = sender._base_manager.filter(pk=instance.pk).first()
+            original = get_field_values(pre) if pre else {}
+        changes = get_changes(original, instance, update_fields)
 
         excluded_fields = settings.AUDIT_LOG["models"]["exclude"]["fields"].get(
             model_name, []
@@ -94,81 +92,52 @@ def pre_save_signal(sender, instance, **kwargs) -> None:
             logger.debug("No changes for model. Ignoring.")
             return
 
-    current_user = AuditLogMiddleware.get_current_user()
-
-    instance._meta.dal.event = Event(
+    instance._dal_event = Event(
         model=model_name,
-        actor=current_user,
+        actor=AuditLogMiddleware.get_current_user(),
         entity_id=instance.pk,
         changes=changes,
-    )
-
-
-def _post_processor(instance, event: Event | None, operation: Operation):
-    request_id = AuditLogMiddleware.get_current_request_id()
-    actor = AuditLogMiddleware.get_current_user()
-    model_name = get_model_name(instance)
-
-    if not event and operation != Operation.DELETE:
-        logger.debug("Event not received for %s. Ignoring.", operation)
-        return
-
-    try:
-        if operation == Operation.DELETE:
-            changes = instance.__dict__
-            if "_state" in changes:
-                del changes["_state"]
-        else:
-            changes = json.dumps(event.changes if event else {}, cls=LogJsonEncoder)
-    except Exception:
-        logger.warning("Failed to log %s", event, exc_info=True)
-        return
-
-    logger.info(
-        "AUDIT_LOG::%s|%s|%s|%s|ID:%s|%s",
-        request_id,
-        actor,
-        operation.value,
-        model_name,
-        instance.pk,
-        changes,
+        operation=operation,
+        request_id=AuditLogMiddleware.get_current_request_id(),
     )
 
 
 @receiver(post_save, weak=False)
 def post_save_signal(sender, instance, created, update_fields: frozenset, **kwargs):
-    if not settings.AUDIT_LOG_ENABLED:
+    if not get_audited_model_name(instance):
         return
 
-    if not AuditLogMiddleware.is_request():
-        logger.debug("Not a request")
-        return
+    # The saved state is the base of the next diff
+    track_original_values(instance)
 
-    model_name = get_model_name(instance)
-    if exclude_model(model_name):
-        logger.debug("Ignoring %s.", model_name)
+    event = getattr(instance, "_dal_event", None)
+    if not event:
+        logger.debug("Event not received for %s. Ignoring.", get_model_name(instance))
         return
-
-    operation = Operation.INSERT if created else Operation.UPDATE
-    get_or_create_meta(instance)
-
-    event = instance._meta.dal.event
-    _post_processor(instance, event, operation)
+    if created:
+        # The pk is assigned by the insert
+        event = event._replace(entity_id=instance.pk)
+    instance._dal_event = None
+    AuditLogMiddleware.add_event(event)
 
 
 @receiver(post_delete, weak=False)
 def post_delete_signal(sender, instance, **kwargs) -> None:
-    if not settings.AUDIT_LOG_ENABLED:
+    model_name = get_audited_model_name(instance)
+    if not model_name:
         return
 
-    if not AuditLogMiddleware.is_request():
-        logger.debug("Not a request")
+    if not is_sampled(model_name):
+        logger.debug("%s not sampled", model_name)
         return
 
-    model_name = get_model_name(instance)
-    if exclude_model(model_name):
-        logger.debug("Ignoring %s.", model_name)
-        return
-
-    event = instance._meta.dal.event
-    _post_processor(instance, event, Operation.DELETE)
+    AuditLogMiddleware.add_event(
+        Event(
+            model=model_name,
+            actor=AuditLogMiddleware.get_current_user(),
+            entity_id=instance.pk,
+            changes=remove_non_member_fields(instance.__dict__),
+            operation=Operation.DELETE,
+            request_id=AuditLogMiddleware.get_current_request_id(),
+        )
+    )
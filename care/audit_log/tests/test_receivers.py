@@ -0,0 +1,158 @@
+import copy
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.client import RequestFactory
+from model_bakery import baker
+
+from care.audit_log.enums import Operation
+from care.audit_log.helpers import (
+    exclude_model,
+    get_sample_rate,
+    get_snapshot_stats,
+    reset_snapshot_stats,
+)
+from care.audit_log.middleware import AuditLogMiddleware
+from care.audit_log.receivers import Event
+from care.audit_log.writer import BackgroundWriter
+from care.emr.models.notes import NoteThread
+
+AUDIT_LOGGER = "care.audit_log.receivers"
+
+
+def get_audit_log(sample_rates):
+    audit_log = copy.deepcopy(settings.AUDIT_LOG)
+    audit_log["models"]["sample_rates"] = sample_rates
+    return audit_log
+
+
+def parse_records(logs):
+    """
+    Splits the audit records into request id, actor, operation, model, id and
+    changes
+    """
+    return [record.getMessage().split("|", 5) for record in logs.records]
+
+
+@override_settings(AUDIT_LOG_ENABLED=True)
+class AuditLogReceiverTest(TestCase):
+    def setUp(self):
+        exclude_model.cache_clear()
+        get_sample_rate.cache_clear()
+        self.addCleanup(get_sample_rate.cache_clear)
+        reset_snapshot_stats()
+        self.user = baker.make("users.User")
+        self.thread = baker.make(NoteThread, title="Admission", meta={"tags": []})
+        self.request = RequestFactory().post("/api/v1/notes/")
+        self.request.user = self.user
+
+    def start_request(self):
+        AuditLogMiddleware.save(self.request)
+        self.addCleanup(AuditLogMiddleware.cleanup)
+        self.addCleanup(setattr, AuditLogMiddleware.thread, "__dal_events__", [])
+
+    def flush(self):
+        with self.assertLogs(AUDIT_LOGGER, "INFO") as logs:
+            AuditLogMiddleware.flush_events()
+        return parse_records(logs)
+
+    def test_update_logs_changed_fields(self):
+        self.start_request()
+        thread = NoteThread.objects.get(id=self.thread.id)
+        thread.title = "Discharge"
+        thread.meta["tags"].append("urgent")
+        # Diffed against the values it was loaded with, the row is not read again
+        with self.assertNumQueries(1):
+            thread.save()
+        [record] = self.flush()
+        self.assertEqual(record[2], Operation.UPDATE.value)
+        self.assertEqual(record[3], "emr.NoteThread")
+        self.assertEqual(record[4], f"ID:{thread.id}")
+        self.assertIn('"title": "Discharge"', record[5])
+        self.assertIn('"meta": {"tags": ["urgent"]}', record[5])
+        self.assertNotIn("patient_id", record[5])
+        self.assertEqual(get_snapshot_stats()["snapshots"], 2)
+
+    def test_update_fields_limit_changes(self):
+        self.start_request()
+        thread = NoteThread.objects.get(id=self.thread.id)
+        thread.title = "Discharge"
+        thread.meta = {"tags": ["urgent"]}
+        thread.save(update_fields=["title"])
+        [record] = self.flush()
+        self.assertIn('"title": "Discharge"', record[5])
+        self.assertNotIn("meta", record[5])
+
+    def test_saves_without_changes_are_not_logged(self):
+        self.start_request()
+        NoteThread.objects.get(id=self.thread.id).save()
+        with self.assertNoLogs(AUDIT_LOGGER):
+            AuditLogMiddleware.flush_events()
+
+    @override_settings(AUDIT_LOG_MAX_SNAPSHOTS=1)
+    def test_instances_past_snapshot_limit_read_row(self):
+        self.start_request()
+        NoteThread.objects.get(id=self.thread.id)
+        thread = NoteThread.objects.get(id=self.thread.id)
+        self.assertFalse(hasattr(thread, "_dal_original"))
+        thread.title = "Discharge"
+        with self.assertNumQueries(2):
+            thread.save()
+        [record] = self.flush()
+        self.assertIn('"title": "Discharge"', record[5])
+        self.assertNotIn("meta", record[5])
+
+    def test_sampled_out_models_are_not_logged(self):
+        self.start_request()
+        with override_settings(AUDIT_LOG=get_audit_log({"plain:emr.NoteThread": 0})):
+            get_sample_rate.cache_clear()
+            self.thread.title = "Discharge"
+            self.thread.save()
+            NoteThread.objects.create(patient=self.thread.patient)
+        with self.assertNoLogs(AUDIT_LOGGER):
+            AuditLogMiddleware.flush_events()
+
+    def test_events_flushed_in_one_batch_at_request_end(self):
+        def get_response(request):
+            self.thread.title = "Discharge"
+            self.thread.save()
+            NoteThread.objects.create(patient=self.thread.patient)
+            # Buffered until the request ends
+            self.assertEqual(len(AuditLogMiddleware.thread.__dal_events__), 2)
+            return HttpResponse()
+
+        middleware = AuditLogMiddleware(get_response)
+        with self.assertLogs(AUDIT_LOGGER, "INFO") as logs:
+            middleware(self.request)
+        records = parse_records(logs)
+        self.assertEqual(
+            [record[2] for record in records],
+            [Operation.UPDATE.value, Operation.INSERT.value],
+        )
+        self.assertEqual(len({record[0] for record in records}), 1)
+        self.assertEqual(AuditLogMiddleware.thread.__dal_events__, [])
+        self.assertFalse(AuditLogMiddleware.is_request())
+
+    def test_background_writer_drains_queued_batches(self):
+        writer = BackgroundWriter()
+        events = [
+            Event(
+                model="emr.NoteThread",
+                actor=self.user,
+                entity_id=entity_id,
+                changes={"title": "Discharge"},
+                request_id="post::test",
+            )
+            for entity_id in range(3)
+        ]
+        with self.assertLogs(AUDIT_LOGGER, "INFO") as logs:
+            writer.write(events[:2])
+            writer.write(events[2:])
+            writer.drain()
+        self.assertEqual(
+            [record[4] for record in parse_records(logs)], ["ID:0", "ID:1", "ID:2"]
+        )
+        self.assertEqual(
+            {record.threadName for record in logs.records}, {"audit-log-writer"}
+        )
@@ -0,0 +1,95 @@
+"""
+Writers of the buffered audit events.
+
+Events are collected per request and handed over in one batch when the request
+ends. The background writer formats and logs the batches on a daemon thread, so
+requests do not wait on the log handlers, pending batches are drained when the
+process exits.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+
+from care.audit_log.enums import Operation
+from care.audit_log.helpers import LogJsonEncoder
+
+# Records keep the logger name they were always emitted with
+logger = logging.getLogger("care.audit_log.receivers")
+
+
+def write_events(events):
+    for event in events:
+        try:
+            if event.operation == Operation.DELETE:
+                changes = event.changes
+            else:
+                changes = json.dumps(event.changes, cls=LogJsonEncoder)
+        except Exception:
+            logger.warning("Failed to log %s", event, exc_info=True)
+            continue
+
+        logger.info(
+            "AUDIT_LOG::%s|%s|%s|%s|ID:%s|%s",
+            event.request_id,
+            event.actor,
+            event.operation.value,
+            event.model,
+            event.entity_id,
+            changes,
+        )
+
+
+class BackgroundWriter:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Threads do not survive a fork, start one per process
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._thread = threading.Thread(
+                    target=self.run, name="audit-log-writer", daemon=True
+                )
+                self._thread.start()
+                self._thread_pid = os.getpid()
+
+    def run(self):
+        while True:
+            events = self._queue.get()
+            try:
+                write_events(events)
+            finally:
+                self._queue.task_done()
+
+    def write(self, events):
+        self.start()
+        self._queue.put(events)
+
+    def drain(self):
+        """
+        Blocks until the queued batches are written
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+
+background_writer = BackgroundWriter()
+atexit.register(background_writer.drain)
+
+
+def flush(events):
+    if not events:
+        return
+    if settings.AUDIT_LOG_BACKGROUND_WRITER:
+        background_writer.write(events)
+    else:
+        write_events(events)
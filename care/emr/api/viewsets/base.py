@@ -1,7 +1,12 @@
 import json
+import time
+from contextlib import contextmanager
+from uuid import UUID
 
-from django.db import transaction
+from django.db import router, transaction
+from django.db.models.signals import post_save, pre_save
 from django.http.response import Http404
+from django.utils import timezone
 from pydantic import ValidationError
 from rest_framework import status
 from rest_framework.decorators import action
@@ -46,6 +51,45 @@ def emr_exception_handler(exc, context):
     return drf_exception_handler(exc, context)
 
 
+def parse_external_id(value):
+    try:
+        return UUID(str(value))
+    except ValueError:
+        return None
+
+
+@contextmanager
+def send_bulk_save_signals(instances, created):
+    """
+    bulk_create and bulk_update skip the save signals, send them around the bulk
+    query so that receivers such as the audit log still see every row
+    """
+    if not instances:
+        yield
+        return
+    sender = type(instances[0])
+    # The database the bulk query is routed to
+    using = router.db_for_write(sender, instance=instances[0])
+    for instance in instances:
+        pre_save.send(
+            sender=sender,
+            instance=instance,
+            raw=False,
+            using=using,
+            update_fields=None,
+        )
+    yield
+    for instance in instances:
+        post_save.send(
+            sender=sender,
+            instance=instance,
+            created=created,
+            raw=False,
+            using=using,
+            update_fields=None,
+        )
+
+
 class EMRQuestionnaireMixin:
     @action(detail=False, methods=["GET"])
     def questionnaire_spec(self, *args, **kwargs):
@@ -63,7 +107,9 @@ class EMRQuestionnaireMixin:
 class EMRRetrieveMixin:
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        data = self.get_retrieve_pydantic_model().serialize(instance, request.user)
+        retrieve_model = self.get_retrieve_pydantic_model()
+        retrieve_model.prefetch_relations([instance])
+        data = retrieve_model.serialize(instance, request.user)
         return Response(data.to_json())
 
 
@@ -74,20 +120,24 @@ class EMRCreateMixin:
         with transaction.atomic():
             instance.save()
             if getattr(self, "CREATE_QUESTIONNAIRE_RESPONSE", False):
-                QuestionnaireResponse.objects.create(
-                    subject_id=self.fetch_patient_from_instance(instance).external_id,
-                    patient=self.fetch_patient_from_instance(instance),
-                    encounter=self.fetch_encounter_from_instance(instance),
-                    structured_responses={
-                        self.questionnaire_type: {
-                            "submit_type": "CREATE",
-                            "id": str(instance.external_id),
-                        }
-                    },
-                    structured_response_type=self.questionnaire_type,
-                    created_by=self.request.user,
-                    updated_by=self.request.user,
-                )
+                self.build_questionnaire_response(instance, "CREATE").save()
+
+    def perform_bulk_create(self, instances):
+        """
+        Bulk counterpart of perform_create, used by the bulk upsert pipeline
+        """
+        for instance in instances:
+            instance.created_by = self.request.user
+            instance.updated_by = self.request.user
+        with transaction.atomic(), send_bulk_save_signals(instances, created=True):
+            self.database_model.objects.bulk_create(instances)
+        if getattr(self, "CREATE_QUESTIONNAIRE_RESPONSE", False):
+            QuestionnaireResponse.objects.bulk_create(
+                [
+                    self.build_questionnaire_response(instance, "CREATE")
+                    for instance in instances
+                ]
+            )
 
     def clean_create_data(self, request_data):
         return request_data
@@ -98,30 +148,33 @@ class EMRCreateMixin:
     def create(self, request, *args, **kwargs):
         return Response(self.handle_create(request.data))
 
-    def handle_create(self, request_data):
+    def prepare_create(self, request_data):
+        """
+        Validates, authorizes and de-serializes the request data, without writing
+        """
         clean_data = self.clean_create_data(request_data)
         instance = self.pydantic_model(**clean_data)
         self.validate_data(instance, None)
         self.authorize_create(instance)
-        model_instance = instance.de_serialize()
+        return instance.de_serialize()
+
+    def handle_create(self, request_data):
+        model_instance = self.prepare_create(request_data)
         self.perform_create(model_instance)
         return self.get_retrieve_pydantic_model().serialize(model_instance).to_json()
 
 
 class EMRListMixin:
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        read_model = self.get_read_pydantic_model()
+        queryset = read_model.get_serialization_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(queryset, request)
         if page is not None:
-            data = [
-                self.get_read_pydantic_model().serialize(obj).to_json() for obj in page
-            ]
-            return paginator.get_paginated_response(data)
-        data = [
-            self.get_read_pydantic_model().serialize(obj).to_json() for obj in queryset
-        ]
-        return Response(data)
+            return paginator.get_paginated_response(read_model.serialize_many(page))
+        return Response(read_model.serialize_many(queryset))
 
 
 class EMRUpdateMixin:
@@ -131,20 +184,32 @@ class EMRUpdateMixin:
         with transaction.atomic():
             instance.save()
             if getattr(self, "CREATE_QUESTIONNAIRE_RESPONSE", False):
-                QuestionnaireResponse.objects.create(
-                    subject_id=self.fetch_patient_from_instance(instance).external_id,
-                    patient=self.fetch_patient_from_instance(instance),
-                    encounter=self.fetch_encounter_from_instance(instance),
-                    structured_responses={
-                        self.questionnaire_type: {
-                            "submit_type": "UPDATE",
-                            "id": str(instance.external_id),
-                        }
-                    },
-                    structured_response_type=self.questionnaire_type,
-                    created_by=self.request.user,
-                    updated_by=self.request.user,
-                )
+                self.build_questionnaire_response(instance, "UPDATE").save()
+
+    def perform_bulk_update(self, instances):
+        """
+        Bulk counterpart of perform_update, used by the bulk upsert pipeline
+        """
+        now = timezone.now()
+        for instance in instances:
+            instance.updated_by = self.request.user
+            # bulk_update does not apply auto_now
+            instance.modified_date = now
+        fields = [
+            field.name
+            for field in self.database_model._meta.concrete_fields  # noqa SLF001
+            if not field.primary_key
+            and field.name not in ("external_id", "created_date", "created_by")
+        ]
+        with transaction.atomic(), send_bulk_save_signals(instances, created=False):
+            self.database_model.objects.bulk_update(instances, fields)
+        if getattr(self, "CREATE_QUESTIONNAIRE_RESPONSE", False):
+            QuestionnaireResponse.objects.bulk_create(
+                [
+                    self.build_questionnaire_response(instance, "UPDATE")
+                    for instance in instances
+                ]
+            )
 
     def clean_update_data(self, request_data, keep_fields: set | None = None):
         if type(request_data) is list:
@@ -163,7 +228,11 @@ class EMRUpdateMixin:
     def authorize_update(self, request_obj, model_instance):
         pass
 
-    def handle_update(self, instance, request_data):
+    def prepare_update(self, instance, request_data):
+        """
+        Validates, authorizes and de-serializes the request data onto the instance,
+        without writing
+        """
         clean_data = self.clean_update_data(request_data)  # From Create
         pydantic_model = self.get_update_pydantic_model()
         serializer_obj = pydantic_model.model_validate(
@@ -171,7 +240,10 @@ class EMRUpdateMixin:
         )
         self.validate_data(serializer_obj, instance)
         self.authorize_update(serializer_obj, instance)
-        model_instance = serializer_obj.de_serialize(obj=instance)
+        return serializer_obj.de_serialize(obj=instance)
+
+    def handle_update(self, instance, request_data):
+        model_instance = self.prepare_update(instance, request_data)
         self.perform_update(model_instance)
         return self.get_retrieve_pydantic_model().serialize(model_instance).to_json()
 
@@ -196,9 +268,16 @@ class EMRDestroyMixin:
 
 
 class EMRUpsertMixin:
+    # Viewsets whose datapoints do not depend on each other can opt in to validate
+    # and authorize every datapoint first and then write them with bulk queries
+    BULK_UPSERT = False
+
     @action(detail=False, methods=["POST"])
     def upsert(self, request, *args, **kwargs):
         datapoints = request.data.get("datapoints", [])
+        ids = [str(datapoint["id"]) for datapoint in datapoints if "id" in datapoint]
+        if self.BULK_UPSERT and len(ids) == len(set(ids)):
+            return self.bulk_upsert(datapoints)
         results = []
         errored = False
         try:
@@ -222,6 +301,62 @@ class EMRUpsertMixin:
             return Response(results, status=400)
         return Response(results)
 
+    def get_upsert_queryset(self):
+        return self.database_model.objects.all()
+
+    def prefetch_update_authorization(self, instances):
+        """
+        Called with the existing instances of a bulk upsert before they are
+        authorized one by one, viewsets can answer the whole batch at once and
+        leave the answers in the request memo
+        """
+
+    def bulk_upsert(self, datapoints):
+        results = [None] * len(datapoints)
+        errored = False
+        creates = []
+        updates = []
+        try:
+            with transaction.atomic():
+                existing = self.get_upsert_queryset().in_bulk(
+                    [
+                        external_id
+                        for datapoint in datapoints
+                        if "id" in datapoint
+                        and (external_id := parse_external_id(datapoint["id"]))
+                    ],
+                    field_name="external_id",
+                )
+                self.prefetch_update_authorization(list(existing.values()))
+                # Validate and authorize every datapoint before writing, so that
+                # repeated authorization checks are answered from the request memo
+                for index, datapoint in enumerate(datapoints):
+                    try:
+                        if "id" in datapoint:
+                            instance = existing.get(parse_external_id(datapoint["id"]))
+                            if not instance:
+                                raise Http404
+                            updates.append(
+                                (index, self.prepare_update(instance, datapoint))
+                            )
+                        else:
+                            creates.append((index, self.prepare_create(datapoint)))
+                    except Exception as e:
+                        errored = True
+                        results[index] = emr_exception_handler(e, {}).data
+                if creates:
+                    self.perform_bulk_create([instance for _, instance in creates])
+                if updates:
+                    self.perform_bulk_update([instance for _, instance in updates])
+                read_model = self.get_retrieve_pydantic_model()
+                for index, instance in creates + updates:
+                    results[index] = read_model.serialize(instance).to_json()
+                if errored:
+                    raise Exception
+        except Exception:
+            return Response(results, status=400)
+        return Response(results)
+
 
 class EMRBaseViewSet(GenericViewSet):
     pydantic_model: EMRResource = None
@@ -258,6 +393,85 @@ class EMRBaseViewSet(GenericViewSet):
             queryset, **{self.lookup_field: self.kwargs[self.lookup_field]}
         )
 
+    def batch_write(self, request, *args, **kwargs):
+        """
+        Entry point used by the batch request engine to run a group of create and
+        update sub-requests against this viewset in a single dispatch, it is not
+        routed. Every operation runs with the action and url kwargs of the original
+        sub-request, in its own savepoint so that a failing operation does not
+        affect the others.
+
+        Viewsets that opt in to BULK_UPSERT validate and authorize every operation
+        first and then write them with perform_bulk_create / perform_bulk_update,
+        as long as no two operations update the same object. Other viewsets run
+        each operation exactly as its create / update action would.
+        """
+        operations = request.data["operations"]
+        update_ids = [
+            str(operation["kwargs"].get(self.lookup_field))
+            for operation in operations
+            if operation["action"] == "update"
+        ]
+        bulk = getattr(self, "BULK_UPSERT", False) and len(update_ids) == len(
+            set(update_ids)
+        )
+        results = []
+        creates = []
+        updates = []
+        for index, operation in enumerate(operations):
+            self.action = operation["action"]
+            self.kwargs = operation["kwargs"]
+            start = time.perf_counter()
+            with transaction.atomic():
+                try:
+                    if not bulk:
+                        data = (
+                            self.handle_create(operation["data"])
+                            if self.action == "create"
+                            else self.handle_update(
+                                self.get_object(), operation["data"]
+                            )
+                        )
+                    elif self.action == "create":
+                        data = None
+                        instance = self.prepare_create(operation["data"])
+                        creates.append((index, instance))
+                    else:
+                        data = None
+                        instance = self.prepare_update(
+                            self.get_object(), operation["data"]
+                        )
+                        updates.append((index, instance))
+                    status_code = status.HTTP_200_OK
+                except Exception as e:
+                    # Handled inside the savepoint, the rollback requested by the
+                    # handler only undoes this operation
+                    response = emr_exception_handler(e, {})
+                    if response is None:
+                        raise
+                    data = response.data
+                    status_code = response.status_code
+            results.append(
+                {
+                    "status_code": status_code,
+                    "data": data,
+                    "duration_ms": (time.perf_counter() - start) * 1000,
+                }
+            )
+        if creates or updates:
+            start = time.perf_counter()
+            if creates:
+                self.perform_bulk_create([instance for _, instance in creates])
+            if updates:
+                self.perform_bulk_update([instance for _, instance in updates])
+            # The bulk queries are shared by every written operation
+            duration = (time.perf_counter() - start) * 1000 / len(creates + updates)
+            read_model = self.get_retrieve_pydantic_model()
+            for index, instance in creates + updates:
+                results[index]["data"] = read_model.serialize(instance).to_json()
+                results[index]["duration_ms"] += duration
+        return Response({"results": results})
+
     def validate_data(self, instance, model_obj=None):
         pass
 
@@ -267,6 +481,23 @@ class EMRBaseViewSet(GenericViewSet):
     def fetch_patient_from_instance(self, instance):
         return instance.patient
 
+    def build_questionnaire_response(self, instance, submit_type):
+        patient = self.fetch_patient_from_instance(instance)
+        return QuestionnaireResponse(
+            subject_id=patient.external_id,
+            patient=patient,
+            encounter=self.fetch_encounter_from_instance(instance),
+            structured_responses={
+                self.questionnaire_type: {
+                    "submit_type": submit_type,
+                    "id": str(instance.external_id),
+                }
+            },
+            structured_response_type=self.questionnaire_type,
+            created_by=self.request.user,
+            updated_by=self.request.user,
+        )
+
 
 class EMRQuestionnaireResponseMixin:
     CREATE_QUESTIONNAIRE_RESPONSE = True
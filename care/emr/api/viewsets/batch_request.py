@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import transaction
 from drf_spectacular.utils import extend_schema
 from pydantic import BaseModel, Field
@@ -16,7 +17,9 @@ class Request(BaseModel):
 
 
 class BatchRequest(BaseModel):
-    requests: list[Request] = Field(..., min_length=1, max_length=20)
+    requests: list[Request] = Field(
+        ..., min_length=1, max_length=settings.BATCH_REQUEST_MAX_REQUESTS
+    )
 
 
 class HandledError(Exception):
@@ -46,6 +49,7 @@ class BatchRequestView(GenericViewSet):
                             "reference_id": requests.requests[loop].reference_id,
                             "data": response["data"],
                             "status_code": response["status_code"],
+                            "duration_ms": round(response["duration_ms"], 2),
                         }
                     )
                     loop += 1
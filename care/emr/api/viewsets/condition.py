@@ -34,6 +34,7 @@ from care.security.authorization import AuthorizationController
 class ValidateEncounterMixin:
     """
     Mixin to validate encounter and its relationship with the patient.
+    To be used along with EncounterBasedAuthorizationBase.
     """
 
     def validate_data(self, instance, model_obj=None):
@@ -41,7 +42,7 @@ class ValidateEncounterMixin:
         if model_obj:
             encounter = model_obj.encounter
         else:
-            encounter = get_object_or_404(Encounter, external_id=instance.encounter)
+            encounter = self.get_encounter_obj(instance.encounter)
 
         if str(encounter.patient.external_id) != self.kwargs["patient_external_id"]:
             raise ValidationError(
@@ -77,11 +78,17 @@ class SymptomViewSet(
     questionnaire_title = "Symptom"
     questionnaire_description = "Symptom"
     questionnaire_subject_type = SubjectType.patient.value
+    BULK_UPSERT = True
 
     def perform_create(self, instance):
         instance.category = CategoryChoices.problem_list_item.value
         super().perform_create(instance)
 
+    def perform_bulk_create(self, instances):
+        for instance in instances:
+            instance.category = CategoryChoices.problem_list_item.value
+        super().perform_bulk_create(instances)
+
     def get_queryset(self):
         # Check if the user has read access to the patient and their EMR Data
         self.authorize_read_encounter()
@@ -118,11 +125,17 @@ class DiagnosisViewSet(
     questionnaire_title = "Diagnosis"
     questionnaire_description = "Diagnosis"
     questionnaire_subject_type = SubjectType.patient.value
+    BULK_UPSERT = True
 
     def perform_create(self, instance):
         instance.category = CategoryChoices.encounter_diagnosis.value
         super().perform_create(instance)
 
+    def perform_bulk_create(self, instances):
+        for instance in instances:
+            instance.category = CategoryChoices.encounter_diagnosis.value
+        super().perform_bulk_create(instances)
+
     def get_queryset(self):
         # Check if the user has read access to the patient and their EMR Data
         self.authorize_read_encounter()
@@ -7,9 +7,12 @@ from care.security.authorization import AuthorizationController
 
 class EncounterBasedAuthorizationBase:
     def get_patient_obj(self):
-        return get_object_or_404(
-            Patient, external_id=self.kwargs["patient_external_id"]
-        )
+        # get_queryset authorizes on every call, fetch the patient once per request
+        if getattr(self, "_patient_obj", None) is None:
+            self._patient_obj = get_object_or_404(
+                Patient, external_id=self.kwargs["patient_external_id"]
+            )
+        return self._patient_obj
 
     def authorize_update(self, request_obj, model_instance):
         if not AuthorizationController.call(
@@ -17,8 +20,35 @@ class EncounterBasedAuthorizationBase:
         ):
             raise PermissionDenied("You do not have permission to update encounter")
 
+    def get_encounter_obj(self, external_id):
+        # Datapoints of an upsert usually share the encounter, fetch it once
+        if getattr(self, "_encounter_objs", None) is None:
+            self._encounter_objs = {}
+        if str(external_id) not in self._encounter_objs:
+            self._encounter_objs[str(external_id)] = get_object_or_404(
+                Encounter.objects.select_related("patient", "current_location"),
+                external_id=external_id,
+            )
+        return self._encounter_objs[str(external_id)]
+
+    def get_upsert_queryset(self):
+        return (
+            super()
+            .get_upsert_queryset()
+            .select_related("encounter__patient", "encounter__current_location")
+        )
+
+    def prefetch_update_authorization(self, instances):
+        # authorize_update then reads the answers from the request memo
+        encounters = {
+            instance.encounter_id: instance.encounter for instance in instances
+        }
+        AuthorizationController.call_many(
+            "can_update_encounter_obj", self.request.user, list(encounters.values())
+        )
+
     def authorize_create(self, instance):
-        encounter = get_object_or_404(Encounter, external_id=instance.encounter)
+        encounter = self.get_encounter_obj(instance.encounter)
         if not AuthorizationController.call(
             "can_update_encounter_obj", self.request.user, encounter
         ):
@@ -220,8 +220,8 @@ class FacilityLocationViewSet(EMRModelViewSet):
         FacilityLocationOrganization.objects.filter(
             location=instance, organization=organization
         ).delete()
-        instance.save()  # Recalculate Metadata
-        instance.cascade_changes()  # Recalculate Metadata for children as well.
+        # Recalculate Metadata for the location and its children
+        instance.sync_organization_cache()
         return Response({})
 
     class FacilityLocationEncounterAssignSpec(BaseModel):
@@ -46,6 +46,7 @@ class MedicationRequestViewSet(
     questionnaire_subject_type = SubjectType.patient.value
     filterset_class = MedicationRequestFilter
     filter_backends = [filters.DjangoFilterBackend]
+    BULK_UPSERT = True
 
     def get_queryset(self):
         self.authorize_read_encounter()
@@ -41,6 +41,7 @@ class MedicationStatementViewSet(
     questionnaire_subject_type = SubjectType.patient.value
     filterset_class = MedicationStatementFilter
     filter_backends = [filters.DjangoFilterBackend]
+    BULK_UPSERT = True
 
     def get_queryset(self):
         self.authorize_read_encounter()
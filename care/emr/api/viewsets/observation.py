@@ -1,6 +1,19 @@
+import datetime
+from datetime import UTC
+
+from django.db.models import (
+    Avg,
+    Count,
+    ExpressionWrapper,
+    IntegerField,
+    Max,
+    Min,
+    Value,
+)
+from django.db.models.functions import Extract, Floor
 from django_filters import rest_framework as filters
 from drf_spectacular.utils import extend_schema
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
@@ -16,7 +29,7 @@ class MultipleCodeFilter(filters.CharFilter):
     def filter(self, qs, value):
         queryset = qs
         if value:
-            queryset = queryset.filter(main_code__code__in=value.split(","))
+            queryset = queryset.filter(main_code_code__in=value.split(","))
         return queryset
 
 
@@ -38,6 +51,19 @@ class ObservationAnalyseRequest(BaseModel):
     page_size: int = Field(10, le=30)
 
 
+class ObservationSeriesRequest(BaseModel):
+    code: Coding
+    start: datetime.datetime
+    end: datetime.datetime
+    buckets: int = Field(100, ge=1, le=1000)
+
+    @model_validator(mode="after")
+    def validate_period(self):
+        if self.start >= self.end:
+            raise ValueError("Start cannot be after End")
+        return self
+
+
 class ObservationViewSet(EncounterBasedAuthorizationBase, EMRModelReadOnlyViewSet):
     database_model = Observation
     pydantic_model = ObservationReadSpec
@@ -67,7 +93,7 @@ class ObservationViewSet(EncounterBasedAuthorizationBase, EMRModelReadOnlyViewSe
         results = []
         for code in request_params.codes:
             code_queryset = queryset.filter(
-                main_code__code=code.code, main_code__system=code.system
+                main_code_code=code.code, main_code_system=code.system
             )[:page_size]
             code_results = [
                 self.get_read_pydantic_model()
@@ -82,3 +108,72 @@ class ObservationViewSet(EncounterBasedAuthorizationBase, EMRModelReadOnlyViewSe
                 }
             )
         return Response({"results": results})
+
+    @extend_schema(
+        request=ObservationSeriesRequest,
+    )
+    @action(methods=["POST"], detail=False)
+    def series(self, request, **kwargs):
+        """
+        Downsampled numeric series of a code, the range is split into equal buckets
+        and every bucket with observations reports their min / max / avg
+        """
+        request_params = ObservationSeriesRequest(**request.data)
+        self.authorize_read_encounter()
+        queryset = Observation.objects.filter(
+            patient__external_id=self.kwargs["patient_external_id"],
+            main_code_system=request_params.code.system,
+            main_code_code=request_params.code.code,
+            effective_datetime__gte=request_params.start,
+            effective_datetime__lt=request_params.end,
+            value_numeric__isnull=False,
+        )
+        if encounter := self.request.GET.get("encounter"):
+            # Same parameter the read is authorized against
+            queryset = queryset.filter(encounter__external_id=encounter)
+        start = request_params.start.timestamp()
+        bucket_size = (request_params.end.timestamp() - start) / request_params.buckets
+        buckets = (
+            queryset.annotate(
+                bucket=ExpressionWrapper(
+                    Floor(
+                        # In UTC, as in the local TIME_ZONE the epoch is shifted
+                        (
+                            Extract("effective_datetime", "epoch", tzinfo=UTC)
+                            - Value(start)
+                        )
+                        / Value(bucket_size)
+                    ),
+                    output_field=IntegerField(),
+                )
+            )
+            .values("bucket")
+            .annotate(
+                min=Min("value_numeric"),
+                max=Max("value_numeric"),
+                avg=Avg("value_numeric"),
+                count=Count("id"),
+            )
+            .order_by("bucket")
+        )
+        results = []
+        for bucket in buckets:
+            bucket_start = start + bucket["bucket"] * bucket_size
+            results.append(
+                {
+                    "start": datetime.datetime.fromtimestamp(bucket_start, tz=UTC),
+                    "end": datetime.datetime.fromtimestamp(
+                        bucket_start + bucket_size, tz=UTC
+                    ),
+                    "min": bucket["min"],
+                    "max": bucket["max"],
+                    "avg": bucket["avg"],
+                    "count": bucket["count"],
+                }
+            )
+        return Response(
+            {
+                "code": request_params.code.model_dump(exclude_defaults=True),
+                "results": results,
+            }
+        )
@@ -1,11 +1,16 @@
 from django_filters import rest_framework as filters
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
 
 from care.emr.api.viewsets.base import EMRModelReadOnlyViewSet
 from care.emr.models import Encounter, Patient
 from care.emr.models.questionnaire import QuestionnaireResponse
-from care.emr.resources.questionnaire_response.spec import QuestionnaireResponseReadSpec
+from care.emr.resources.questionnaire_response.spec import (
+    QuestionnaireResponseListSpec,
+    QuestionnaireResponseReadSpec,
+    get_questionnaire_definitions,
+)
 from care.security.authorization import AuthorizationController
 
 
@@ -65,3 +70,68 @@ class QuestionnaireResponseViewSet(EMRModelReadOnlyViewSet):
         if "only_unstructured" in self.request.GET:
             queryset = queryset.filter(structured_response_type__isnull=True)
         return queryset
+
+    def get_selected_fields(self, read_model):
+        """
+        Fields requested with `?fields=`, all of them when not given
+        """
+        if not self.request.GET.get("fields"):
+            return None
+        fields = [
+            field.strip()
+            for field in self.request.GET["fields"].split(",")
+            if field.strip()
+        ]
+        unknown = [field for field in fields if field not in read_model.model_fields]
+        if unknown:
+            err = f"Unknown fields: {', '.join(unknown)}"
+            raise ValidationError(err)
+        return fields
+
+    def list(self, request, *args, **kwargs):
+        """
+        With `?compact`, responses reference their questionnaire by id and
+        version and every questionnaire of the page is sent once, under
+        `questionnaires`. `?fields=` limits the fields of every response.
+        """
+        compact = "compact" in request.GET
+        read_model = (
+            QuestionnaireResponseListSpec if compact else self.get_read_pydantic_model()
+        )
+        fields = self.get_selected_fields(read_model)
+        if not compact and not fields:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        if fields:
+            # Columns and relations of the other fields are not fetched
+            queryset = read_model.get_fields_queryset(queryset, fields)
+        if compact and (not fields or "questionnaire" in fields):
+            # Definitions are sent once in the side table
+            queryset = queryset.defer(
+                "questionnaire__questions",
+                "questionnaire__styling_metadata",
+                "questionnaire__description",
+            )
+        if not fields:
+            queryset = read_model.get_serialization_queryset(queryset)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request)
+        rows = list(queryset) if page is None else page
+        if fields:
+            results = read_model.serialize_fields(rows, fields)
+        else:
+            results = read_model.serialize_many(rows)
+        if not compact:
+            if page is None:
+                return Response(results)
+            return paginator.get_paginated_response(results)
+        questionnaires = {}
+        if not fields or "questionnaire" in fields:
+            questionnaires = get_questionnaire_definitions(
+                {row.questionnaire_id for row in rows if row.questionnaire_id}
+            )
+        if page is None:
+            return Response({"results": results, "questionnaires": questionnaires})
+        response = paginator.get_paginated_response(results)
+        response.data["questionnaires"] = questionnaires
+        return response
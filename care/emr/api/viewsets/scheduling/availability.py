@@ -1,6 +1,6 @@
 import datetime
-from datetime import time, timedelta
 
+from django.conf import settings
 from django.db import transaction
 from django.db.models import Sum
 from django.utils import timezone
@@ -11,16 +11,21 @@ from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
 from care.emr.api.viewsets.base import EMRBaseViewSet, EMRRetrieveMixin
-from care.emr.models import AvailabilityException, Schedule, TokenBooking
+from care.emr.models import TokenBooking
 from care.emr.models.patient import Patient
 from care.emr.models.scheduling.booking import TokenSlot
-from care.emr.models.scheduling.schedule import Availability, SchedulableUserResource
-from care.emr.resources.scheduling.schedule.spec import SlotTypeOptions
+from care.emr.models.scheduling.schedule import SchedulableUserResource
 from care.emr.resources.scheduling.slot.spec import (
     CANCELLED_STATUS_CHOICES,
     TokenBookingReadSpec,
     TokenSlotBaseSpec,
 )
+from care.emr.utils.slots import (
+    calculate_available_tokens,
+    get_day_slots,
+    is_materialized,
+    materialize_slots,
+)
 from care.security.authorization import AuthorizationController
 from care.users.models import User
 from care.utils.lock import Lock
@@ -51,60 +56,20 @@ class AvailabilityStatsRequestSpec(BaseModel):
             raise ValidationError(msg)
 
 
-def convert_availability_and_exceptions_to_slots(availabilities, exceptions, day):
-    slots = {}
-    for availability in availabilities:
-        start_time = datetime.datetime.combine(
-            day,
-            time.fromisoformat(availability["availability"]["start_time"]),
-            tzinfo=None,
-        )
-        end_time = datetime.datetime.combine(
-            day,
-            time.fromisoformat(availability["availability"]["end_time"]),
-            tzinfo=None,
-        )
-        slot_size_in_minutes = availability["slot_size_in_minutes"]
-        availability_id = availability["availability_id"]
-        current_time = start_time
-        i = 0
-        while current_time < end_time:
-            i += 1
-            if i == 30:  # noqa PLR2004 pragma: no cover
-                # Failsafe to prevent infinite loop
-                break
-
-            conflicting = False
-            for exception in exceptions:
-                exception_start_time = datetime.datetime.combine(
-                    day, exception.start_time, tzinfo=None
-                )
-                exception_end_time = datetime.datetime.combine(
-                    day, exception.end_time, tzinfo=None
-                )
-                if (
-                    exception_start_time
-                    < (current_time + datetime.timedelta(minutes=slot_size_in_minutes))
-                ) and exception_end_time > current_time:
-                    conflicting = True
-
-            if not conflicting:
-                slots[
-                    f"{current_time.time()}-{(current_time + datetime.timedelta(minutes=slot_size_in_minutes)).time()}"
-                ] = {
-                    "start_time": current_time.time(),
-                    "end_time": (
-                        current_time + datetime.timedelta(minutes=slot_size_in_minutes)
-                    ).time(),
-                    "availability_id": availability_id,
-                }
-
-            current_time += datetime.timedelta(minutes=slot_size_in_minutes)
-    return slots
-
-
 def lock_create_appointment(token_slot, patient, created_by, reason_for_visit):
-    with Lock(f"booking:resource:{token_slot.resource.id}"), transaction.atomic():
+    """
+    Only the row of the booked slot is locked, so that bookings for the other
+    slots of the same resource proceed in parallel
+    """
+    with transaction.atomic():
+        token_slot = (
+            TokenSlot.objects.select_for_update(of=("self",))
+            .select_related("availability")
+            .filter(id=token_slot.id)
+            .first()
+        )
+        if not token_slot:
+            raise ValidationError("Slot is no longer available")
         if token_slot.start_datetime < timezone.now():
             raise ValidationError("Slot is already past")
         if token_slot.allocated >= token_slot.availability.tokens_per_slot:
@@ -116,7 +81,7 @@ def lock_create_appointment(token_slot, patient, created_by, reason_for_visit):
         ):
             raise ValidationError("Patient already has a booking for this slot")
         token_slot.allocated += 1
-        token_slot.save()
+        token_slot.save(update_fields=["allocated", "modified_date"])
         return TokenBooking.objects.create(
             token_slot=token_slot,
             patient=patient,
@@ -146,70 +111,19 @@ class SlotViewSet(EMRRetrieveMixin, EMRBaseViewSet):
         ).first()
         if not schedulable_resource_obj:
             raise ValidationError("Resource is not schedulable")
-        # Find all relevant schedules
-        availabilities = Availability.objects.filter(
-            slot_type=SlotTypeOptions.appointment.value,
-            schedule__valid_from__lte=request_data.day,
-            schedule__valid_to__gte=request_data.day,
-            schedule__resource=schedulable_resource_obj,
-        )
-        # Fetch all availabilities for that day of week
-        calculated_dow_availabilities = []
-        for schedule_availability in availabilities:
-            for day_availability in schedule_availability.availability:
-                if day_availability["day_of_week"] == request_data.day.weekday():
-                    calculated_dow_availabilities.append(
-                        {
-                            "availability": day_availability,
-                            "slot_size_in_minutes": schedule_availability.slot_size_in_minutes,
-                            "availability_id": schedule_availability.id,
-                        }
-                    )
-        exceptions = AvailabilityException.objects.filter(
-            resource=schedulable_resource_obj,
-            valid_from__lte=request_data.day,
-            valid_to__gte=request_data.day,
-        )
-        # Generate all slots already created for that day, exclude anything that conflicts with availability exception
-        slots = convert_availability_and_exceptions_to_slots(
-            calculated_dow_availabilities, exceptions, request_data.day
-        )
-        # Fetch all existing slots in that day
-        created_slots = TokenSlot.objects.filter(
-            start_datetime__date=request_data.day,
-            end_datetime__date=request_data.day,
-            resource=schedulable_resource_obj,
-        )
-        for slot in created_slots:
-            slot_key = f"{timezone.make_naive(slot.start_datetime).time()}-{timezone.make_naive(slot.end_datetime).time()}"
-            if (
-                slot_key in slots
-                and slots[slot_key]["availability_id"] == slot.availability.id
+        # Days ahead are materialized by a celery task whenever the schedule
+        # changes, anything else is materialized on read
+        if not is_materialized(schedulable_resource_obj.id, request_data.day):
+            with Lock(
+                f"slots:resource:{schedulable_resource_obj.id}", wait=settings.LOCK_WAIT
             ):
-                slots.pop(slot_key)
-
-        # Create everything else
-        for _slot in slots:
-            slot = slots[_slot]
-            TokenSlot.objects.create(
-                resource=schedulable_resource_obj,
-                start_datetime=datetime.datetime.combine(
-                    request_data.day, slot["start_time"], tzinfo=None
-                ),
-                end_datetime=datetime.datetime.combine(
-                    request_data.day, slot["end_time"], tzinfo=None
-                ),
-                availability_id=slot["availability_id"],
-            )
-        # Compare and figure out what needs to be created
+                materialize_slots(schedulable_resource_obj, request_data.day)
         return Response(
             {
                 "results": [
                     TokenSlotBaseSpec.serialize(slot).model_dump(exclude=["meta"])
-                    for slot in TokenSlot.objects.filter(
-                        start_datetime__date=request_data.day,
-                        end_datetime__date=request_data.day,
-                        resource=schedulable_resource_obj,
+                    for slot in get_day_slots(
+                        schedulable_resource_obj, request_data.day
                     ).select_related("availability")
                 ]
             }
@@ -256,60 +170,14 @@ class SlotViewSet(EMRRetrieveMixin, EMRBaseViewSet):
         if not resource:
             raise ValidationError("Resource is not schedulable")
 
-        schedules = Schedule.objects.filter(
-            valid_from__lte=request_data.to_date,
-            valid_to__gte=request_data.from_date,
-            resource=resource,
-        ).values()
-
-        # Cache availabilities
-        availabilities = {}
-        for schedule in schedules:
-            availabilities[schedule["id"]] = Availability.objects.filter(
-                schedule_id=schedule["id"],
-                slot_type=SlotTypeOptions.appointment.value,
-            ).values()
-
-        availability_exceptions = AvailabilityException.objects.filter(
-            valid_from__lte=request_data.to_date,
-            valid_to__gte=request_data.from_date,
-            resource=resource,
-        ).values()
-
-        # Generate a list of all available days as a dict
-
-        days = {}
-        response_days = {}
-        day = request_data.from_date
-        while day <= request_data.to_date:
-            days[day] = {"total_slots": 0, "booked_slots": 0}
-            response_days[str(day)] = {"total_slots": 0, "booked_slots": 0}
-            day += timedelta(days=1)
-
-        for day in days:
-            # Calculate all matching schedules
-            current_schedules = []
-            for schedule in schedules:
-                valid_from = timezone.make_naive(schedule["valid_from"]).date()
-                valid_to = timezone.make_naive(schedule["valid_to"]).date()
-                if valid_from <= day <= valid_to:
-                    current_schedules.append(schedule)
-            # Calculate availability exception for that day
-            exceptions = []
-            for exception in availability_exceptions:
-                valid_from = exception["valid_from"]
-                valid_to = exception["valid_to"]
-                if valid_from <= day <= valid_to:
-                    exceptions.append(exception)
-            # Calculate slots based on these data
-
-            slots_count = calculate_slots(
-                day, availabilities, current_schedules, exceptions
-            )
-            days[day]["total_slots"] = slots_count
-            response_days[str(day)]["total_slots"] = slots_count
+        available_tokens = calculate_available_tokens(
+            [resource], request_data.from_date, request_data.to_date
+        )[resource.id]
+        response_days = {
+            str(day): {"total_slots": total_slots, "booked_slots": 0}
+            for day, total_slots in available_tokens.items()
+        }
         # Query slots data for these dates, group by date and sum up count
-
         booked_slots = (
             TokenSlot.objects.filter(
                 start_datetime__lte=request_data.to_date,
@@ -328,48 +196,3 @@ class SlotViewSet(EMRRetrieveMixin, EMRBaseViewSet):
         # Query all the booked slots for the given days and get the total booked
 
         return Response(response_days)
-
-
-def calculate_slots(
-    date: datetime.date,
-    availabilities: list[Availability],
-    schedules,
-    exceptions: list[AvailabilityException],
-):
-    # We don't care about duplicate slots because they won't exist because of our validations
-    day_of_week = date.weekday()
-    slots = 0
-    for schedule in schedules:
-        for availability in availabilities[schedule["id"]]:
-            for available_slot in availability["availability"]:
-                if available_slot["day_of_week"] != day_of_week:
-                    continue
-                start_time = datetime.datetime.combine(
-                    date, time.fromisoformat(available_slot["start_time"]), tzinfo=None
-                )
-                end_time = datetime.datetime.combine(
-                    date, time.fromisoformat(available_slot["end_time"]), tzinfo=None
-                )
-                current_start_time = start_time
-                while current_start_time < end_time:
-                    conflicting = False
-                    current_end_time = current_start_time + timedelta(
-                        minutes=availability["slot_size_in_minutes"]
-                    )
-                    for exception in exceptions:
-                        exception_start_time = datetime.datetime.combine(
-                            date, exception["start_time"], tzinfo=None
-                        )
-                        exception_end_time = datetime.datetime.combine(
-                            date, exception["end_time"], tzinfo=None
-                        )
-                        if (
-                            exception_start_time < current_end_time
-                            and exception_end_time > current_start_time
-                        ):
-                            conflicting = True
-                    current_start_time = current_end_time
-                    if conflicting:
-                        continue
-                    slots += availability["tokens_per_slot"]
-    return slots
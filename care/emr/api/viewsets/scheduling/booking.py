@@ -1,6 +1,8 @@
 from typing import Literal
 
 from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from django_filters import CharFilter, DateFromToRangeFilter, FilterSet, UUIDFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from pydantic import UUID4, BaseModel
@@ -107,9 +109,12 @@ class TokenBookingViewSet(
         request_data = CancelBookingSpec(**request_data)
         with transaction.atomic():
             if instance.status not in CANCELLED_STATUS_CHOICES:
-                # Free up the slot if it is not cancelled already
-                instance.token_slot.allocated -= 1
-                instance.token_slot.save()
+                # Free up the slot if it is not cancelled already, in the database
+                # as bookings of the slot may have changed it concurrently
+                TokenSlot.objects.filter(id=instance.token_slot_id).update(
+                    allocated=F("allocated") - 1, modified_date=timezone.now()
+                )
+                instance.token_slot.refresh_from_db(fields=["allocated"])
             instance.status = request_data.reason
             instance.updated_by = user
             instance.save()
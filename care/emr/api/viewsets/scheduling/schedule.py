@@ -24,7 +24,6 @@ from care.emr.resources.scheduling.schedule.spec import (
 from care.facility.models import Facility
 from care.security.authorization import AuthorizationController
 from care.users.models import User
-from care.utils.lock import Lock
 
 
 class ScheduleFilters(FilterSet):
@@ -54,20 +53,29 @@ class ScheduleViewSet(EMRModelViewSet):
                 availability_obj.save()
 
     def perform_update(self, instance):
-        with Lock(f"booking:resource:{instance.resource.id}"):
+        with transaction.atomic():
+            # Serializes changes to the schedule, bookings only lock their slot
+            Schedule.objects.select_for_update().filter(id=instance.id).first()
             super().perform_update(instance)
 
     def perform_destroy(self, instance):
-        with Lock(f"booking:resource:{instance.resource.id}"), transaction.atomic():
+        with transaction.atomic():
+            Schedule.objects.select_for_update().filter(id=instance.id).first()
             # Check if there are any tokens allocated for this schedule in the future
             availabilities = instance.availability_set.all()
             availability_ids = list(availabilities.values_list("id"))
-            has_future_bookings = TokenSlot.objects.filter(
-                resource=instance.resource,
-                availability_id__in=availability_ids,
-                start_datetime__gt=timezone.now(),
-                allocated__gt=0,
-            ).exists()
+            # Bookings only lock the slot they book, lock every future slot so
+            # that none can be booked until the schedule is gone
+            future_allocations = (
+                TokenSlot.objects.select_for_update()
+                .filter(
+                    resource=instance.resource,
+                    availability_id__in=availability_ids,
+                    start_datetime__gt=timezone.now(),
+                )
+                .values_list("allocated", flat=True)
+            )
+            has_future_bookings = any(allocated > 0 for allocated in future_allocations)
             if has_future_bookings:
                 raise ValidationError(
                     "Cannot delete schedule as there are future bookings associated with it"
@@ -176,12 +184,14 @@ class AvailabilityViewSet(EMRCreateMixin, EMRDestroyMixin, EMRBaseViewSet):
         super().perform_create(instance)
 
     def perform_destroy(self, instance):
-        with Lock(f"booking:resource:{instance.schedule.resource.id}"):
-            has_future_bookings = TokenSlot.objects.filter(
-                availability_id=instance.id,
-                start_datetime__gt=timezone.now(),
-                allocated__gt=0,
-            ).exists()
+        with transaction.atomic():
+            Availability.objects.select_for_update().filter(id=instance.id).first()
+            future_allocations = (
+                TokenSlot.objects.select_for_update()
+                .filter(availability_id=instance.id, start_datetime__gt=timezone.now())
+                .values_list("allocated", flat=True)
+            )
+            has_future_bookings = any(allocated > 0 for allocated in future_allocations)
             if has_future_bookings:
                 raise ValidationError(
                     "Cannot delete availability as there are future bookings associated with it"
@@ -0,0 +1,139 @@
+"""
+Two tier cache in front of the terminology server.
+
+* An in process LRU (``FHIR_LOCAL_CACHE_SIZE`` entries, at most
+  ``FHIR_LOCAL_CACHE_TTL`` seconds old) answers hot queries without a round
+  trip to redis.
+* The Django cache holds every entry for its resource specific TTL
+  (``FHIR_CACHE_TTLS``) plus ``FHIR_CACHE_STALE_TTL`` seconds. Entries past
+  their TTL are still served while a celery task refreshes them.
+
+Negative results (empty expansions, failed validations, error outcomes) are
+cached for ``FHIR_CACHE_NEGATIVE_TTL`` seconds only.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+
+REFRESH_LOCK_KEY = "fhir_resource:refreshing:{key}"
+REFRESH_LOCK_TIMEOUT = 60
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fresh_until: float
+    negative: bool = False
+
+    @property
+    def is_fresh(self):
+        return time.time() < self.fresh_until
+
+
+class LRUCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, expires_at = item
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (entry, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LRUCache(settings.FHIR_LOCAL_CACHE_SIZE, settings.FHIR_LOCAL_CACHE_TTL)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def record(event):
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def get_cache_stats():
+    """
+    Returns the in process hit / miss counters of the terminology cache
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def get_ttl(resource, negative=False):
+    if negative:
+        return settings.FHIR_CACHE_NEGATIVE_TTL
+    return settings.FHIR_CACHE_TTLS.get(resource, settings.FHIR_CACHE_DEFAULT_TTL)
+
+
+def store(key, resource, value, negative):
+    ttl = get_ttl(resource, negative)
+    if negative:
+        record("negative")
+    entry = CacheEntry(value=value, fresh_until=time.time() + ttl, negative=negative)
+    cache.set(key, entry, ttl + settings.FHIR_CACHE_STALE_TTL)
+    local_cache.set(key, entry)
+    return entry
+
+
+def lookup(key):
+    """
+    Returns the cached entry for the key, fresh or stale, or None
+    """
+    entry = local_cache.get(key)
+    if entry is not None and entry.is_fresh:
+        record("local_hit")
+        return entry
+    entry = cache.get(key)
+    if entry is None:
+        record("miss")
+        return None
+    local_cache.set(key, entry)
+    record("hit" if entry.is_fresh else "stale_hit")
+    return entry
+
+
+def acquire_refresh(key):
+    """
+    Makes sure a single refresh is queued per stale entry
+    """
+    return cache.add(
+        REFRESH_LOCK_KEY.format(key=key), value=True, timeout=REFRESH_LOCK_TIMEOUT
+    )
+
+
+def release_refresh(key):
+    cache.delete(REFRESH_LOCK_KEY.format(key=key))
@@ -1,14 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from care.emr.fhir.exceptions import FHIRServerUnavailableError
+
+
+class CircuitBreaker:
+    """
+    Stops calling a server that keeps failing.
+    After `failure_threshold` consecutive failures the circuit opens and calls fail
+    fast for `reset_timeout` seconds, after which a single trial call is let
+    through, closing the circuit again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running:
+                return False
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
 
 
 class FHIRClient:
     """
     This client will be used for all queries performed over the FHIR protocol
     This class is designed to perform FHIR based queries to some remote server and convert them into python objects
+
+    Connections are kept alive in a pool shared by all threads (`pool_size` per
+    host), failures are retried with backoff and a circuit breaker stops queries
+    to a server that keeps failing. POST requests are only retried when the
+    connection could not be established, as they may not be idempotent.
     """
 
-    def __init__(self, server_url):
+    retry_status_codes = (502, 503, 504)
+
+    def __init__(
+        self,
+        server_url,
+        *,
+        connect_timeout=5,
+        read_timeout=60,
+        pool_size=10,
+        max_retries=2,
+        failure_threshold=5,
+        reset_timeout=30,
+    ):
         self.server_url = server_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            pool_block=True,
+            max_retries=Retry(
+                total=max_retries,
+                backoff_factor=0.2,
+                status_forcelist=self.retry_status_codes,
+                # Read errors and gateway errors are only retried for GET,
+                # connection errors are retried for every method
+                allowed_methods=frozenset(["GET"]),
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def query(self, *, method, resource, operation=None, parameters, detail=None):
         url = f"{self.server_url}/{resource}"
@@ -21,5 +111,57 @@ class FHIRClient:
             request_kwargs["params"] = parameters
         else:
             request_kwargs["json"] = parameters
-        response = requests.request(method, url, **request_kwargs, timeout=60)
+        if not self.circuit_breaker.allow_request():
+            err = f"Terminology server {self.server_url} is unavailable"
+            raise FHIRServerUnavailableError(err)
+        try:
+            response = self.session.request(
+                method, url, **request_kwargs, timeout=self.timeout
+            )
+        except requests.RequestException:
+            self.circuit_breaker.record_failure()
+            raise
+        if response.status_code >= 500:  # noqa PLR2004
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
         return response.json()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pool_state = threading.local()
+
+
+def _run_in_pool(call):
+    _pool_state.active = True
+    try:
+        return call()
+    finally:
+        _pool_state.active = False
+
+
+def run_concurrently(calls):
+    """
+    Runs the given callables on a shared thread pool of SNOWSTORM_MAX_CONCURRENCY
+    workers and returns their results in order, used to query several code
+    systems in a single round trip of latency.
+    Calls made from within the pool run inline, so that nested fan outs cannot
+    exhaust the pool waiting on each other.
+    """
+    global _executor  # noqa PLW0603
+    calls = list(calls)
+    if (
+        len(calls) <= 1
+        or settings.SNOWSTORM_MAX_CONCURRENCY <= 1
+        or getattr(_pool_state, "active", False)
+    ):
+        return [call() for call in calls]
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SNOWSTORM_MAX_CONCURRENCY,
+                thread_name_prefix="fhir-client",
+            )
+    futures = [_executor.submit(_run_in_pool, call) for call in calls]
+    return [future.result() for future in futures]
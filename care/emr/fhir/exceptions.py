@@ -4,3 +4,7 @@ class BaseFHIRError(Exception):
 
 class MoreThanOneFHIRResourceFoundError(BaseFHIRError):
     pass
+
+
+class FHIRServerUnavailableError(BaseFHIRError):
+    pass
@@ -1,15 +1,26 @@
 # ruff : noqa : SLF001
+import logging
 from copy import deepcopy
 
 import json_fingerprint
 import simplejson as json
 from django.conf import settings
-from django.core.cache import cache
 from json_fingerprint import hash_functions
 
+from care.emr.fhir import cache as fhir_cache
 from care.emr.fhir.client import FHIRClient
 
-default_fhir_client = FHIRClient(server_url=settings.SNOWSTORM_DEPLOYMENT_URL)
+logger = logging.getLogger(__name__)
+
+default_fhir_client = FHIRClient(
+    server_url=settings.SNOWSTORM_DEPLOYMENT_URL,
+    connect_timeout=settings.SNOWSTORM_CONNECT_TIMEOUT,
+    read_timeout=settings.SNOWSTORM_READ_TIMEOUT,
+    pool_size=settings.SNOWSTORM_POOL_SIZE,
+    max_retries=settings.SNOWSTORM_MAX_RETRIES,
+    failure_threshold=settings.SNOWSTORM_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.SNOWSTORM_CIRCUIT_RESET_TIMEOUT,
+)
 
 
 class ResourceManger:
@@ -30,13 +41,54 @@ class ResourceManger:
         fingerprint = json_fingerprint.create(
             input=json.dumps(payload), hash_function=hash_functions.SHA256, version=1
         )
-        cache_key = f"self.cache_prefix_key{fingerprint}"
-        if cached_data := cache.get(cache_key):
-            return cached_data
+        cache_key = f"{self.cache_prefix_key}{fingerprint}"
+        entry = fhir_cache.lookup(cache_key)
+        if entry is None:
+            return self.fetch(cache_key, payload)
+        if not entry.is_fresh:
+            self.schedule_refresh(cache_key, payload)
+        return entry.value
+
+    def fetch(self, cache_key, payload):
         results = self._fhir_client.query(**payload)
-        cache.set(cache_key, results, 10)
+        fhir_cache.store(
+            cache_key, payload["resource"], results, self.is_negative_result(results)
+        )
         return results
 
+    def schedule_refresh(self, cache_key, payload):
+        """
+        Stale entries are served as is while a single celery task refreshes them
+        """
+        if self._fhir_client is not default_fhir_client:
+            self.fetch(cache_key, payload)
+            return
+        if not fhir_cache.acquire_refresh(cache_key):
+            return
+        from care.emr.tasks.terminology import refresh_fhir_query
+
+        try:
+            refresh_fhir_query.delay(cache_key, payload)
+        except Exception:
+            fhir_cache.release_refresh(cache_key)
+            logger.exception("Unable to schedule refresh of %s", cache_key)
+
+    @staticmethod
+    def is_negative_result(results):
+        """
+        Empty expansions, failed validations and error outcomes are cached briefly
+        """
+        if not isinstance(results, dict):
+            return False
+        if results.get("resourceType") == "OperationOutcome":
+            return True
+        if "expansion" in results:
+            return not results["expansion"].get("contains")
+        for parameter in results.get("parameter", []):
+            if parameter.get("name") == "result":
+                return parameter.get("valueBoolean") is False
+        return False
+
     def validate_filter(self):
         pass
 
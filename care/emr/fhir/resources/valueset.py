@@ -11,10 +11,18 @@ class ValueSetFilterValidation(BaseModel):
     exclude: list[ValueSetInclude] = None
     search: str = None
     count: int = None
+    offset: int = None
 
 
 class ValueSetResource(ResourceManger):
-    allowed_properties = ["include", "exclude", "search", "count", "display_language"]
+    allowed_properties = [
+        "include",
+        "exclude",
+        "search",
+        "count",
+        "offset",
+        "display_language",
+    ]
 
     def serialize(self, result):
         return MinimalCodeConcept(
@@ -60,6 +68,10 @@ class ValueSetResource(ResourceManger):
             )
         if "count" in self._filters:
             parameters.append({"name": "count", "valueInteger": self._filters["count"]})
+        if "offset" in self._filters:
+            parameters.append(
+                {"name": "offset", "valueInteger": self._filters["offset"]}
+            )
         if "display_language" in self._filters:
             parameters.append(
                 {
@@ -205,7 +205,6 @@ class Command(BaseCommand):
                     },
                 )
                 districts_cache[state_name][d] = district
-                district.get_parent_json()
                 if not created:
                     logger.debug(
                         "District already exists: %s (%s)", district.name, district.id
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from care.emr.models import FacilityLocation, FacilityOrganization, Organization
+from care.emr.utils.tree import rebuild_tree
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the denormalized tree columns of organizations and locations,
+    they are written through on changes and were populated by a migration, so
+    this is only needed to repair them
+    """
+
+    help = "Rebuild parent caches and parent json of organizations and locations."
+
+    def handle(self, *args, **options):
+        # Locations cache the parents of their facility organizations
+        for model in (Organization, FacilityOrganization, FacilityLocation):
+            self.stdout.write(f"Rebuilding {model.__name__} tree")
+            rebuild_tree(model)
+        self.stdout.write(self.style.SUCCESS("Tree caches rebuilt"))
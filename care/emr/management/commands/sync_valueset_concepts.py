@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from care.emr.models import ValueSet
+
+
+class Command(BaseCommand):
+    """
+    Builds the local concept index used by ValueSet expand and validate-code
+    """
+
+    help = "Sync ValueSet concepts from the terminology server to the local index."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--slug",
+            action="append",
+            default=[],
+            help="Only sync the given valueset, can be repeated",
+        )
+        parser.add_argument(
+            "--max-concepts",
+            default=50000,
+            type=int,
+            help="Skip valuesets with more concepts, they are queried remotely",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild indexes that are already up to date",
+        )
+
+    def handle(self, *args, **options):
+        queryset = ValueSet.objects.all()
+        if options["slug"]:
+            queryset = queryset.filter(slug__in=options["slug"])
+        for valueset in queryset:
+            if valueset.has_concept_index() and not options["force"]:
+                continue
+            try:
+                synced = valueset.build_concept_index(options["max_concepts"])
+            except Exception as e:
+                self.stderr.write(f"Failed to sync {valueset.slug}: {e}")
+                continue
+            if synced:
+                self.stdout.write(
+                    f"Synced {valueset.concepts.count()} concepts for {valueset.slug}"
+                )
+            else:
+                self.stdout.write(
+                    f"Skipped {valueset.slug}, too many concepts to index locally"
+                )
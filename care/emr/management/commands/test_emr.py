@@ -47,7 +47,6 @@ class Command(BaseCommand):
             print("Getting There, Iteration", i)
             for obj in Organization.objects.filter(org_type="govt"):
                 obj.set_organization_cache()
-        qs.update(cached_parent_json={})
         facilities = Facility.objects.all()
         for facility in facilities:
             facility.sync_cache()
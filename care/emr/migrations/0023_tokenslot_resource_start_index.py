@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("emr", "0022_valueset_concept_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tokenslot",
+            index=models.Index(
+                fields=["resource", "start_datetime"],
+                name="token_slot_resource_start_idx",
+            ),
+        ),
+    ]
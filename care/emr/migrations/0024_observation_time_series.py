@@ -0,0 +1,87 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+BACKFILL_BATCH_SIZE = 10000
+
+BACKFILL_SQL = """
+UPDATE emr_observation SET
+    main_code_system = main_code ->> 'system',
+    main_code_code = main_code ->> 'code',
+    value_numeric = CASE
+        WHEN jsonb_typeof(value) = 'object'
+            AND value ->> 'value'
+            ~ '^\\s*[-+]?([0-9]+\\.?[0-9]*|\\.[0-9]+)\\s*$'
+        THEN (value ->> 'value')::double precision
+    END
+WHERE id >= %s AND id < %s;
+"""
+
+
+def backfill_denormalized_fields(apps, schema_editor):
+    """
+    Fills the new columns in batches of ids, the migration is not atomic so
+    every batch commits on its own instead of locking the whole table
+    """
+    Observation = apps.get_model("emr", "Observation")
+    bounds = Observation.objects.aggregate(min_id=Min("id"), max_id=Max("id"))
+    if bounds["min_id"] is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for batch_start in range(
+            bounds["min_id"], bounds["max_id"] + 1, BACKFILL_BATCH_SIZE
+        ):
+            cursor.execute(
+                BACKFILL_SQL, [batch_start, batch_start + BACKFILL_BATCH_SIZE]
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("emr", "0023_tokenslot_resource_start_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observation",
+            name="main_code_code",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="observation",
+            name="main_code_system",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="observation",
+            name="value_numeric",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_denormalized_fields, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name="observation",
+            index=models.Index(
+                fields=[
+                    "encounter",
+                    "main_code_system",
+                    "main_code_code",
+                    "effective_datetime",
+                ],
+                name="observation_encounter_code_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="observation",
+            index=models.Index(
+                fields=[
+                    "patient",
+                    "main_code_system",
+                    "main_code_code",
+                    "effective_datetime",
+                ],
+                name="observation_patient_code_idx",
+            ),
+        ),
+    ]
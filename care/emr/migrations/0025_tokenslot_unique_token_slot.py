@@ -0,0 +1,55 @@
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_slots(apps, schema_editor):
+    """
+    Folds slots materialized more than once into the oldest one, so that the
+    unique constraint can be added
+    """
+    TokenSlot = apps.get_model("emr", "TokenSlot")
+    TokenBooking = apps.get_model("emr", "TokenBooking")
+    duplicates = (
+        TokenSlot.objects.filter(deleted=False)
+        .order_by()
+        .values("resource_id", "availability_id", "start_datetime", "end_datetime")
+        .annotate(count=Count("id"), keep_id=Min("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        keep_id = duplicate.pop("keep_id")
+        duplicate.pop("count")
+        extra_ids = list(
+            TokenSlot.objects.filter(deleted=False, **duplicate)
+            .exclude(id=keep_id)
+            .values_list("id", flat=True)
+        )
+        allocated = TokenSlot.objects.filter(id__in=extra_ids).aggregate(
+            total=Sum("allocated")
+        )["total"]
+        TokenBooking.objects.filter(token_slot_id__in=extra_ids).update(
+            token_slot_id=keep_id
+        )
+        TokenSlot.objects.filter(id=keep_id).update(
+            allocated=F("allocated") + allocated
+        )
+        TokenSlot.objects.filter(id__in=extra_ids).update(deleted=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("emr", "0024_observation_time_series"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="tokenslot",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("deleted", False)),
+                fields=("resource", "availability", "start_datetime", "end_datetime"),
+                name="unique_token_slot",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def rebuild_tree_caches(apps, schema_editor):
+    """
+    Populates the parent json of existing organizations and locations, it is
+    written through on changes from here on.
+    The tree methods live on the models, so the current models are used.
+    """
+    from care.emr.models import FacilityLocation, FacilityOrganization, Organization
+    from care.emr.utils.tree import rebuild_tree
+
+    # Locations cache the parents of their facility organizations
+    for model in (Organization, FacilityOrganization, FacilityLocation):
+        rebuild_tree(model)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emr", "0025_tokenslot_unique_token_slot"),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_tree_caches, migrations.RunPython.noop),
+    ]
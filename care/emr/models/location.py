@@ -1,11 +1,14 @@
-from datetime import datetime, timedelta
+from collections import defaultdict
 
 from django.contrib.postgres.fields import ArrayField
 from django.db import models
-from django.utils import timezone
 
 from care.emr.models import EMRBaseModel, Encounter, FacilityOrganization
-from config.celery_app import app
+from care.emr.utils.tree import (
+    refresh_children_json,
+    refresh_subtree,
+    update_tree_cache,
+)
 
 
 class FacilityLocation(EMRBaseModel):
@@ -32,24 +35,42 @@ class FacilityLocation(EMRBaseModel):
     current_encounter = models.ForeignKey(
         Encounter, on_delete=models.SET_NULL, null=True, blank=True, default=None
     )  # Populated from FacilityLocationEncounter
-    cache_expiry_days = 15
 
-    def get_parent_json(self):
+    tree_root_field = "root_location_id"
+    tree_extra_fields = ("facility_organization_cache",)
+    tree_json_fields = frozenset(
+        {
+            "external_id",
+            "status",
+            "operational_status",
+            "name",
+            "description",
+            "location_type",
+            "form",
+            "mode",
+            "has_children",
+            "cached_parent_json",
+            "current_encounter",
+            "current_encounter_id",
+        }
+    )
+
+    def get_subtree_json(self):
+        """
+        The json the children of this location store as their parent
+        """
         from care.emr.resources.location.spec import FacilityLocationListSpec
 
+        return FacilityLocationListSpec.serialize(self).to_json()
+
+    def get_parent_json(self):
+        """
+        The parent json is written through when the parent changes, reading it
+        never writes. Rows not populated yet (see the sync_tree_caches command)
+        are serialized on the fly.
+        """
         if self.parent_id:
-            if self.cached_parent_json and timezone.now() < datetime.fromisoformat(
-                self.cached_parent_json["cache_expiry"]
-            ):
-                return self.cached_parent_json
-            self.parent.get_parent_json()
-            temp_data = FacilityLocationListSpec.serialize(self.parent).to_json()
-            temp_data["cache_expiry"] = str(
-                timezone.now() + timedelta(days=self.cache_expiry_days)
-            )
-            self.cached_parent_json = temp_data
-            super().save(update_fields=["cached_parent_json"])
-            return self.cached_parent_json
+            return self.cached_parent_json or self.parent.get_subtree_json()
         return {}
 
     @classmethod
@@ -77,48 +98,53 @@ class FacilityLocation(EMRBaseModel):
         queryset = queryset.filter(level_cache=level_cache, name=name)
         return queryset.exists()
 
+    @classmethod
+    def refresh_tree_level(cls, nodes):
+        """
+        Sets the facility_organization_cache of the locations from their parents
+        and their own organizations, in two queries for all of them
+        """
+        organizations = defaultdict(set)
+        location_organizations = FacilityLocationOrganization.objects.filter(
+            location_id__in=[node.id for node in nodes if node.id]
+        ).values_list("location_id", "organization_id", "organization__parent_cache")
+        for location_id, organization_id, parent_cache in location_organizations:
+            organizations[location_id].update({*parent_cache, organization_id})
+        root_organizations = dict(
+            FacilityOrganization.objects.filter(
+                org_type="root", facility_id__in={node.facility_id for node in nodes}
+            ).values_list("facility_id", "id")
+        )
+        for node in nodes:
+            orgs = set(organizations[node.id])
+            if node.parent:
+                orgs.update(node.parent.facility_organization_cache)
+            if node.facility_id in root_organizations:
+                orgs.add(root_organizations[node.facility_id])
+            node.facility_organization_cache = list(orgs)
+
     def sync_organization_cache(self):
-        orgs = set()
-        if self.parent:
-            orgs = orgs.union(set(self.parent.facility_organization_cache))
-        for (
-            facility_location_organization
-        ) in FacilityLocationOrganization.objects.filter(location=self):
-            orgs = orgs.union(
-                {
-                    *facility_location_organization.organization.parent_cache,
-                    facility_location_organization.organization.id,
-                }
-            )
-
-        facility_root_org = FacilityOrganization.objects.filter(
-            org_type="root", facility=self.facility
-        ).first()
-        if facility_root_org:
-            orgs = orgs.union({facility_root_org.id})
-
-        self.facility_organization_cache = list(orgs)
+        """
+        Recomputes the organizations of the location and its descendants, after
+        organizations were added or removed
+        """
+        FacilityLocation.refresh_tree_level([self])
         super().save(update_fields=["facility_organization_cache"])
+        refresh_subtree(self)
 
     def save(self, *args, **kwargs):
         if not self.id:
+            update_tree_cache(self, force=True)
             super().save(*args, **kwargs)
-            if self.parent:
-                self.level_cache = self.parent.level_cache + 1
-                if self.parent.root_location is None:
-                    self.root_location = self.parent
-                else:
-                    self.root_location = self.parent.root_location
-                if not self.parent.has_children:
-                    self.parent.has_children = True
-                    self.parent.save(update_fields=["has_children"])
+        elif kwargs.get("update_fields") is None and update_tree_cache(self):
+            super().save(*args, **kwargs)
+            refresh_subtree(self)
         else:
-            self.cached_parent_json = {}
             super().save(*args, **kwargs)
-        self.sync_organization_cache()
+            refresh_children_json(self, kwargs.get("update_fields"))
 
     def cascade_changes(self):
-        handle_cascade.delay(self.id)
+        refresh_subtree(self)
 
 
 class FacilityLocationOrganization(EMRBaseModel):
@@ -133,8 +159,7 @@ class FacilityLocationOrganization(EMRBaseModel):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        self.location.save()
-        self.location.cascade_changes()
+        self.location.sync_organization_cache()
 
 
 class FacilityLocationEncounter(EMRBaseModel):
@@ -147,14 +172,3 @@ class FacilityLocationEncounter(EMRBaseModel):
     encounter = models.ForeignKey(Encounter, on_delete=models.CASCADE)
     start_datetime = models.DateTimeField()
     end_datetime = models.DateTimeField(default=None, null=True, blank=True)
-
-
-@app.task
-def handle_cascade(base_location):
-    """
-    Cascade changes to a location organization to all its children
-    """
-
-    for child in FacilityLocation.objects.filter(parent_id=base_location):
-        child.save(update_fields=["cached_parent_json"])
-        handle_cascade(child)
@@ -1,3 +1,5 @@
+import math
+
 from django.db import models
 
 from care.emr.models import EMRBaseModel
@@ -30,5 +32,57 @@ class Observation(EMRBaseModel):
         "emr.QuestionnaireResponse", on_delete=models.CASCADE, null=True
     )
     component = models.JSONField(default=list)
+    # Denormalized from main_code and value for time series queries
+    main_code_system = models.CharField(max_length=255, null=True, blank=True)
+    main_code_code = models.CharField(max_length=255, null=True, blank=True)
+    value_numeric = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=[
+                    "encounter",
+                    "main_code_system",
+                    "main_code_code",
+                    "effective_datetime",
+                ],
+                name="observation_encounter_code_idx",
+            ),
+            models.Index(
+                fields=[
+                    "patient",
+                    "main_code_system",
+                    "main_code_code",
+                    "effective_datetime",
+                ],
+                name="observation_patient_code_idx",
+            ),
+        ]
+
+    def update_denormalized_fields(self):
+        """
+        Has to be called before bulk_create, save() calls it on its own
+        """
+        main_code = self.main_code or {}
+        self.main_code_system = main_code.get("system")
+        self.main_code_code = main_code.get("code")
+        self.value_numeric = None
+        value = self.value.get("value") if isinstance(self.value, dict) else None
+        try:
+            value_numeric = float(value)
+        except (TypeError, ValueError):
+            return
+        if math.isfinite(value_numeric):
+            self.value_numeric = value_numeric
 
-    # TODO Add index for patient -> encounter -> system -> code
+    def save(self, *args, **kwargs):
+        self.update_denormalized_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {
+                *update_fields,
+                "main_code_system",
+                "main_code_code",
+                "value_numeric",
+            }
+        return super().save(*args, **kwargs)
@@ -1,10 +1,12 @@
-from datetime import datetime, timedelta
-
 from django.contrib.postgres.fields import ArrayField
 from django.db import models
-from django.utils import timezone
 
 from care.emr.models import EMRBaseModel
+from care.emr.utils.tree import (
+    refresh_children_json,
+    refresh_subtree,
+    update_tree_cache,
+)
 
 
 class OrganizationCommonBase(EMRBaseModel):
@@ -24,43 +26,53 @@ class OrganizationCommonBase(EMRBaseModel):
     parent_cache = ArrayField(models.IntegerField(), default=list)
     metadata = models.JSONField(default=dict)
     cached_parent_json = models.JSONField(default=dict)
-    cache_expiry_days = 15
     # Storing parent data within the organization to save joins each time
 
+    tree_root_field = "root_org_id"
+    tree_extra_fields = ()
+    tree_json_fields = frozenset(
+        {
+            "external_id",
+            "name",
+            "description",
+            "org_type",
+            "metadata",
+            "cached_parent_json",
+            "level_cache",
+        }
+    )
+
+    def get_subtree_json(self):
+        """
+        The json the children of this organization store as their parent
+        """
+        return {
+            "id": str(self.external_id),
+            "name": self.name,
+            "description": self.description,
+            "org_type": self.org_type,
+            "metadata": self.metadata,
+            "parent": self.get_parent_json(),
+            "level_cache": self.level_cache,
+        }
+
+    @classmethod
+    def refresh_tree_level(cls, nodes):
+        pass
+
     def set_organization_cache(self):
-        if self.parent:
-            self.parent_cache = [*self.parent.parent_cache, self.parent.id]
-            self.level_cache = self.parent.level_cache + 1
-            if self.parent.root_org is None:
-                self.root_org = self.parent
-            else:
-                self.root_org = self.parent.root_org
-            if not self.parent.has_children:
-                self.parent.has_children = True
-                self.parent.save(update_fields=["has_children"])
+        update_tree_cache(self, force=True)
         super().save()
+        refresh_subtree(self)
 
     def get_parent_json(self):
+        """
+        The parent json is written through when the parent changes, reading it
+        never writes. Rows not populated yet (see the sync_tree_caches command)
+        are serialized on the fly.
+        """
         if self.parent_id:
-            if self.cached_parent_json and timezone.now() < datetime.fromisoformat(
-                self.cached_parent_json["cache_expiry"]
-            ):
-                return self.cached_parent_json
-            self.parent.get_parent_json()
-            self.cached_parent_json = {
-                "id": str(self.parent.external_id),
-                "name": self.parent.name,
-                "description": self.parent.description,
-                "org_type": self.parent.org_type,
-                "metadata": self.parent.metadata,
-                "parent": self.parent.cached_parent_json,
-                "level_cache": self.parent.level_cache,
-                "cache_expiry": str(
-                    timezone.now() + timedelta(days=self.cache_expiry_days)
-                ),
-            }
-            self.save(update_fields=["cached_parent_json"])
-            return self.cached_parent_json
+            return self.cached_parent_json or self.parent.get_subtree_json()
         return {}
 
     class Meta:
@@ -68,10 +80,14 @@ class OrganizationCommonBase(EMRBaseModel):
 
     def save(self, *args, **kwargs):
         if not self.id:
+            update_tree_cache(self, force=True)
+            super().save(*args, **kwargs)
+        elif kwargs.get("update_fields") is None and update_tree_cache(self):
             super().save(*args, **kwargs)
-            self.set_organization_cache()
+            refresh_subtree(self)
         else:
             super().save(*args, **kwargs)
+            refresh_children_json(self, kwargs.get("update_fields"))
 
     @classmethod
     def validate_uniqueness(cls, queryset, pydantic_instance, model_instance):
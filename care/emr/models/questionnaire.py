@@ -1,14 +1,64 @@
+import threading
 import uuid
+from collections import OrderedDict
 
 from django.contrib.postgres.fields import ArrayField
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 
 from care.emr.models import EMRBaseModel
 from care.emr.models.organization import FacilityOrganization, Organization
 
-TAG_CACHE = {}  # TODO change to Redis with LRU Cache in process
 MAX_QUESTIONNAIRE_TAGS_COUNT = 1000
 
+# Tags are cached in process and in the shared cache, entries of both levels are
+# stamped with a version that is replaced whenever a tag is saved or deleted
+TAG_CACHE_VERSION_KEY = "questionnaire_tags:version"
+TAG_CACHE_KEY = "questionnaire_tags:{version}:{tag_id}"
+TAG_CACHE_TIMEOUT = 60 * 60 * 24  # 1 Day
+TAG_CACHE_SIZE = MAX_QUESTIONNAIRE_TAGS_COUNT
+
+_local_tags = OrderedDict()
+_local_tags_version = None
+_local_tags_lock = threading.Lock()
+
+
+def get_tag_cache_version():
+    return cache.get_or_set(
+        TAG_CACHE_VERSION_KEY, lambda: uuid.uuid4().hex, timeout=None
+    )
+
+
+def invalidate_tag_cache():
+    # Rotated once the change is visible, so that readers do not cache the
+    # previous state under the new version
+    transaction.on_commit(
+        lambda: cache.set(TAG_CACHE_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    )
+
+
+def get_local_tags(version, tag_ids):
+    global _local_tags_version  # noqa PLW0603
+    with _local_tags_lock:
+        if _local_tags_version != version:
+            _local_tags.clear()
+            _local_tags_version = version
+        tags = {}
+        for tag_id in tag_ids:
+            if tag_id in _local_tags:
+                _local_tags.move_to_end(tag_id)
+                tags[tag_id] = _local_tags[tag_id]
+        return tags
+
+
+def set_local_tags(version, tags):
+    with _local_tags_lock:
+        if _local_tags_version != version:
+            return
+        _local_tags.update(tags)
+        while len(_local_tags) > TAG_CACHE_SIZE:
+            _local_tags.popitem(last=False)
+
 
 class QuestionnaireTag(EMRBaseModel):
     name = models.CharField(max_length=255)
@@ -18,24 +68,55 @@ class QuestionnaireTag(EMRBaseModel):
     def serialize_model(cls, obj):
         return {"name": obj.name, "slug": obj.slug}
 
+    @classmethod
+    def get_tags(cls, tag_ids):
+        """
+        Returns {tag_id: serialized tag} for the given ids, from the process cache,
+        then the shared cache and then a single query for the rest.
+        Tags that do not exist resolve to an empty dict
+        """
+        tag_ids = set(tag_ids)
+        if not tag_ids:
+            return {}
+        version = get_tag_cache_version()
+        tags = get_local_tags(version, tag_ids)
+        missing = tag_ids - tags.keys()
+        if missing:
+            keys = {
+                TAG_CACHE_KEY.format(version=version, tag_id=tag_id): tag_id
+                for tag_id in missing
+            }
+            shared = {keys[key]: tag for key, tag in cache.get_many(list(keys)).items()}
+            missing -= shared.keys()
+            if missing:
+                fetched = {tag_id: {} for tag_id in missing}
+                for tag in cls.objects.filter(id__in=missing):
+                    fetched[tag.id] = cls.serialize_model(tag)
+                cache.set_many(
+                    {
+                        TAG_CACHE_KEY.format(version=version, tag_id=tag_id): tag
+                        for tag_id, tag in fetched.items()
+                    },
+                    TAG_CACHE_TIMEOUT,
+                )
+                shared.update(fetched)
+            set_local_tags(version, shared)
+            tags.update(shared)
+        return tags
+
     @classmethod
     def get_tag(cls, tag_id):
-        if tag_id in TAG_CACHE:
-            return TAG_CACHE[tag_id]
-        try:
-            tag = cls.objects.get(id=tag_id)
-            TAG_CACHE[tag_id] = cls.serialize_model(tag)
-            return TAG_CACHE[tag_id]
-        except Exception:  # noqa S110
-            pass
-        return {}
+        return cls.get_tags([tag_id])[tag_id]
 
     def save(self, *args, **kwargs):
-        if self.__class__.objects.all().count() > MAX_QUESTIONNAIRE_TAGS_COUNT:
+        if (
+            self._state.adding
+            and self.__class__.objects.count() > MAX_QUESTIONNAIRE_TAGS_COUNT
+        ):
             err = f"An instance can have only upto {MAX_QUESTIONNAIRE_TAGS_COUNT} tags"
             raise ValueError(err)
         super().save(*args, **kwargs)
-        TAG_CACHE[self.id] = self.serialize_model(self)
+        invalidate_tag_cache()
 
 
 class Questionnaire(EMRBaseModel):
@@ -17,6 +17,22 @@ class TokenSlot(EMRBaseModel):
     allocated = models.IntegerField(null=False, blank=False, default=0)
     # TODO propogate facility to this level or at the booking level to avoid joins
 
+    class Meta:
+        constraints = [
+            # Lets concurrent materializers insert the same slots safely
+            models.UniqueConstraint(
+                fields=["resource", "availability", "start_datetime", "end_datetime"],
+                condition=models.Q(deleted=False),
+                name="unique_token_slot",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["resource", "start_datetime"],
+                name="token_slot_resource_start_idx",
+            )
+        ]
+
 
 class TokenBooking(EMRBaseModel):
     token_slot = models.ForeignKey(
@@ -1,5 +1,15 @@
-from django.db import models
+import hashlib
+import json
+import re
+from functools import partial
 
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models, transaction
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from care.emr.fhir.client import run_concurrently
+from care.emr.fhir.resources.code_concept import MinimalCodeConcept
 from care.emr.fhir.resources.valueset import ValueSetResource
 from care.emr.models import EMRBaseModel
 from care.emr.resources.common.valueset import ValueSetCompose
@@ -12,6 +22,10 @@ class ValueSet(EMRBaseModel):
     compose = models.JSONField(default=dict)
     status = models.CharField(max_length=255)
     is_system_defined = models.BooleanField(default=False)
+    # Hash of the compose the local concept index was built from, the index is only
+    # used while it matches the current compose
+    indexed_compose_hash = models.CharField(max_length=64, default="", blank=True)
+    indexed_on = models.DateTimeField(null=True, blank=True)
 
     def create_composition(self):
         systems = {}
@@ -30,21 +44,174 @@ class ValueSet(EMRBaseModel):
             systems[system]["exclude"].append(exclude.model_dump(exclude_defaults=True))
         return systems
 
+    def get_compose_hash(self):
+        compose = self.compose
+        if type(compose) is not dict:
+            compose = compose.model_dump(exclude_defaults=True)
+        return hashlib.sha256(json.dumps(compose, sort_keys=True).encode()).hexdigest()
+
+    def has_concept_index(self):
+        return bool(self.pk) and self.indexed_compose_hash == self.get_compose_hash()
+
     def search(self, search="", count=10, display_language=None):
+        if self.has_concept_index():
+            results = ValueSetConcept.search(self, search, count, display_language)
+            if results:
+                return results
         systems = self.create_composition()
-        results = []
+        queries = []
         for system in systems:
             temp = ValueSetResource().filter(
                 search=search, count=count, **systems[system]
             )
             if display_language:
                 temp = temp.filter(display_language=display_language)
-            results.extend(temp.search())
+            queries.append(temp.search)
+        results = []
+        for system_results in run_concurrently(queries):
+            results.extend(system_results)
         return results
 
     def lookup(self, code):
+        if (
+            self.has_concept_index()
+            and self.concepts.filter(system=code.system, code=code.code).exists()
+        ):
+            return True
+        return self.lookup_remote(code)
+
+    def find_indexed_codes(self, codes):
+        """
+        Returns the (system, code) pairs of the given codings present in the local
+        index, checked in a single query
+        """
+        if not self.has_concept_index():
+            return set()
+        return set(
+            self.concepts.filter(code__in={code.code for code in codes}).values_list(
+                "system", "code"
+            )
+        )
+
+    def lookup_remote(self, code):
+        """
+        Validates the coding against the terminology server, does not touch the
+        database so that it can run outside the request thread
+        """
         systems = self.create_composition()
-        results = []
-        for system in systems:
-            results.append(ValueSetResource().filter(**systems[system]).lookup(code))
+        results = run_concurrently(
+            [
+                partial(ValueSetResource().filter(**systems[system]).lookup, code)
+                for system in systems
+            ]
+        )
         return any(results)
+
+    def build_concept_index(self, max_concepts, page_size=1000):
+        """
+        Expands the whole value set from the terminology server into the local
+        concept index, returns False without touching the index if the value set
+        has more than `max_concepts` concepts
+        """
+        concepts = {}
+        for filters in self.create_composition().values():
+            offset = 0
+            while True:
+                page = (
+                    ValueSetResource()
+                    .filter(count=page_size, offset=offset, **filters)
+                    .search()
+                )
+                for concept in page:
+                    concepts[(concept.system, concept.code)] = concept
+                if len(concepts) > max_concepts:
+                    return False
+                if len(page) < page_size:
+                    break
+                offset += page_size
+        with transaction.atomic():
+            self.concepts.all().delete()
+            ValueSetConcept.objects.bulk_create(
+                [
+                    ValueSetConcept.from_code_concept(self, concept)
+                    for concept in concepts.values()
+                ],
+                batch_size=page_size,
+            )
+            self.indexed_compose_hash = self.get_compose_hash()
+            self.indexed_on = timezone.now()
+            self.save(update_fields=["indexed_compose_hash", "indexed_on"])
+        return True
+
+
+class ValueSetConcept(models.Model):
+    """
+    Local index of the concepts of a value set, populated by the
+    sync_valueset_concepts command so that expand and validate-code can be
+    served without querying the terminology server
+    """
+
+    valueset = models.ForeignKey(
+        ValueSet, on_delete=models.CASCADE, related_name="concepts"
+    )
+    system = models.CharField(max_length=255)
+    code = models.CharField(max_length=255)
+    display = models.TextField()
+    designation = models.JSONField(default=list)
+    # Lower cased display and designations, matched token by token
+    search_text = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["valueset", "system", "code"],
+                name="unique_valueset_concept",
+            )
+        ]
+        indexes = [
+            GinIndex(
+                fields=["search_text"],
+                opclasses=["gin_trgm_ops"],
+                name="valueset_concept_search_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.system}|{self.code}"
+
+    @classmethod
+    def from_code_concept(cls, valueset, concept):
+        designation = concept.designation or []
+        terms = [concept.display]
+        terms.extend(item.get("value", "") for item in designation)
+        return cls(
+            valueset=valueset,
+            system=concept.system,
+            code=concept.code,
+            display=concept.display,
+            designation=designation,
+            search_text=" ".join(terms).lower(),
+        )
+
+    @classmethod
+    def search(cls, valueset, search, count, display_language=None):
+        queryset = cls.objects.filter(valueset=valueset)
+        for token in search.lower().split():
+            # Every token has to match the start of a word
+            queryset = queryset.filter(search_text__regex=r"\m" + re.escape(token))
+        queryset = queryset.order_by(Length("display"), "display")[:count]
+        return [concept.to_code_concept(display_language) for concept in queryset]
+
+    def to_code_concept(self, display_language=None):
+        display = self.display
+        if display_language:
+            for item in self.designation:
+                if item.get("language") == display_language and item.get("value"):
+                    display = item["value"]
+                    break
+        return MinimalCodeConcept(
+            system=self.system,
+            code=self.code,
+            display=display,
+            designation=self.designation,
+        )
@@ -1,3 +1,6 @@
+from functools import partial
+
+from care.emr.fhir.client import run_concurrently
 from care.emr.fhir.resources.valueset import ValueSetResource
 from care.emr.models.valueset import ValueSet as ValuesetDatabaseModel
 from care.emr.resources.common.valueset import ValueSet, ValueSetCompose
@@ -66,13 +69,15 @@ class CareValueset:
         systems = self.create_composition()
 
         results = []
-
-        for system in systems:
-            results.extend(
+        for system_results in run_concurrently(
+            [
                 ValueSetResource()
                 .filter(search=filter, count=10, **systems[system])
-                .search()
-            )
+                .search
+                for system in systems
+            ]
+        ):
+            results.extend(system_results)
         return results
 
 
@@ -98,3 +103,40 @@ def validate_valueset(field, slug, code):
         err = "Code does not exist in the valueset"
         raise ValueError(err)
     return code
+
+
+def validate_valueset_codings(checks):
+    """
+    Validates many (slug, coding) pairs in a single pass, duplicates are validated
+    once and the codings missing from the local indexes are sent to the
+    terminology server concurrently.
+    Returns the set of indexes into `checks` that are not valid, including those
+    whose valueset does not exist.
+    """
+    keys = []
+    codes_by_slug = {}
+    for slug, code in checks:
+        key = code.model_dump_json(exclude_defaults=True)
+        keys.append((slug, key))
+        codes_by_slug.setdefault(slug, {})[key] = code
+    valuesets = ValuesetDatabaseModel.objects.in_bulk(
+        list(codes_by_slug), field_name="slug"
+    )
+    valid = set()
+    remote_checks = []
+    for slug, codes in codes_by_slug.items():
+        valueset = valuesets.get(slug)
+        if not valueset:
+            continue
+        indexed_codes = valueset.find_indexed_codes(list(codes.values()))
+        for key, code in codes.items():
+            if (code.system, code.code) in indexed_codes:
+                valid.add((slug, key))
+            else:
+                lookup = partial(valueset.lookup_remote, code)
+                remote_checks.append(((slug, key), lookup))
+    remote_results = run_concurrently([lookup for _, lookup in remote_checks])
+    for (key, _), result in zip(remote_checks, remote_results, strict=True):
+        if result:
+            valid.add(key)
+    return {index for index, key in enumerate(keys) if key not in valid}
@@ -1,14 +1,16 @@
+import hashlib
 import logging
 import subprocess
 import tempfile
 import time
-from pathlib import Path
+from collections import deque
+from itertools import batched
 from uuid import uuid4
 
-from django.conf import settings
 from django.core.cache import cache
-from django.template.loader import render_to_string
+from django.template.loader import get_template, render_to_string
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 
 from care.emr.models import (
     AllergyIntolerance,
@@ -18,6 +20,7 @@ from care.emr.models import (
     Observation,
     medication_request,
 )
+from care.emr.reports.renderer import LOGO_NAME, renderer
 from care.emr.resources.allergy_intolerance.spec import (
     VerificationStatusChoices as AllergyVerificationStatusChoices,
 )
@@ -29,6 +32,45 @@ logger = logging.getLogger(__name__)
 
 LOCK_DURATION = 2 * 60  # 2 minutes
 
+SUMMARY_TEMPLATE = "reports/patient_discharge_summary_pdf_template.typ"
+OBSERVATIONS_TEMPLATE = "reports/patient_discharge_summary_observations.typ"
+
+# Rendered summaries and observation chunks are addressed by a hash of their
+# content, so they never have to be invalidated, they are just no longer read
+SUMMARY_CACHE_KEY = "discharge_summary:file:{digest}"
+SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24 * 7  # 7 Days
+OBSERVATION_CHUNK_CACHE_KEY = "discharge_summary:observations:{digest}"
+OBSERVATION_CHUNK_SIZE = 200
+# Summaries of a batch waiting on the renderer per worker, each holds a temporary
+# file until it is uploaded
+PENDING_SUMMARIES_PER_WORKER = 2
+
+# Bump when a filter or tag of data_formatting_extras or discharge_summary_utils
+# renders differently, the templates are hashed but the tags they load are not
+SUMMARY_TEMPLATE_TAGS_VERSION = 1
+
+# Values the rendered rows depend on, records are rendered with the name of the
+# user that entered them
+SUMMARY_DIGEST_FIELDS = {
+    "symptoms": ("id", "modified_date"),
+    "diagnoses": ("id", "modified_date"),
+    "medication_requests": (
+        "id",
+        "modified_date",
+        "created_by__first_name",
+        "created_by__last_name",
+        "created_by__username",
+    ),
+    "observations": (
+        "id",
+        "modified_date",
+        "data_entered_by__first_name",
+        "data_entered_by__last_name",
+        "data_entered_by__username",
+    ),
+    "files": ("id", "modified_date"),
+}
+
 
 def lock_key(encounter_ext_id: str):
     return f"discharge_summary_{encounter_ext_id}"
@@ -103,11 +145,13 @@ def get_discharge_summary_data(encounter: Encounter):
         .select_related("created_by")
     )
 
+    # Earlier summaries are not annexed, the summary would otherwise change
+    # every time it is generated
     files = FileUpload.objects.filter(
         associating_id=encounter.external_id,
         upload_completed=True,
         is_archived=False,
-    )
+    ).exclude(file_category=FileCategoryChoices.discharge_summary.value)
 
     admission_duration = (
         format_duration(
@@ -132,54 +176,109 @@ def get_discharge_summary_data(encounter: Encounter):
     }
 
 
-def compile_typ(output_file, data):
-    try:
-        logo_path = (
-            Path(settings.BASE_DIR)
-            / "staticfiles"
-            / "images"
-            / "logos"
-            / "black-logo.svg"
-        )
-
-        data["logo_path"] = "black-logo.svg"
-        with tempfile.TemporaryDirectory() as tmpdir:
-            template = Path(tmpdir) / "template.typ"
-            template.write_text(
-                render_to_string(
-                    "reports/patient_discharge_summary_pdf_template.typ", context=data
-                )
-            )
-
-            logo_dest = Path(tmpdir) / "black-logo.svg"
-            logo_dest.write_text(logo_path.read_text())
-
-            subprocess.run(  # noqa: S603
-                [
-                    settings.TYPST_BIN,
-                    "compile",
-                    str(template.name),
-                    str(output_file),
-                ],
-                capture_output=True,
-                check=True,
-                shell=False,
-                cwd=tmpdir,
-            )
-
-        logging.info(
-            "Successfully Compiled Summary pdf for %s", data["encounter"].external_id
+def get_template_source(template_name):
+    return get_template(template_name).template.source
+
+
+def update_digest(digest, rows):
+    for row in rows:
+        digest.update(repr(row).encode())
+    # Separates the sections, a row moving between them changes the digest
+    digest.update(b"|")
+
+
+def get_summary_digest(data):
+    """
+    Hash of everything the summary is rendered from, computed from the ids and
+    modification times of the records, without loading the records themselves.
+    The current date is part of it as the header and the patient's age are
+    rendered from it, a summary is reused for the rest of the day it was created.
+    """
+    encounter = data["encounter"]
+    digest = hashlib.sha256()
+    for template_name in (SUMMARY_TEMPLATE, OBSERVATIONS_TEMPLATE):
+        digest.update(get_template_source(template_name).encode())
+    update_digest(digest, [SUMMARY_TEMPLATE_TAGS_VERSION, timezone.localdate()])
+    update_digest(
+        digest,
+        [
+            encounter.id,
+            encounter.modified_date,
+            encounter.patient.modified_date,
+            encounter.facility.modified_date,
+        ],
+    )
+    update_digest(
+        digest, [(allergy.id, allergy.modified_date) for allergy in data["allergies"]]
+    )
+    for key, fields in SUMMARY_DIGEST_FIELDS.items():
+        update_digest(
+            digest,
+            data[key].order_by("id").values_list(*fields).iterator(chunk_size=2000),
         )
-
+    return digest.hexdigest()
+
+
+def render_observation_rows(observations):
+    """
+    Streams the observations in chunks and renders their table rows.
+    Each rendered chunk is cached by the ids, modification times and authors of
+    its observations, as observations are mostly appended, every chunk but the last
+    is reused when the summary is generated again.
+    """
+    template = get_template(OBSERVATIONS_TEMPLATE)
+    template_digest = hashlib.sha256(
+        f"{SUMMARY_TEMPLATE_TAGS_VERSION}{template.template.source}".encode()
+    ).hexdigest()
+    rows = []
+    for chunk in batched(
+        observations.order_by("id")
+        .values_list(*SUMMARY_DIGEST_FIELDS["observations"])
+        .iterator(chunk_size=OBSERVATION_CHUNK_SIZE),
+        OBSERVATION_CHUNK_SIZE,
+    ):
+        digest = hashlib.sha256(template_digest.encode())
+        update_digest(digest, chunk)
+        key = OBSERVATION_CHUNK_CACHE_KEY.format(digest=digest.hexdigest())
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = template.render(
+                {
+                    "observations": observations.filter(
+                        id__in=[row[0] for row in chunk]
+                    ).order_by("id")
+                }
+            ).strip()
+            cache.set(key, rendered, SUMMARY_CACHE_TIMEOUT)
+        rows.append(rendered)
+    # Chunks are rendered by the template engine, they are already escaped
+    return mark_safe("\n".join(row for row in rows if row))  # noqa: S308
+
+
+def render_discharge_summary(data):
+    data["logo_path"] = LOGO_NAME
+    data["observation_rows"] = render_observation_rows(data["observations"])
+    return render_to_string(SUMMARY_TEMPLATE, context=data)
+
+
+def wait_for_pdf(future, encounter: Encounter):
+    try:
+        future.result()
+        logger.info("Successfully Compiled Summary pdf for %s", encounter.external_id)
     except subprocess.CalledProcessError as e:
-        logging.error(
+        logger.error(
             "Error compiling summary pdf for %s: %s",
-            data["encounter"].external_id,
+            encounter.external_id,
             e.stderr.decode("utf-8"),
         )
         raise e
 
 
+def compile_typ(output_file, data):
+    source = render_discharge_summary(data)
+    wait_for_pdf(renderer.submit(source, output_file), data["encounter"])
+
+
 def generate_discharge_summary_pdf(data, file):
     logger.info(
         "Generating Discharge Summary pdf for %s", data["encounter"].external_id
@@ -191,46 +290,109 @@ def generate_discharge_summary_pdf(data, file):
     )
 
 
-def generate_and_upload_discharge_summary(encounter: Encounter):
-    logger.info("Generating Discharge Summary for %s", encounter.external_id)
+def get_cached_summary_file(digest):
+    file_id = cache.get(SUMMARY_CACHE_KEY.format(digest=digest))
+    if file_id is None:
+        return None
+    return FileUpload.objects.filter(
+        id=file_id, upload_completed=True, is_archived=False
+    ).first()
+
+
+def build_summary_file(encounter: Encounter, current_date):
+    timestamp = int(current_date.timestamp() * 1000)
+    patient_name_slug: str = encounter.patient.name.lower().strip().replace(" ", "_")
+    return FileUpload(
+        name=f"discharge_summary-{patient_name_slug}-{int(timestamp)}",
+        internal_name=f"{uuid4()}{int(time.time())}.pdf",
+        file_type=FileTypeChoices.encounter.value,
+        file_category=FileCategoryChoices.discharge_summary.value,
+        associating_id=encounter.external_id,
+    )
+
+
+def upload_summary_file(encounter: Encounter, summary_file, file, digest):
+    logger.info("Uploading Discharge Summary for %s", encounter.external_id)
+    summary_file.files_manager.put_object(
+        summary_file, file, ContentType="application/pdf"
+    )
+    summary_file.upload_completed = True
+    summary_file.save(skip_internal_name=True)
+    cache.set(
+        SUMMARY_CACHE_KEY.format(digest=digest), summary_file.id, SUMMARY_CACHE_TIMEOUT
+    )
+    logger.info(
+        "Uploaded Discharge Summary for %s, file id: %s",
+        encounter.external_id,
+        summary_file.id,
+    )
 
-    set_lock(encounter.external_id, 5)
-    try:
-        current_date = timezone.now()
-        timestamp = int(current_date.timestamp() * 1000)
-        patient_name_slug: str = (
-            encounter.patient.name.lower().strip().replace(" ", "_")
-        )
-        summary_file = FileUpload(
-            name=f"discharge_summary-{patient_name_slug}-{int(timestamp)}",
-            internal_name=f"{uuid4()}{int(time.time())}.pdf",
-            file_type=FileTypeChoices.encounter.value,
-            file_category=FileCategoryChoices.discharge_summary.value,
-            associating_id=encounter.external_id,
-        )
 
-        set_lock(encounter.external_id, 10)
-        data = get_discharge_summary_data(encounter)
-        data["date"] = current_date
-
-        set_lock(encounter.external_id, 50)
-        with tempfile.NamedTemporaryFile(suffix=".pdf") as file:
-            generate_discharge_summary_pdf(data, file)
-            logger.info("Uploading Discharge Summary for %s", encounter.external_id)
-            summary_file.files_manager.put_object(
-                summary_file, file, ContentType="application/pdf"
-            )
-            summary_file.upload_completed = True
-            summary_file.save(skip_internal_name=True)
-            logger.info(
-                "Uploaded Discharge Summary for %s, file id: %s",
-                encounter.external_id,
-                summary_file.id,
-            )
+def finish_discharge_summary(results, encounter, summary_file, digest, file, future):
+    try:
+        with file:
+            wait_for_pdf(future, encounter)
+            upload_summary_file(encounter, summary_file, file, digest)
+        results[encounter.external_id] = summary_file
+    except Exception as e:
+        results[encounter.external_id] = e
     finally:
         clear_lock(encounter.external_id)
 
-    return summary_file
+
+def generate_and_upload_discharge_summaries(encounters):
+    """
+    Generates the summaries of a batch of encounters. Data is fetched and
+    uploads are done here while the pdfs are compiled in parallel by the
+    renderer pool, with at most PENDING_SUMMARIES_PER_WORKER summaries per
+    worker in flight.
+    Returns {encounter external id: FileUpload or the exception it failed with}
+    """
+    results = {}
+    pending = deque()
+    max_pending = renderer.max_workers * PENDING_SUMMARIES_PER_WORKER
+    for encounter in encounters:
+        logger.info("Generating Discharge Summary for %s", encounter.external_id)
+        set_lock(encounter.external_id, 5)
+        try:
+            data = get_discharge_summary_data(encounter)
+            digest = get_summary_digest(data)
+            if summary_file := get_cached_summary_file(digest):
+                logger.info(
+                    "Discharge Summary for %s is unchanged, reusing file id: %s",
+                    encounter.external_id,
+                    summary_file.id,
+                )
+                results[encounter.external_id] = summary_file
+                clear_lock(encounter.external_id)
+                continue
+
+            set_lock(encounter.external_id, 10)
+            current_date = timezone.now()
+            summary_file = build_summary_file(encounter, current_date)
+            data["date"] = current_date
+            source = render_discharge_summary(data)
+
+            set_lock(encounter.external_id, 50)
+            file = tempfile.NamedTemporaryFile(suffix=".pdf")  # noqa: SIM115
+            future = renderer.submit(source, file.name)
+            pending.append((encounter, summary_file, digest, file, future))
+        except Exception as e:
+            results[encounter.external_id] = e
+            clear_lock(encounter.external_id)
+        if len(pending) >= max_pending:
+            finish_discharge_summary(results, *pending.popleft())
+
+    while pending:
+        finish_discharge_summary(results, *pending.popleft())
+    return results
+
+
+def generate_and_upload_discharge_summary(encounter: Encounter):
+    result = generate_and_upload_discharge_summaries([encounter])[encounter.external_id]
+    if isinstance(result, Exception):
+        raise result
+    return result
 
 
 def generate_discharge_report_signed_url(patient_external_id: str):
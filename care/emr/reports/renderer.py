@@ -0,0 +1,138 @@
+"""
+Pool of typst renderer workers.
+
+Every worker thread owns a working directory where the static assets of the
+reports (the logo) are staged once, so rendering a report only writes its
+template and runs typst there. Reports of a batch are compiled in parallel, up
+to ``TYPST_RENDER_WORKERS`` at a time, while the caller keeps doing the database
+work and uploads of the other reports.
+
+typst has no resident compile server, every report is still compiled by a
+``typst compile`` process, the pool only removes the per report setup and the
+serial waits.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+LOGO_NAME = "black-logo.svg"
+TEMPLATE_NAME = "template.typ"
+
+
+def get_logo_path():
+    return Path(settings.BASE_DIR) / "staticfiles" / "images" / "logos" / LOGO_NAME
+
+
+class TypstRenderer:
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self._worker_state = threading.local()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def get_executor(self):
+        # Celery forks its workers, a pool created in the parent has no threads
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="typst-renderer"
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def get_workdir(self):
+        """
+        Working directory of the current worker, with the assets staged
+        """
+        workdir = getattr(self._worker_state, "workdir", None)
+        if workdir is None or not workdir.exists():
+            workdir = Path(tempfile.mkdtemp(prefix="typst-renderer-"))
+            shutil.copyfile(get_logo_path(), workdir / LOGO_NAME)
+            self._worker_state.workdir = workdir
+        return workdir
+
+    def compile(self, source, output_file, queued_at=None):
+        """
+        Compiles the typst source into output_file, raises CalledProcessError
+        when typst fails
+        """
+        start = time.monotonic()
+        workdir = self.get_workdir()
+        (workdir / TEMPLATE_NAME).write_text(source)
+        try:
+            subprocess.run(  # noqa: S603
+                [settings.TYPST_BIN, "compile", TEMPLATE_NAME, str(output_file)],
+                capture_output=True,
+                check=True,
+                shell=False,
+                cwd=workdir,
+            )
+        except subprocess.CalledProcessError:
+            self.record(start, queued_at, success=False)
+            raise
+        self.record(start, queued_at, success=True)
+
+    def submit(self, source, output_file):
+        """
+        Queues the compilation on the pool and returns its future
+        """
+        return self.get_executor().submit(
+            self.compile, source, output_file, time.monotonic()
+        )
+
+    def record(self, start, queued_at, *, success):
+        now = time.monotonic()
+        render_ms = (now - start) * 1000
+        with self._stats_lock:
+            stats = self._stats
+            stats["rendered" if success else "failed"] += 1
+            stats["render_ms"] += render_ms
+            stats["max_render_ms"] = max(stats["max_render_ms"], render_ms)
+            if queued_at is not None:
+                stats["queue_ms"] += (start - queued_at) * 1000
+
+    def get_stats(self):
+        """
+        Returns the in process throughput / latency of the renderer
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+            elapsed = time.monotonic() - self._stats_since
+        jobs = stats["rendered"] + stats["failed"]
+        stats["avg_render_ms"] = round(stats["render_ms"] / jobs, 2) if jobs else 0
+        stats["avg_queue_ms"] = round(stats["queue_ms"] / jobs, 2) if jobs else 0
+        stats["per_minute"] = round(jobs * 60 / elapsed, 2) if elapsed else 0
+        return stats
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {
+                "rendered": 0,
+                "failed": 0,
+                "render_ms": 0.0,
+                "max_render_ms": 0.0,
+                "queue_ms": 0.0,
+            }
+            self._stats_since = time.monotonic()
+
+
+renderer = TypstRenderer(settings.TYPST_RENDER_WORKERS)
+
+
+def get_renderer_stats():
+    return renderer.get_stats()
+
+
+def reset_renderer_stats():
+    renderer.reset_stats()
@@ -1,14 +1,67 @@
 import datetime
 import uuid
+from dataclasses import dataclass
 from enum import Enum
 from types import UnionType
 from typing import Annotated, Union, get_origin
 
 import phonenumbers
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, QuerySet, prefetch_related_objects
+from django.db.models.query import ModelIterable
 from pydantic import BaseModel, model_validator
+from pydantic_core import PydanticSerializationError, to_jsonable_python
 from pydantic_extra_types.phone_numbers import PhoneNumberValidator
 
 from care.emr.resources.common.coding import Coding
+from care.emr.resources.timing import time_spec
+
+
+@dataclass(frozen=True)
+class SerializerPlan:
+    """
+    Everything `EMRResource.serialize` and `EMRResource.de_serialize` need that
+    only depends on the spec class
+    """
+
+    # Database fields copied onto the spec
+    fields: tuple[str, ...]
+    # Spec fields emitted by `to_json`, with their defaults
+    output_fields: tuple[tuple[str, object], ...]
+    # Rows can be dumped straight to JSON without building the pydantic object
+    direct_emit: bool
+    # Rows can be fetched with `.values()` instead of model instances
+    values_only: bool
+    # Spec fields written to database columns by `de_serialize`
+    writable_fields: frozenset[str]
+    # Spec fields never read from or written to the database object
+    excluded: frozenset[str]
+    # Relations read while serializing, own and nested specs' ones
+    select_related: tuple[str, ...] = ()
+    prefetch_related: tuple[str | Prefetch, ...] = ()
+
+
+_serializer_plans: dict[type, SerializerPlan] = {}
+
+
+def prefix_lookups(relation, lookups):
+    prefixed = []
+    for lookup in lookups:
+        if isinstance(lookup, Prefetch):
+            prefixed.append(
+                Prefetch(
+                    f"{relation}__{lookup.prefetch_through}",
+                    queryset=lookup.queryset,
+                    to_attr=lookup.to_attr,
+                )
+            )
+        else:
+            prefixed.append(f"{relation}__{lookup}")
+    return prefixed
+
+
+def get_lookup_path(lookup):
+    return lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup
 
 
 class EMRResource(BaseModel):
@@ -17,6 +70,13 @@ class EMRResource(BaseModel):
     meta: dict = {}
     __questionnaire_cache__ = {}
     __store_metadata__ = False
+    # Relations read by perform_extra_serialization, used to plan the queries of
+    # list and retrieve so that serializing a row does not query the database
+    __select_related__ = ()
+    __prefetch_related__ = ()
+    # Relations serialized with another spec, {"relation": Spec}, the relations
+    # that spec reads are planned as well
+    __nested_specs__ = {}
 
     @classmethod
     def get_database_mapping(cls):
@@ -28,6 +88,134 @@ class EMRResource(BaseModel):
             database_fields.append(field.name)
         return database_fields
 
+    @classmethod
+    def get_serializer_plan(cls) -> SerializerPlan:
+        """
+        Compiled once per spec class, the database mapping does not change at runtime
+        """
+        plan = _serializer_plans.get(cls)
+        if plan is not None:
+            return plan
+        model_fields = {
+            field.name: field
+            for field in cls.__model__._meta.fields  # noqa SLF001
+        }
+        fields = tuple(
+            field
+            for field in cls.get_database_mapping()
+            if field in cls.model_fields and field not in cls.__exclude__
+        )
+        output_fields = tuple(
+            (name, field_info)
+            for name, field_info in cls.model_fields.items()
+            if name != "meta"
+        )
+        decorators = cls.__pydantic_decorators__
+        direct_emit = (
+            cls.to_json is EMRResource.to_json
+            and not decorators.field_serializers
+            and not decorators.model_serializers
+            and not cls.model_computed_fields
+            and cls.model_config.get("extra") != "allow"
+            and not any(
+                field_info.serialization_alias or field_info.alias
+                for field_info in cls.model_fields.values()
+            )
+        )
+        values_only = (
+            direct_emit
+            and not cls.__store_metadata__
+            and cls.perform_extra_serialization.__func__
+            is EMRResource.perform_extra_serialization.__func__
+            and all(
+                field in model_fields and not model_fields[field].is_relation
+                for field in fields
+            )
+        )
+        excluded = frozenset(cls.__exclude__)
+        writable_fields = frozenset(
+            field
+            for field in cls.get_database_mapping()
+            if field in cls.model_fields
+            and field not in excluded
+            and field not in ("id", "external_id")
+        )
+        select_related, prefetch_related = cls.get_relation_plan()
+        plan = SerializerPlan(
+            fields=fields,
+            output_fields=output_fields,
+            direct_emit=direct_emit,
+            values_only=values_only,
+            writable_fields=writable_fields,
+            excluded=excluded,
+            select_related=select_related,
+            prefetch_related=prefetch_related,
+        )
+        _serializer_plans[cls] = plan
+        return plan
+
+    @classmethod
+    def get_relation_plan(cls):
+        """
+        Derives the select_related / prefetch_related lookups from the relations
+        the spec and its nested specs declare. Forward foreign keys are joined,
+        everything else is prefetched.
+        """
+        select_related = list(cls.__select_related__)
+        prefetch_related = list(cls.__prefetch_related__)
+        for relation, spec in cls.__nested_specs__.items():
+            nested_plan = spec.get_serializer_plan()
+            try:
+                field = cls.__model__._meta.get_field(relation)  # noqa SLF001
+                joinable = field.concrete and (field.many_to_one or field.one_to_one)
+            except FieldDoesNotExist:
+                joinable = False
+            if joinable:
+                select_related.append(relation)
+                select_related.extend(
+                    prefix_lookups(relation, nested_plan.select_related)
+                )
+                prefetch_related.extend(
+                    prefix_lookups(relation, nested_plan.prefetch_related)
+                )
+                continue
+            if relation not in map(get_lookup_path, prefetch_related):
+                prefetch_related.append(relation)
+            prefetch_related.extend(
+                prefix_lookups(
+                    relation,
+                    [*nested_plan.select_related, *nested_plan.prefetch_related],
+                )
+            )
+        return tuple(dict.fromkeys(select_related)), tuple(prefetch_related)
+
+    @classmethod
+    def get_serialization_queryset(cls, queryset, user=None):
+        """
+        Switches the queryset to `.values()` rows when nothing but plain columns
+        are serialized, skipping model instantiation for every row.
+        Otherwise fetches the relations the spec declares along with the rows.
+        """
+        plan = cls.get_serializer_plan()
+        if not plan.values_only or user:
+            if plan.select_related:
+                queryset = queryset.select_related(*plan.select_related)
+            if plan.prefetch_related:
+                queryset = queryset.prefetch_related(*plan.prefetch_related)
+            return queryset
+        return queryset.prefetch_related(None).values(*plan.fields, "external_id")
+
+    @classmethod
+    def prefetch_relations(cls, instances):
+        """
+        Loads the relations the spec declares onto already fetched instances,
+        relations that are already loaded are skipped
+        """
+        plan = cls.get_serializer_plan()
+        prefetch_related_objects(
+            instances, *plan.select_related, *plan.prefetch_related
+        )
+
     @classmethod
     def get_serializer_context(cls, info):
         if info and info.context:
@@ -50,11 +238,17 @@ class EMRResource(BaseModel):
         """
         Creates a pydantic object from a database object
         """
-        mappings = cls.get_database_mapping()
-        constructed = {}
-        for mapping in mappings:
-            if mapping in cls.model_fields and mapping not in cls.__exclude__:
-                constructed[mapping] = getattr(obj, mapping)
+        with time_spec(cls, "serialize"):
+            return cls.model_construct(**cls.serialize_mapping(obj, user))
+
+    @classmethod
+    def serialize_mapping(cls, obj, user=None):
+        """
+        The field mapping `serialize` constructs the pydantic object from
+        """
+        constructed = {
+            field: getattr(obj, field) for field in cls.get_serializer_plan().fields
+        }
         if cls.__store_metadata__:
             for field in getattr(obj, "meta", {}):
                 if field in cls.model_fields:
@@ -62,7 +256,48 @@ class EMRResource(BaseModel):
         cls.perform_extra_serialization(constructed, obj)
         if user:
             cls.perform_extra_user_serialization(constructed, obj, user=user)
-        return cls.model_construct(**constructed)
+        return constructed
+
+    @classmethod
+    def emit_json(cls, constructed):
+        """
+        Equivalent of `model_construct(**constructed).to_json()` for specs whose
+        plan allows it, without building the intermediate pydantic object
+        """
+        plan = cls.get_serializer_plan()
+        if not plan.direct_emit:
+            return cls.model_construct(**constructed).to_json()
+        data = {}
+        for name, field_info in plan.output_fields:
+            if name in constructed:
+                data[name] = constructed[name]
+            elif not field_info.is_required():
+                data[name] = field_info.get_default(call_default_factory=True)
+        try:
+            return to_jsonable_python(data)
+        except PydanticSerializationError:
+            return cls.model_construct(**constructed).to_json()
+
+    @classmethod
+    def serialize_many(cls, objs, user=None):
+        """
+        Serializes a queryset or a list of database objects (or the rows of a
+        `get_serialization_queryset` queryset) straight to JSON
+        """
+        plan = cls.get_serializer_plan()
+        iterable_class = getattr(objs, "_iterable_class", None)
+        if isinstance(objs, QuerySet) and iterable_class is ModelIterable:
+            objs = cls.get_serialization_queryset(objs, user)
+        results = []
+        with time_spec(cls, "serialize_many"):
+            for obj in objs:
+                if isinstance(obj, dict):
+                    constructed = {field: obj[field] for field in plan.fields}
+                    constructed["id"] = obj["external_id"]
+                else:
+                    constructed = cls.serialize_mapping(obj, user)
+                results.append(cls.emit_json(constructed))
+        return results
 
     def perform_extra_deserialization(self, is_update, obj):
         pass
@@ -71,26 +306,29 @@ class EMRResource(BaseModel):
         """
         Creates a database object from a pydantic object
         """
-        is_update = True
-        if not obj:
-            is_update = False
-            obj = self.__model__()
-        database_fields = self.get_database_mapping()
-        meta = getattr(obj, "meta", {})
-        dump = self.model_dump(mode="json", exclude_defaults=True)
-        for field in dump:
-            if (
-                field in database_fields
-                and field not in self.__exclude__
-                and field not in ["id", "external_id"]
-            ):
-                obj.__setattr__(field, dump[field])
-            elif field not in self.__exclude__ and self.__store_metadata__:
-                meta[field] = dump[field]
-        obj.meta = meta
-
-        self.perform_extra_deserialization(is_update, obj)
-        return obj
+        with time_spec(type(self), "de_serialize"):
+            is_update = True
+            if not obj:
+                is_update = False
+                obj = self.__model__()
+            plan = self.get_serializer_plan()
+            meta = getattr(obj, "meta", {})
+            if self.__store_metadata__:
+                dump = self.model_dump(mode="json", exclude_defaults=True)
+            else:
+                # Only the fields written to the database are needed
+                dump = self.model_dump(
+                    mode="json", exclude_defaults=True, include=plan.writable_fields
+                )
+            for field, value in dump.items():
+                if field in plan.writable_fields:
+                    obj.__setattr__(field, value)
+                elif field not in plan.excluded and self.__store_metadata__:
+                    meta[field] = value
+            obj.meta = meta
+
+            self.perform_extra_deserialization(is_update, obj)
+            return obj
 
     @classmethod
     def as_questionnaire(cls, parent_classes=None):  # noqa PLR0912
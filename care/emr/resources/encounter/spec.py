@@ -4,12 +4,7 @@ import datetime
 from django.utils import timezone
 from pydantic import UUID4, BaseModel
 
-from care.emr.models import (
-    Encounter,
-    EncounterOrganization,
-    FacilityLocationEncounter,
-    TokenBooking,
-)
+from care.emr.models import Encounter, TokenBooking
 from care.emr.models.patient import Patient
 from care.emr.resources.base import EMRResource, PeriodSpec
 from care.emr.resources.encounter.constants import (
@@ -94,6 +89,8 @@ class EncounterUpdateSpec(EncounterSpecBase):
 
 
 class EncounterListSpec(EncounterSpecBase):
+    __nested_specs__ = {"patient": PatientListSpec, "facility": FacilityBareMinimumSpec}
+
     patient: dict
     facility: dict
     status_history: dict
@@ -109,6 +106,15 @@ class EncounterListSpec(EncounterSpecBase):
 
 
 class EncounterRetrieveSpec(EncounterListSpec):
+    __select_related__ = ("created_by", "updated_by")
+    __prefetch_related__ = ("encounterorganization_set__organization",)
+    __nested_specs__ = {
+        **EncounterListSpec.__nested_specs__,
+        "appointment": TokenBookingReadSpec,
+        "current_location": FacilityLocationListSpec,
+        "facilitylocationencounter_set": FacilityLocationEncounterListSpecWithLocation,
+    }
+
     appointment: dict = {}
     created_by: dict = {}
     updated_by: dict = {}
@@ -123,10 +129,9 @@ class EncounterRetrieveSpec(EncounterListSpec):
             mapping["appointment"] = TokenBookingReadSpec.serialize(
                 obj.appointment
             ).to_json()
-        organizations = EncounterOrganization.objects.filter(encounter=obj)
         mapping["organizations"] = [
             FacilityOrganizationReadSpec.serialize(encounter_org.organization).to_json()
-            for encounter_org in organizations
+            for encounter_org in obj.encounterorganization_set.all()
         ]
         mapping["current_location"] = None
         if obj.current_location:
@@ -135,8 +140,10 @@ class EncounterRetrieveSpec(EncounterListSpec):
             ).to_json()
         mapping["location_history"] = [
             FacilityLocationEncounterListSpecWithLocation.serialize(i)
-            for i in FacilityLocationEncounter.objects.filter(encounter=obj).order_by(
-                "-created_date"
+            for i in sorted(
+                obj.facilitylocationencounter_set.all(),
+                key=lambda location_encounter: location_encounter.created_date,
+                reverse=True,
             )
         ]
         cls.serialize_audit_users(mapping, obj)
@@ -105,6 +105,8 @@ class FacilityLocationWriteSpec(FacilityLocationSpec):
 
 
 class FacilityLocationListSpec(FacilityLocationSpec):
+    __select_related__ = ("current_encounter__patient", "current_encounter__facility")
+
     parent: dict
     mode: str
     has_children: bool
@@ -124,6 +126,12 @@ class FacilityLocationListSpec(FacilityLocationSpec):
 
 
 class FacilityLocationRetrieveSpec(FacilityLocationListSpec):
+    __select_related__ = (
+        *FacilityLocationListSpec.__select_related__,
+        "created_by",
+        "updated_by",
+    )
+
     created_by: dict | None = None
     updated_by: dict | None = None
 
@@ -179,6 +187,8 @@ class FacilityLocationEncounterListSpec(FacilityLocationEncounterBaseSpec):
 
 
 class FacilityLocationEncounterListSpecWithLocation(FacilityLocationEncounterListSpec):
+    __nested_specs__ = {"location": FacilityLocationListSpec}
+
     location: dict
 
     @classmethod
@@ -188,6 +198,8 @@ class FacilityLocationEncounterListSpecWithLocation(FacilityLocationEncounterLis
 
 
 class FacilityLocationEncounterReadSpec(FacilityLocationEncounterBaseSpec):
+    __select_related__ = ("created_by", "updated_by")
+
     encounter: UUID4
     start_datetime: datetime.datetime
     end_datetime: datetime.datetime | None = None
@@ -16,6 +16,8 @@ class PatientOTPBaseSpec(EMRResource):
 
 
 class PatientOTPReadSpec(PatientOTPBaseSpec):
+    __select_related__ = ("geo_organization",)
+
     name: str
     gender: str
     phone_number: str
@@ -0,0 +1,128 @@
+"""
+Validation plans of questionnaires.
+
+The question tree of a questionnaire is compiled once into a flat plan: the
+answerable questions by id with their effective required flag and accepted
+choices, and the static part of the observation every question creates. A
+submission is then validated with a single pass over its answers.
+
+Plans are kept in process, keyed by the questionnaire id and recompiled when
+the questionnaire was modified since.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from care.emr.resources.observation.spec import ObservationStatus
+from care.emr.resources.questionnaire.spec import QuestionType
+
+QUESTIONNAIRE_PLAN_CACHE_SIZE = 512
+
+
+@dataclass(frozen=True)
+class QuestionPlan:
+    id: str
+    type: str
+    # Marked as required on the question itself
+    required: bool
+    # Required on the question or on any of its parent groups
+    effective_required: bool
+    repeats: bool
+    # Values a choice question accepts, empty when it has no answer options
+    choices: frozenset
+    answer_value_set: str | None
+
+
+@dataclass(frozen=True)
+class QuestionnairePlan:
+    # Answerable questions by id, in questionnaire order
+    questions: dict[str, QuestionPlan]
+    # Questions that have to be present in every response
+    required: tuple[str, ...]
+    # Static part of the observation created by every question, by id
+    observation_templates: dict[str, dict]
+
+
+def get_observation_template(question):
+    template = {
+        "status": ObservationStatus.final.value,
+        "value_type": question["type"],
+    }
+    if "category" in question:
+        template["category"] = question["category"]
+    if "code" in question:
+        template["main_code"] = question["code"]
+    return template
+
+
+def get_valid_choices(question):
+    return frozenset(
+        option["value"]
+        for option in question.get("answer_option") or []
+        if "value" in option
+    )
+
+
+def compile_questions(questions, plan, parent_required=False):
+    for question in questions:
+        plan["observation_templates"][question["id"]] = get_observation_template(
+            question
+        )
+        required = bool(question.get("required", False))
+        if question["type"] == QuestionType.structured.value:
+            continue
+        if question["type"] == QuestionType.group.value:
+            compile_questions(
+                question.get("questions") or [], plan, parent_required or required
+            )
+            continue
+        plan["questions"][question["id"]] = QuestionPlan(
+            id=question["id"],
+            type=question["type"],
+            required=required,
+            effective_required=parent_required or required,
+            repeats=bool(question.get("repeats", False)),
+            choices=get_valid_choices(question),
+            answer_value_set=question.get("answer_value_set"),
+        )
+
+
+def compile_questionnaire(questions):
+    plan = {"questions": {}, "observation_templates": {}}
+    compile_questions(questions, plan)
+    return QuestionnairePlan(
+        questions=plan["questions"],
+        required=tuple(
+            question.id for question in plan["questions"].values() if question.required
+        ),
+        observation_templates=plan["observation_templates"],
+    )
+
+
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def get_questionnaire_plan(questionnaire):
+    """
+    Returns the plan of the questionnaire, compiled on first use after every
+    change to it
+    """
+    with _plans_lock:
+        cached = _plans.get(questionnaire.id)
+        if cached and cached[0] == questionnaire.modified_date:
+            _plans.move_to_end(questionnaire.id)
+            return cached[1]
+    plan = compile_questionnaire(questionnaire.questions)
+    with _plans_lock:
+        _plans[questionnaire.id] = (questionnaire.modified_date, plan)
+        _plans.move_to_end(questionnaire.id)
+        while len(_plans) > QUESTIONNAIRE_PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
+
+
+def clear_questionnaire_plans():
+    with _plans_lock:
+        _plans.clear()
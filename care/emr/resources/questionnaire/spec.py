@@ -2,6 +2,7 @@ import uuid
 from enum import Enum
 from typing import Any
 
+from django.db.models import QuerySet
 from pydantic import UUID4, ConfigDict, Field, field_validator, model_validator
 
 from care.emr.models import Questionnaire, QuestionnaireTag, ValueSet
@@ -268,12 +269,24 @@ class QuestionnaireReadSpec(QuestionnaireBaseSpec):
     updated_by: UserSpec = dict
     tags: list[dict] = []
 
+    @classmethod
+    def serialize_many(cls, objs, user=None):
+        # Resolves the tags of every questionnaire at once
+        if isinstance(objs, QuerySet):
+            objs = cls.get_serialization_queryset(objs, user)
+        objs = list(objs)
+        tags = QuestionnaireTag.get_tags({tag for obj in objs for tag in obj.tags})
+        for obj in objs:
+            obj._serialized_tags = [tags[tag] for tag in obj.tags]  # noqa SLF001
+        return super().serialize_many(objs, user)
+
     @classmethod
     def perform_extra_serialization(cls, mapping, obj):
         mapping["id"] = obj.external_id
-        tags = []
-        for tag in obj.tags:
-            tags.append(QuestionnaireTag.get_tag(tag))
+        tags = getattr(obj, "_serialized_tags", None)
+        if tags is None:
+            serialized_tags = QuestionnaireTag.get_tags(obj.tags)
+            tags = [serialized_tags[tag] for tag in obj.tags]
         mapping["tags"] = tags
         if obj.created_by:
             mapping["created_by"] = UserSpec.serialize(obj.created_by)
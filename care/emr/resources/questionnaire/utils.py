@@ -10,42 +10,19 @@ from care.emr.models.encounter import Encounter
 from care.emr.models.observation import Observation
 from care.emr.models.patient import Patient
 from care.emr.models.questionnaire import Questionnaire, QuestionnaireResponse
-from care.emr.registries.care_valueset.care_valueset import validate_valueset
-from care.emr.resources.observation.spec import ObservationSpec, ObservationStatus
+from care.emr.registries.care_valueset.care_valueset import validate_valueset_codings
+from care.emr.resources.observation.spec import ObservationSpec
+from care.emr.resources.questionnaire.plan import get_questionnaire_plan
 from care.emr.resources.questionnaire.spec import QuestionType
 
 
-def check_required(questionnaire, questionnaire_ref):
-    """
-    Recursively check if the question is marked as required anywhere in its parents
-    """
-    if questionnaire.get("required", False):
-        return True
-    if questionnaire.get("parent"):
-        return check_required(
-            questionnaire_ref[questionnaire.get("parent")], questionnaire_ref
-        )
-    return False
-
-
-def get_valid_choices(question):
-    """
-    Extracts valid choices from a choice question dictionary.
-    """
-    answer_options = question.get("answer_option", [])
-    if not answer_options:
-        error = f"No 'answer_option' found in question with id {question.get('id')}."
-        raise ValueError(error)
-
-    return [option["value"] for option in answer_options if "value" in option]
-
-
-def validate_data(values, value_type, questionnaire_ref):  # noqa PLR0912
+def validate_data(values, value_type, choices=frozenset()):  # noqa PLR0912
     """
     Validate the type of the value based on the question type.
     Args:
         values: List of values to validate
         value_type: Type of the question (from QuestionType enum)
+        choices: Values accepted by a choice question
     Returns:
         list: List of validation errors, empty if validation succeeds
     """
@@ -70,7 +47,7 @@ def validate_data(values, value_type, questionnaire_ref):  # noqa PLR0912
             elif value_type == QuestionType.time.value:
                 datetime.strptime(value.value, "%H:%M:%S")  # noqa DTZ007
             elif value_type == QuestionType.choice.value:
-                if value.value not in get_valid_choices(questionnaire_ref):
+                if value.value not in choices:
                     errors.append(f"Invalid {value_type}")
             elif value_type == QuestionType.url.value:
                 parsed = urlparse(value.value)
@@ -84,135 +61,114 @@ def validate_data(values, value_type, questionnaire_ref):  # noqa PLR0912
     return errors
 
 
-def validate_question_result(  # noqa : PLR0912
-    questionnaire, responses, errors, parent, questionnaire_mapping
-):
-    questionnaire["parent"] = parent
-    # Validate question responses
-    if questionnaire["type"] == QuestionType.structured.value:
+def validate_question_result(question, response, errors, valueset_checks):
+    """
+    Validates the answer to a question of the questionnaire plan.
+    Codings that have to be validated against a valueset are collected into
+    `valueset_checks` as (valueset slug, coding, question id), they are validated
+    together once the whole response is walked, see `validate_valueset_checks`
+    """
+    values = response.values
+    # Case when the question is answered but is empty
+    if not values and question.effective_required:
+        err = "No value provided for question"
+        errors.append(
+            {
+                "question_id": question.id,
+                "type": "values_missing",
+                "msg": err,
+            }
+        )
         return
-    if questionnaire["type"] == QuestionType.group.value:
-        # Iterate and call all child questions
-        questionnaire_mapping[questionnaire["id"]] = questionnaire
-        if questionnaire["questions"]:
-            for question in questionnaire["questions"]:
-                validate_question_result(
-                    question,
-                    responses,
-                    errors,
-                    questionnaire["id"],
-                    questionnaire_mapping,
-                )
-    else:
-        # Case when question is not answered ( Not in response )
-        if questionnaire["id"] not in responses and questionnaire.get(
-            "required", False
-        ):
-            errors.append(
-                {"question_id": questionnaire["id"], "error": "Question not answered"}
-            )
-            return
-        if questionnaire["id"] not in responses:
-            return
-        values = responses[questionnaire["id"]].values
-        # Case when the question is answered but is empty
-        if not values and check_required(questionnaire, questionnaire_mapping):
-            err = "No value provided for question"
-            errors.append(
+    # Check for type errors
+    if question.repeats:
+        values = values[0:1]
+    type_errors = validate_data(values, question.type, question.choices)
+    if type_errors:
+        errors.extend(
+            [
                 {
-                    "question_id": questionnaire["id"],
-                    "type": "values_missing",
-                    "msg": err,
+                    "type": "type_error",
+                    "question_id": question.id,
+                    "msg": error,
                 }
+                for error in type_errors
+            ]
+        )
+    # Validate for code and quantity
+    if question.type == QuestionType.choice.value and question.answer_value_set:
+        for value in values:
+            if not value.coding:
+                errors.append(
+                    {
+                        "type": "type_error",
+                        "question_id": question.id,
+                        "msg": "Coding is required",
+                    }
+                )
+                return
+            # Validate code
+            valueset_checks.append(
+                (question.answer_value_set, value.coding, question.id)
             )
-            return
-        # Check for type errors
-        value_type = questionnaire["type"]
-        if questionnaire.get("repeats", False):
-            values = responses[questionnaire["id"]].values[0:1]
-        type_errors = validate_data(values, value_type, questionnaire)
-        if type_errors:
-            errors.extend(
-                [
+    # TODO : Validate for options created by user as well
+    if question.type == QuestionType.quantity.value:
+        for value in values:
+            if not value.unit:
+                errors.append(
                     {
                         "type": "type_error",
-                        "question_id": questionnaire["id"],
-                        "msg": error,
+                        "question_id": question.id,
+                        "msg": "Quantity is required",
                     }
-                    for error in type_errors
-                ]
+                )
+                return
+            # Validate code
+            # TODO : Validate for options created by user as well
+            if question.answer_value_set and value.coding:
+                valueset_checks.append(
+                    (question.answer_value_set, value.coding, question.id)
+                )
+    # ( check if the code belongs to the valueset or options list)
+
+
+def validate_responses(plan, responses, errors, valueset_checks):
+    """
+    Validates a submission against the questionnaire plan, answers to questions
+    that are not part of the questionnaire are ignored
+    """
+    for question_id in plan.required:
+        if question_id not in responses:
+            errors.append(
+                {"question_id": question_id, "error": "Question not answered"}
             )
-        # Validate for code and quantity
-        if questionnaire["type"] == QuestionType.choice.value and questionnaire.get(
-            "answer_value_set"
-        ):
-            for value in values:
-                if not value.coding:
-                    errors.append(
-                        {
-                            "type": "type_error",
-                            "question_id": questionnaire["id"],
-                            "msg": "Coding is required",
-                        }
-                    )
-                    return
-                # Validate code
-                if "answer_value_set" in questionnaire:
-                    try:
-                        validate_valueset(
-                            "",
-                            questionnaire["answer_value_set"],
-                            value.coding,
-                        )
-                    except ValueError:
-                        errors.append(
-                            {
-                                "type": "valueset_error",
-                                "question_id": questionnaire["id"],
-                                "msg": "Coding does not belong to the valueset",
-                            }
-                        )
-        # TODO : Validate for options created by user as well
-        if questionnaire["type"] == QuestionType.quantity.value:
-            for value in values:
-                if not value.unit:
-                    errors.append(
-                        {
-                            "type": "type_error",
-                            "question_id": questionnaire["id"],
-                            "msg": "Quantity is required",
-                        }
-                    )
-                    return
-                # Validate code
-                # TODO : Validate for options created by user as well
-                if "answer_value_set" in questionnaire:
-                    try:
-                        validate_valueset(
-                            "",
-                            questionnaire["answer_value_set"],
-                            value.coding,
-                        )
-                    except ValueError:
-                        errors.append(
-                            {
-                                "type": "valueset_error",
-                                "question_id": questionnaire["id"],
-                                "msg": "Coding does not belong to the valueset",
-                            }
-                        )
-        # ( check if the code belongs to the valueset or options list)
+    for question_id, response in responses.items():
+        question = plan.questions.get(question_id)
+        if question:
+            validate_question_result(question, response, errors, valueset_checks)
 
 
-def create_observation_spec(questionnaire, responses, parent_id=None):
-    spec = {
-        "status": ObservationStatus.final.value,
-        "value_type": questionnaire["type"],
-    }
-    if "category" in questionnaire:
-        spec["category"] = questionnaire["category"]
-    if "code" in questionnaire:
-        spec["main_code"] = questionnaire["code"]
+def validate_valueset_checks(valueset_checks, errors):
+    """
+    Validates all the codings collected from a response in a single batched pass
+    """
+    if not valueset_checks:
+        return
+    invalid = validate_valueset_codings(
+        [(slug, coding) for slug, coding, _ in valueset_checks]
+    )
+    for index in sorted(invalid):
+        errors.append(
+            {
+                "type": "valueset_error",
+                "question_id": valueset_checks[index][2],
+                "msg": "Coding does not belong to the valueset",
+            }
+        )
+
+
+def create_observation_spec(questionnaire, responses, templates, parent_id=None):
+    spec = templates[questionnaire["id"]].copy()
     if questionnaire["type"] == QuestionType.group.value:
         spec["id"] = str(uuid.uuid4())
         spec["effective_datetime"] = timezone.now()
@@ -253,10 +209,10 @@ def create_observation_spec(questionnaire, responses, parent_id=None):
     return observations
 
 
-def create_components(questionnaire, responses):
+def create_components(questionnaire, responses, templates):
     components = []
     observations = convert_to_observation_spec(
-        questionnaire, responses, is_component=True
+        questionnaire, responses, templates, is_component=True
     )
     # Convert from observation spec into component spec
     # Need to handle how body site and method works in these cases
@@ -272,26 +228,28 @@ def create_components(questionnaire, responses):
 
 
 def convert_to_observation_spec(
-    questionnaire, responses, parent_id=None, is_component=False
+    questionnaire, responses, templates, parent_id=None, is_component=False
 ):
     constructed_observation_mapping = []
     for question in questionnaire.get("questions", []):
         if question["type"] == QuestionType.group.value:
-            observation = create_observation_spec(question, responses, parent_id)
+            observation = create_observation_spec(
+                question, responses, templates, parent_id
+            )
             if not is_component and question.get("is_component", False):
-                components = create_components(question, responses)
+                components = create_components(question, responses, templates)
                 observation[0]["component"] = components
                 constructed_observation_mapping.extend(observation)
             else:
                 sub_mapping = convert_to_observation_spec(
-                    question, responses, observation[0]["id"]
+                    question, responses, templates, observation[0]["id"]
                 )
                 if sub_mapping:
                     constructed_observation_mapping.extend(observation)
                     constructed_observation_mapping.extend(sub_mapping)
         elif question.get("code"):
             constructed_observation_mapping.extend(
-                create_observation_spec(question, responses, parent_id)
+                create_observation_spec(question, responses, templates, parent_id)
             )
 
     return constructed_observation_mapping
@@ -316,9 +274,9 @@ def handle_response(questionnaire_obj: Questionnaire, results, user):
     if not patient:
         raise ValidationError({"type": "object_not_found", "msg": "Patient not found"})
 
-    questionnaire_mapping = {}
     responses = {}
     errors = []
+    valueset_checks = []
     for result in results.results:
         responses[str(result.question_id)] = result
     if not responses:
@@ -328,19 +286,16 @@ def handle_response(questionnaire_obj: Questionnaire, results, user):
                 "msg": "Empty Questionnaire cannot be submitted",
             }
         )
-    for question in questionnaire_obj.questions:
-        validate_question_result(
-            question,
-            responses,
-            errors,
-            parent=None,
-            questionnaire_mapping=questionnaire_mapping,
-        )
+    plan = get_questionnaire_plan(questionnaire_obj)
+    validate_responses(plan, responses, errors, valueset_checks)
+    validate_valueset_checks(valueset_checks, errors)
     if errors:
         raise ValidationError({"errors": errors})
     # Validate and create observation objects
     observations = convert_to_observation_spec(
-        {"questions": questionnaire_obj.questions}, responses
+        {"questions": questionnaire_obj.questions},
+        responses,
+        plan.observation_templates,
     )
     # Bulk create observations
     observations_objects = [
@@ -374,6 +329,7 @@ def handle_response(questionnaire_obj: Questionnaire, results, user):
             temp.subject_id = results.resource_id
             temp.patient = patient
             temp.encounter = encounter
+            temp.update_denormalized_fields()
             bulk.append(temp)
 
         Observation.objects.bulk_create(bulk)
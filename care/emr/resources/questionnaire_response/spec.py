@@ -2,7 +2,7 @@ from datetime import datetime
 
 from pydantic import UUID4, BaseModel
 
-from care.emr.models.questionnaire import QuestionnaireResponse
+from care.emr.models.questionnaire import Questionnaire, QuestionnaireResponse
 from care.emr.resources.base import EMRResource
 from care.emr.resources.common import Coding
 from care.emr.resources.questionnaire.spec import QuestionnaireReadSpec
@@ -33,9 +33,88 @@ class QuestionnaireSubmitRequest(BaseModel):
     results: list[QuestionnaireSubmitResult]
 
 
-class QuestionnaireResponseReadSpec(EMRResource):
+class QuestionnaireResponseSpecBase(EMRResource):
     __model__ = QuestionnaireResponse
 
+    # Relations the fields built in `serialize_related_fields` are read from
+    __field_relations__ = {
+        "questionnaire": ("questionnaire",),
+        "questionnaire_version": ("questionnaire",),
+        "encounter": ("encounter",),
+        "created_by": ("created_by",),
+        "updated_by": ("updated_by",),
+    }
+
+    @classmethod
+    def perform_extra_serialization(cls, mapping, obj):
+        cls.serialize_related_fields(mapping, obj, cls.model_fields)
+
+    @classmethod
+    def serialize_questionnaire(cls, mapping, questionnaire):
+        raise NotImplementedError
+
+    @classmethod
+    def serialize_related_fields(cls, mapping, obj, fields):
+        mapping["id"] = obj.external_id
+        if "questionnaire" in fields or "questionnaire_version" in fields:
+            cls.serialize_questionnaire(mapping, obj.questionnaire)
+        if "encounter" in fields:
+            mapping["encounter"] = obj.encounter.external_id if obj.encounter else None
+        if "created_by" in fields and obj.created_by:
+            mapping["created_by"] = UserSpec.serialize(obj.created_by)
+        if "updated_by" in fields and obj.updated_by:
+            mapping["updated_by"] = UserSpec.serialize(obj.updated_by)
+
+    @classmethod
+    def get_fields_queryset(cls, queryset, fields):
+        """
+        Fetches only the columns and relations `fields` are built from
+        """
+        plan = cls.get_serializer_plan()
+        relations = {
+            relation
+            for field in fields
+            for relation in cls.__field_relations__.get(field, ())
+        }
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(
+            "external_id",
+            *[field for field in plan.fields if field in fields],
+            *{relation.split("__")[0] for relation in relations},
+        )
+
+    @classmethod
+    def serialize_fields(cls, objs, fields):
+        """
+        Serializes `fields` of the responses, the other fields are not built
+        """
+        plan = cls.get_serializer_plan()
+        results = []
+        for obj in objs:
+            mapping = {
+                field: getattr(obj, field) for field in plan.fields if field in fields
+            }
+            cls.serialize_related_fields(mapping, obj, fields)
+            results.append(
+                cls.model_construct(**mapping).model_dump(
+                    mode="json", include=set(fields)
+                )
+            )
+        return results
+
+
+class QuestionnaireResponseReadSpec(QuestionnaireResponseSpecBase):
+    __field_relations__ = {
+        **QuestionnaireResponseSpecBase.__field_relations__,
+        "questionnaire": (
+            "questionnaire",
+            "questionnaire__created_by",
+            "questionnaire__updated_by",
+        ),
+    }
+
     id: UUID4
     questionnaire: QuestionnaireReadSpec
     subject_id: str
@@ -49,17 +128,48 @@ class QuestionnaireResponseReadSpec(EMRResource):
     modified_date: datetime | None = None
 
     @classmethod
-    def perform_extra_serialization(cls, mapping, obj):
-        mapping["id"] = obj.external_id
-        if obj.questionnaire:
-            mapping["questionnaire"] = QuestionnaireReadSpec.serialize(
-                obj.questionnaire
-            )
-        if obj.encounter:
-            mapping["encounter"] = obj.encounter.external_id
+    def serialize_questionnaire(cls, mapping, questionnaire):
+        if questionnaire:
+            mapping["questionnaire"] = QuestionnaireReadSpec.serialize(questionnaire)
+
+
+class QuestionnaireResponseListSpec(QuestionnaireResponseSpecBase):
+    """
+    Compact representation of a response, the questionnaire is referenced by its
+    id and version instead of being embedded in every row
+    """
+
+    id: UUID4
+    questionnaire: str | None = None
+    questionnaire_version: str | None = None
+    subject_id: str
+    responses: list
+    encounter: str | None = None
+    structured_responses: dict
+    structured_response_type: str | None = None
+    created_by: UserSpec = dict
+    updated_by: UserSpec = dict
+    created_date: datetime | None = None
+    modified_date: datetime | None = None
+
+    @classmethod
+    def serialize_questionnaire(cls, mapping, questionnaire):
+        if questionnaire:
+            mapping["questionnaire"] = str(questionnaire.external_id)
+            mapping["questionnaire_version"] = questionnaire.version
         else:
-            mapping["encounter"] = None
-        if obj.created_by:
-            mapping["created_by"] = UserSpec.serialize(obj.created_by)
-        if obj.updated_by:
-            mapping["updated_by"] = UserSpec.serialize(obj.updated_by)
+            mapping["questionnaire"] = None
+
+
+def get_questionnaire_definitions(questionnaire_ids):
+    """
+    Serializes every questionnaire once, keyed by external id, for the side
+    table of compact response listings
+    """
+    questionnaires = Questionnaire.objects.filter(
+        id__in=questionnaire_ids
+    ).select_related("created_by", "updated_by")
+    return {
+        str(questionnaire["id"]): questionnaire
+        for questionnaire in QuestionnaireReadSpec.serialize_many(questionnaires)
+    }
@@ -10,13 +10,12 @@ from care.emr.resources.base import EMRResource
 from care.emr.resources.facility.spec import FacilityBareMinimumSpec
 from care.emr.resources.patient.otp_based_flow import PatientOTPReadSpec
 from care.emr.resources.user.spec import UserSpec
-from care.facility.models import Facility
-from care.users.models import User
 
 
 class TokenSlotBaseSpec(EMRResource):
     __model__ = TokenSlot
     __exclude__ = ["resource", "availability"]
+    __select_related__ = ("availability",)
 
     id: UUID4 | None = None
     availability: UUID4
@@ -69,6 +68,16 @@ class TokenBookingWriteSpec(TokenBookingBaseSpec):
 
 
 class TokenBookingReadSpec(TokenBookingBaseSpec):
+    __select_related__ = (
+        "booked_by",
+        "token_slot__resource__user",
+        "token_slot__resource__facility",
+    )
+    __nested_specs__ = {
+        "token_slot": TokenSlotBaseSpec,
+        "patient": PatientOTPReadSpec,
+    }
+
     id: UUID4 | None = None
 
     token_slot: TokenSlotBaseSpec
@@ -89,9 +98,9 @@ class TokenBookingReadSpec(TokenBookingBaseSpec):
         mapping["patient"] = PatientOTPReadSpec.serialize(obj.patient).model_dump(
             exclude=["meta"]
         )
-        mapping["user"] = UserSpec.serialize(
-            User.objects.get(id=obj.token_slot.resource.user_id)
-        ).model_dump(exclude=["meta"])
+        mapping["user"] = UserSpec.serialize(obj.token_slot.resource.user).model_dump(
+            exclude=["meta"]
+        )
         mapping["facility"] = FacilityBareMinimumSpec.serialize(
-            Facility.objects.get(id=obj.token_slot.resource.facility_id)
+            obj.token_slot.resource.facility
         ).model_dump(exclude=["meta"])
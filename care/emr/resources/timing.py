@@ -0,0 +1,72 @@
+"""
+Per spec timing of serialize / de_serialize calls.
+
+Timings are collected in process and only when ``SPEC_TIMING_ENABLED`` is set,
+they are inclusive, ie. a spec serializing nested specs (created_by, patient etc.)
+includes the time spent in them.
+Use ``get_spec_timings`` from a shell (or a silk profile) to see which specs are
+the most expensive.
+"""
+
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Lock
+
+from django.conf import settings
+
+
+@dataclass
+class SpecTiming:
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def add(self, duration_ms):
+        self.calls += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+
+_timings: dict[tuple[str, str], SpecTiming] = {}
+_timings_lock = Lock()
+
+
+@contextmanager
+def time_spec(spec, operation):
+    if not settings.SPEC_TIMING_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        with _timings_lock:
+            _timings.setdefault((spec.__name__, operation), SpecTiming()).add(
+                duration_ms
+            )
+
+
+def get_spec_timings():
+    """
+    Returns the collected timings, most expensive first
+    """
+    with _timings_lock:
+        timings = [
+            {
+                "spec": spec,
+                "operation": operation,
+                "calls": timing.calls,
+                "total_ms": round(timing.total_ms, 2),
+                "avg_ms": round(timing.total_ms / timing.calls, 3),
+                "max_ms": round(timing.max_ms, 2),
+            }
+            for (spec, operation), timing in _timings.items()
+        ]
+    return sorted(timings, key=lambda timing: timing["total_ms"], reverse=True)
+
+
+def reset_spec_timings():
+    with _timings_lock:
+        _timings.clear()
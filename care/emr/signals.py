@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from care.emr.models.scheduling.schedule import (
+    Availability,
+    AvailabilityException,
+    Schedule,
+)
+from care.emr.tasks.slots import materialize_resource_slots
+from care.emr.utils.slots import invalidate_materialized_slots
+
+
+def schedule_slot_materialization(resource_id):
+    def materialize():
+        invalidate_materialized_slots(resource_id)
+        materialize_resource_slots.delay(resource_id)
+
+    transaction.on_commit(materialize)
+
+
+@receiver([post_save, post_delete], sender=Schedule)
+@receiver([post_save, post_delete], sender=AvailabilityException)
+def materialize_slots_on_schedule_change(sender, instance, **kwargs):
+    schedule_slot_materialization(instance.resource_id)
+
+
+@receiver([post_save, post_delete], sender=Availability)
+def materialize_slots_on_availability_change(sender, instance, **kwargs):
+    schedule_slot_materialization(instance.schedule.resource_id)
@@ -5,7 +5,10 @@ from celery import shared_task
 from celery.utils.log import get_task_logger
 
 from care.emr.models.encounter import Encounter
-from care.emr.reports.discharge_summary import generate_and_upload_discharge_summary
+from care.emr.reports.discharge_summary import (
+    generate_and_upload_discharge_summaries,
+    generate_and_upload_discharge_summary,
+)
 from care.utils.exceptions import CeleryTaskError
 
 logger: Logger = get_task_logger(__name__)
@@ -31,3 +34,28 @@ def generate_discharge_summary_task(encounter_ext_id: str):
         raise CeleryTaskError(msg)
 
     return summary_file.id
+
+
+@shared_task(expires=30 * 60)
+def generate_discharge_summaries_task(encounter_ext_ids: list[str]):
+    """
+    Generate and Upload the Discharge Summaries of a batch of encounters, the
+    pdfs are compiled in parallel
+    """
+    logger.info("Generating Discharge Summaries for %s", encounter_ext_ids)
+    encounters = Encounter.objects.filter(
+        external_id__in=encounter_ext_ids
+    ).select_related("patient", "facility")
+    summary_files = {}
+    for encounter_ext_id, result in generate_and_upload_discharge_summaries(
+        encounters
+    ).items():
+        if isinstance(result, Exception):
+            logger.error(
+                "Unable to generate discharge summary for %s: %s",
+                encounter_ext_id,
+                result,
+            )
+            continue
+        summary_files[str(encounter_ext_id)] = result.id
+    return summary_files
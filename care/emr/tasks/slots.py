@@ -0,0 +1,43 @@
+from datetime import timedelta
+from logging import Logger
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.utils import timezone
+
+from care.emr.models.scheduling.schedule import SchedulableUserResource
+from care.emr.utils.slots import materialize_slots_for_range
+from care.utils.lock import Lock, ObjectLocked
+
+logger: Logger = get_task_logger(__name__)
+
+
+@shared_task(
+    autoretry_for=(ObjectLocked,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 5},
+)
+def materialize_resource_slots(resource_id: int):
+    """
+    Roll forward the TokenSlots of a resource for the next SLOT_MATERIALIZE_DAYS
+    """
+    resource = SchedulableUserResource.objects.filter(id=resource_id).first()
+    if not resource:
+        return
+    today = timezone.localdate()
+    with Lock(f"slots:resource:{resource.id}"):
+        materialize_slots_for_range(
+            resource, today, today + timedelta(days=settings.SLOT_MATERIALIZE_DAYS)
+        )
+
+
+@shared_task
+def materialize_all_slots():
+    """
+    Daily roll forward, so that the materialized window keeps moving
+    """
+    resource_ids = SchedulableUserResource.objects.values_list("id", flat=True)
+    for resource_id in resource_ids.iterator():
+        materialize_resource_slots.delay(resource_id)
+    logger.info("Scheduled slot materialization for all resources")
@@ -0,0 +1,20 @@
+from logging import Logger
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+
+from care.emr.fhir import cache as fhir_cache
+from care.emr.fhir.resources.base import ResourceManger
+
+logger: Logger = get_task_logger(__name__)
+
+
+@shared_task(expires=fhir_cache.REFRESH_LOCK_TIMEOUT)
+def refresh_fhir_query(cache_key: str, payload: dict):
+    """
+    Refresh a stale terminology server response in the cache
+    """
+    try:
+        ResourceManger().fetch(cache_key, payload)
+    finally:
+        fhir_cache.release_refresh(cache_key)
@@ -0,0 +1,163 @@
+import threading
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from care.emr.models import Condition
+from care.emr.resources.condition.spec import (
+    CategoryChoices,
+    ClinicalStatusChoices,
+    VerificationStatusChoices,
+)
+from care.emr.utils.batch_requests import (
+    execute_concurrently,
+    get_wsgi_request_object,
+    plan_batch,
+)
+from care.security.permissions.encounter import EncounterPermissions
+from care.utils.tests.base import CareAPITestBase
+
+
+class TestBatchRequestViewSet(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.facility = self.create_facility(user=self.user)
+        self.organization = self.create_facility_organization(facility=self.facility)
+        self.patient = self.create_patient()
+        role = self.create_role_with_permissions(
+            [EncounterPermissions.can_write_encounter.name]
+        )
+        self.attach_role_facility_organization_user(self.organization, self.user, role)
+        self.encounter = self.create_encounter(
+            patient=self.patient,
+            facility=self.facility,
+            organization=self.organization,
+        )
+        # Sub-requests authenticate with the authorization header of the batch
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}"
+        )
+        self.base_url = reverse("batch-requests-list")
+        self.symptom_url = reverse(
+            "symptom-list", kwargs={"patient_external_id": self.patient.external_id}
+        )
+        self.valid_code = {
+            "display": "Test Value",
+            "system": "http://test_system.care/test",
+            "code": "123",
+        }
+        self.patcher = patch(
+            "care.emr.resources.condition.spec.validate_valueset",
+            return_value=self.valid_code,
+        )
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def generate_symptom_request(self, reference_id, **kwargs):
+        return {
+            "url": self.symptom_url,
+            "method": "POST",
+            "reference_id": reference_id,
+            "body": {
+                "encounter": str(self.encounter.external_id),
+                "category": CategoryChoices.problem_list_item.value,
+                "clinical_status": ClinicalStatusChoices.active.value,
+                "verification_status": VerificationStatusChoices.confirmed.value,
+                "code": self.valid_code,
+                **kwargs,
+            },
+        }
+
+    def test_batch_of_creates_to_same_route(self):
+        response = self.client.post(
+            self.base_url,
+            {
+                "requests": [
+                    self.generate_symptom_request("first"),
+                    self.generate_symptom_request("second"),
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result["status_code"] for result in response.data["results"]],
+            [200, 200],
+        )
+        self.assertEqual(Condition.objects.filter(encounter=self.encounter).count(), 2)
+
+    def test_mixed_batch_reports_every_result_and_rolls_back(self):
+        response = self.client.post(
+            self.base_url,
+            {
+                "requests": [
+                    self.generate_symptom_request("first"),
+                    self.generate_symptom_request(
+                        "invalid", clinical_status="not_a_status"
+                    ),
+                    self.generate_symptom_request("last"),
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        results = response.data["results"]
+        self.assertEqual(
+            [result["reference_id"] for result in results],
+            ["first", "invalid", "last"],
+        )
+        # The failing operation is rolled back alone, the ones after it still run
+        self.assertEqual([result["status_code"] for result in results], [200, 400, 200])
+        self.assertIn("errors", results[1]["data"])
+        self.assertEqual(results[2]["data"]["clinical_status"], "active")
+        # The batch is all or nothing
+        self.assertFalse(Condition.objects.filter(encounter=self.encounter).exists())
+
+    def test_plan_groups_writes_after_leading_reads(self):
+        requests = [
+            ("get", self.symptom_url, {}),
+            ("get", self.symptom_url, {}),
+            ("post", self.symptom_url, self.generate_symptom_request("a")["body"]),
+            ("post", self.symptom_url, self.generate_symptom_request("b")["body"]),
+            ("get", self.symptom_url, {}),
+        ]
+        parent_request = APIRequestFactory().post(self.base_url)
+        wsgi_requests = [
+            get_wsgi_request_object(parent_request, method, url, {}, body)
+            for method, url, body in requests
+        ]
+        steps = plan_batch(wsgi_requests, [body for _, _, body in requests])
+        self.assertEqual(
+            [(step, indices) for step, indices, _ in steps],
+            [("concurrent", [0, 1]), ("group", [2, 3]), ("serial", [4])],
+        )
+
+
+class TestExecuteConcurrently(CareAPITestBase):
+    @override_settings(BATCH_REQUEST_READ_WORKERS=3)
+    def test_reads_run_on_worker_threads_in_order(self):
+        # Every read waits for the others, this only passes if they run together
+        barrier = threading.Barrier(3, timeout=5)
+
+        def resp_generator(request):
+            barrier.wait()
+            return {"request": request, "thread": threading.get_ident()}
+
+        responses = execute_concurrently(["a", "b", "c"], resp_generator)
+        self.assertEqual(
+            [response["request"] for response in responses], ["a", "b", "c"]
+        )
+        self.assertEqual(len({response["thread"] for response in responses}), 3)
+
+    @override_settings(BATCH_REQUEST_READ_WORKERS=1)
+    def test_single_worker_runs_serially(self):
+        responses = execute_concurrently(
+            ["a", "b"], lambda request: threading.get_ident()
+        )
+        self.assertEqual(responses, [threading.get_ident()] * 2)
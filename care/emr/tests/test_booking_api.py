@@ -2,7 +2,9 @@ from datetime import UTC, datetime, timedelta
 
 from django.test.utils import ignore_warnings
 from django.urls import reverse
+from rest_framework.exceptions import ValidationError
 
+from care.emr.api.viewsets.scheduling.availability import lock_create_appointment
 from care.emr.models import (
     Availability,
     AvailabilityException,
@@ -109,6 +111,19 @@ class TestBookingViewSet(CareAPITestBase):
         response = self.client.get(self.base_url)
         self.assertEqual(response.status_code, 200)
 
+    def test_list_booking_queries_do_not_grow_with_rows(self):
+        """Serializing bookings does not query the database per booking."""
+        permissions = [UserSchedulePermissions.can_list_user_booking.name]
+        role = self.create_role_with_permissions(permissions)
+        self.attach_role_facility_organization_user(self.organization, self.user, role)
+
+        self.assert_list_queries_constant(
+            self.base_url,
+            lambda: self.create_booking(
+                patient=self.create_patient(), token_slot=self.create_slot()
+            ),
+        )
+
     def test_list_booking_without_permissions(self):
         """Users without can_list_user_booking permission cannot list bookings."""
         response = self.client.get(self.base_url)
@@ -231,6 +246,32 @@ class TestBookingViewSet(CareAPITestBase):
         tokens_allocated_after = booking.token_slot.allocated
         self.assertEqual(tokens_allocated_before - 1, tokens_allocated_after)
 
+    def test_cancel_booking_decrements_allocated_in_database(self):
+        """Cancelling frees one token of what is allocated now, not of a stale copy."""
+        permissions = [
+            UserSchedulePermissions.can_write_user_booking.name,
+            UserSchedulePermissions.can_list_user_booking.name,
+        ]
+        role = self.create_role_with_permissions(permissions)
+        self.attach_role_facility_organization_user(self.organization, self.user, role)
+
+        booking = self.create_booking()
+        # Other patients booked the slot after this booking was made
+        TokenSlot.objects.filter(id=self.slot.id).update(allocated=5)
+
+        cancel_url = reverse(
+            "appointments-cancel",
+            kwargs={
+                "facility_external_id": self.facility.external_id,
+                "external_id": booking.external_id,
+            },
+        )
+        data = {"reason": BookingStatusChoices.cancelled.value}
+        response = self.client.post(cancel_url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.allocated, 4)
+
     def test_cancel_booking_without_permission(self):
         """Users without proper permissions cannot cancel bookings via the cancel endpoint."""
         permissions = [
@@ -584,6 +625,37 @@ class TestSlotViewSetAppointmentApi(CareAPITestBase):
         )
         self.assertContains(response, status_code=400, text="Slot is already full")
 
+    def test_booking_last_token_of_a_slot(self):
+        """Once the last token is booked, the slot rejects other patients."""
+        permissions = [UserSchedulePermissions.can_create_appointment.name]
+        role = self.create_role_with_permissions(permissions)
+        self.attach_role_facility_organization_user(self.organization, self.user, role)
+
+        url = self._get_create_appointment_url(self.slot.external_id)
+        response = self.client.post(url, self.get_appointment_data(), format="json")
+        self.assertEqual(response.status_code, 200)
+        other_patient = self.create_patient()
+        response = self.client.post(
+            url,
+            self.get_appointment_data(patient=other_patient.external_id),
+            format="json",
+        )
+        self.assertContains(response, status_code=400, text="Slot is already full")
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.allocated, 1)
+        self.assertEqual(TokenBooking.objects.filter(token_slot=self.slot).count(), 1)
+
+    def test_booking_rechecks_capacity_of_locked_slot(self):
+        """Capacity is checked on the locked row, not on the slot passed in."""
+        stale_slot = TokenSlot.objects.get(id=self.slot.id)
+        lock_create_appointment(stale_slot, self.patient, self.user, "")
+        other_patient = self.create_patient()
+        self.assertEqual(stale_slot.allocated, 0)
+        with self.assertRaisesMessage(ValidationError, "Slot is already full"):
+            lock_create_appointment(stale_slot, other_patient, self.user, "")
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.allocated, 1)
+
 
 @ignore_warnings(category=RuntimeWarning, message=r".*received a naive datetime.*")
 class TestSlotViewSetSlotStatsApis(CareAPITestBase):
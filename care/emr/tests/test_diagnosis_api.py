@@ -692,3 +692,92 @@ class TestDiagnosisViewSet(CareAPITestBase):
         url = self._get_diagnosis_url(diagnosis.external_id)
         delete_response = self.client.delete(url, {}, format="json")
         self.assertEqual(delete_response.status_code, 403)
+
+    # UPSERT TESTS
+    def test_upsert_diagnoses_in_bulk(self):
+        """
+        Upserting creates and updates in bulk queries and sets the diagnosis
+        category on the created rows
+        """
+        permissions = [
+            EncounterPermissions.can_write_encounter.name,
+            PatientPermissions.can_view_clinical_data.name,
+        ]
+        role = self.create_role_with_permissions(permissions)
+        self.attach_role_facility_organization_user(self.organization, self.user, role)
+        encounter = self.create_encounter(
+            patient=self.patient,
+            facility=self.facility,
+            organization=self.organization,
+        )
+        diagnosis = self.create_diagnosis(encounter=encounter, patient=self.patient)
+        datapoints = [
+            self.generate_data_for_diagnosis(encounter),
+            self.generate_data_for_diagnosis(
+                encounter,
+                id=str(diagnosis.external_id),
+                clinical_status=ClinicalStatusChoices.resolved.value,
+            ),
+            self.generate_data_for_diagnosis(encounter),
+        ]
+        response = self.client.post(
+            reverse(
+                "diagnosis-upsert",
+                kwargs={"patient_external_id": self.patient.external_id},
+            ),
+            {"datapoints": datapoints},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        # Results are returned in the order of the datapoints
+        self.assertEqual(response.data[1]["id"], str(diagnosis.external_id))
+
+        diagnosis.refresh_from_db()
+        self.assertEqual(
+            diagnosis.clinical_status, ClinicalStatusChoices.resolved.value
+        )
+        created = Condition.objects.filter(
+            external_id__in=[response.data[0]["id"], response.data[2]["id"]]
+        )
+        self.assertEqual(
+            set(created.values_list("category", flat=True)),
+            {CategoryChoices.encounter_diagnosis.value},
+        )
+
+    def test_upsert_diagnoses_with_repeated_id_runs_serially(self):
+        """
+        Datapoints that update the same diagnosis depend on each other, the last
+        one wins
+        """
+        permissions = [
+            EncounterPermissions.can_write_encounter.name,
+            PatientPermissions.can_view_clinical_data.name,
+        ]
+        role = self.create_role_with_permissions(permissions)
+        self.attach_role_facility_organization_user(self.organization, self.user, role)
+        encounter = self.create_encounter(
+            patient=self.patient,
+            facility=self.facility,
+            organization=self.organization,
+        )
+        diagnosis = self.create_diagnosis(encounter=encounter, patient=self.patient)
+        datapoints = [
+            self.generate_data_for_diagnosis(
+                encounter, id=str(diagnosis.external_id), note="first"
+            ),
+            self.generate_data_for_diagnosis(
+                encounter, id=str(diagnosis.external_id), note="second"
+            ),
+        ]
+        response = self.client.post(
+            reverse(
+                "diagnosis-upsert",
+                kwargs={"patient_external_id": self.patient.external_id},
+            ),
+            {"datapoints": datapoints},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        diagnosis.refresh_from_db()
+        self.assertEqual(diagnosis.note, "second")
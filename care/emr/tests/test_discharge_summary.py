@@ -0,0 +1,279 @@
+import datetime
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from model_bakery import baker
+
+from care.emr.models import FileUpload, Observation
+from care.emr.reports import discharge_summary
+from care.emr.reports.renderer import TypstRenderer
+from care.emr.resources.file_upload.spec import FileCategoryChoices
+from care.emr.tasks.discharge_summary import generate_discharge_summaries_task
+from care.utils.tests.base import CareAPITestBase
+
+# Stands in for typst, "compiles" the template by copying it to the output
+FAKE_TYPST = """#!/bin/sh
+if grep -q invalid "$2"; then
+    echo "error: invalid source" >&2
+    exit 1
+fi
+cp "$2" "$3"
+"""
+
+
+class TestTypstRenderer(SimpleTestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = Path(tmpdir.name)
+        typst = self.tmpdir / "typst"
+        typst.write_text(FAKE_TYPST)
+        typst.chmod(0o755)
+        logo = self.tmpdir / "logo.svg"
+        logo.write_text("<svg/>")
+        patcher = patch("care.emr.reports.renderer.get_logo_path", return_value=logo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = override_settings(TYPST_BIN=str(typst))
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.renderer = TypstRenderer(max_workers=2)
+
+    def test_reports_compiled_on_worker_threads(self):
+        threads = set()
+        compile_report = self.renderer.compile
+
+        def compile_on_thread(*args):
+            threads.add(threading.current_thread().name)
+            compile_report(*args)
+
+        outputs = [self.tmpdir / f"report-{index}.pdf" for index in range(4)]
+        with patch.object(self.renderer, "compile", side_effect=compile_on_thread):
+            futures = [
+                self.renderer.submit(f"report {index}", output)
+                for index, output in enumerate(outputs)
+            ]
+            for future in futures:
+                future.result()
+        # Every worker stages its own directory, reports do not overwrite
+        # each other
+        for index, output in enumerate(outputs):
+            self.assertEqual(output.read_text(), f"report {index}")
+        self.assertTrue(all(name.startswith("typst-renderer") for name in threads))
+
+    def test_stats(self):
+        self.renderer.submit("report", self.tmpdir / "report.pdf").result()
+        with self.assertRaises(subprocess.CalledProcessError) as error:
+            self.renderer.submit("invalid", self.tmpdir / "invalid.pdf").result()
+        self.assertIn(b"invalid source", error.exception.stderr)
+        stats = self.renderer.get_stats()
+        self.assertEqual(stats["rendered"], 1)
+        self.assertEqual(stats["failed"], 1)
+        self.assertGreater(stats["avg_render_ms"], 0)
+        self.assertGreaterEqual(stats["max_render_ms"], stats["avg_render_ms"])
+        self.renderer.reset_stats()
+        self.assertEqual(self.renderer.get_stats()["rendered"], 0)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "config.caches.LocMemCache"}})
+class TestDischargeSummary(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = self.create_user()
+        self.facility = self.create_facility(user=self.user)
+        self.organization = self.create_facility_organization(facility=self.facility)
+        self.patient = self.create_patient(name="Test Patient", year_of_birth=1990)
+        self.encounter = self.create_encounter(
+            patient=self.patient,
+            facility=self.facility,
+            organization=self.organization,
+        )
+        self.sources = []
+        self.events = []
+        patcher = patch.object(
+            discharge_summary.renderer, "submit", side_effect=self.fake_submit
+        )
+        self.submit = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(
+            FileUpload.files_manager,
+            "put_object",
+            side_effect=lambda *args, **kwargs: self.events.append(("upload",)),
+        )
+        self.put_object = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_submit(self, source, output_file):
+        self.sources.append(source)
+        self.events.append(("submit", len(self.sources)))
+        Path(output_file).write_bytes(b"%PDF-1.7")
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def create_observation(self, **kwargs):
+        return baker.make(
+            Observation,
+            patient=self.patient,
+            encounter=self.encounter,
+            main_code={"system": "http://loinc.org", "code": "1", "display": "Pulse"},
+            value={"value": "72"},
+            **kwargs,
+        )
+
+    def generate(self):
+        return discharge_summary.generate_and_upload_discharge_summary(self.encounter)
+
+    def test_unchanged_summary_reuses_file(self):
+        self.create_observation()
+        summary_file = self.generate()
+        self.assertEqual(summary_file.file_category, "discharge_summary")
+        # The first summary is an upload of the encounter, it is not part of
+        # what the second one is rendered from
+        self.assertEqual(self.generate().id, summary_file.id)
+        self.assertEqual(self.submit.call_count, 1)
+        self.put_object.assert_called_once()
+        self.assertEqual(
+            FileUpload.objects.filter(
+                associating_id=self.encounter.external_id,
+                file_category=FileCategoryChoices.discharge_summary.value,
+            ).count(),
+            1,
+        )
+
+    def test_changed_data_renders_again(self):
+        summary_file = self.generate()
+        self.create_observation()
+        self.assertNotEqual(self.generate().id, summary_file.id)
+        self.assertEqual(self.submit.call_count, 2)
+
+    def test_summary_renders_again_on_next_day(self):
+        summary_file = self.generate()
+        next_day = timezone.now() + datetime.timedelta(days=1)
+        with patch.object(timezone, "now", return_value=next_day):
+            self.assertNotEqual(self.generate().id, summary_file.id)
+        self.assertEqual(self.submit.call_count, 2)
+
+    def test_template_tags_version_renders_again(self):
+        template = discharge_summary.get_template(
+            discharge_summary.OBSERVATIONS_TEMPLATE
+        )
+        self.create_observation()
+        summary_file = self.generate()
+        with (
+            patch.object(
+                discharge_summary,
+                "SUMMARY_TEMPLATE_TAGS_VERSION",
+                discharge_summary.SUMMARY_TEMPLATE_TAGS_VERSION + 1,
+            ),
+            patch.object(discharge_summary, "get_template", return_value=template),
+            patch.object(template, "render", wraps=template.render) as render,
+        ):
+            self.assertNotEqual(self.generate().id, summary_file.id)
+            # Cached observation rows are rendered again with the new tags
+            render.assert_called_once()
+
+    def test_earlier_summaries_are_not_annexed(self):
+        earlier_summary = self.generate()
+        self.create_observation()
+        self.generate()
+        self.assertEqual(self.submit.call_count, 2)
+        self.assertNotIn(earlier_summary.name, self.sources[-1])
+
+    def test_observation_rows_show_current_author(self):
+        author = self.create_user(username="nurse_before")
+        self.create_observation(data_entered_by=author)
+        self.generate()
+        self.assertIn("nurse_before", self.sources[-1])
+        author.username = "nurse_after"
+        author.save()
+        self.generate()
+        self.assertEqual(self.submit.call_count, 2)
+        self.assertIn("nurse_after", self.sources[-1])
+        self.assertNotIn("nurse_before", self.sources[-1])
+
+    @patch.object(discharge_summary, "OBSERVATION_CHUNK_SIZE", 2)
+    def test_unchanged_observation_chunks_are_not_rendered(self):
+        template = discharge_summary.get_template(
+            discharge_summary.OBSERVATIONS_TEMPLATE
+        )
+        observations = Observation.objects.filter(encounter=self.encounter)
+        for _ in range(3):
+            self.create_observation()
+        with (
+            patch.object(discharge_summary, "get_template", return_value=template),
+            patch.object(template, "render", wraps=template.render) as render,
+        ):
+            first = discharge_summary.render_observation_rows(observations)
+            self.assertEqual(render.call_count, 2)
+            self.create_observation()
+            second = discharge_summary.render_observation_rows(observations)
+            # The first chunk is unchanged, only the last one is rendered again
+            self.assertEqual(render.call_count, 3)
+        self.assertEqual(second.count("Pulse"), 4)
+        self.assertEqual(second[: len(first) // 2], first[: len(first) // 2])
+
+    def create_encounters(self, count):
+        encounters = []
+        for index in range(count):
+            patient = self.create_patient(name=f"Patient {index}", year_of_birth=1990)
+            encounters.append(
+                self.create_encounter(
+                    patient=patient,
+                    facility=self.facility,
+                    organization=self.organization,
+                )
+            )
+        return encounters
+
+    @patch.object(discharge_summary.renderer, "max_workers", 1)
+    def test_pending_summaries_are_bounded(self):
+        encounters = self.create_encounters(3)
+        results = discharge_summary.generate_and_upload_discharge_summaries(encounters)
+        self.assertTrue(
+            all(isinstance(result, FileUpload) for result in results.values())
+        )
+        # With one worker only two summaries wait on the renderer at a time
+        self.assertEqual(
+            self.events,
+            [
+                ("submit", 1),
+                ("submit", 2),
+                ("upload",),
+                ("submit", 3),
+                ("upload",),
+                ("upload",),
+            ],
+        )
+
+    def test_generate_summaries_task(self):
+        encounters = self.create_encounters(2)
+        failed_encounter = encounters[1]
+
+        def submit(source, output_file):
+            if failed_encounter.patient.name in source:
+                raise subprocess.CalledProcessError(1, "typst", stderr=b"error")
+            return self.fake_submit(source, output_file)
+
+        self.submit.side_effect = submit
+        with self.assertLogs("care.emr.tasks.discharge_summary", "ERROR") as logs:
+            summary_files = generate_discharge_summaries_task(
+                [str(encounter.external_id) for encounter in encounters]
+            )
+        self.assertEqual(
+            summary_files,
+            {
+                str(encounters[0].external_id): FileUpload.objects.get(
+                    associating_id=encounters[0].external_id
+                ).id
+            },
+        )
+        self.assertIn(str(failed_encounter.external_id), logs.output[0])
@@ -0,0 +1,80 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+from care.emr.models import (
+    EncounterOrganization,
+    FacilityLocation,
+    FacilityLocationEncounter,
+)
+from care.emr.resources.location.spec import LocationEncounterAvailabilityStatusChoices
+from care.utils.tests.base import CareAPITestBase
+
+
+class TestEncounterQueries(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_super_user()
+        self.facility = self.create_facility(user=self.user)
+        self.organization = self.facility.default_internal_organization
+        self.patient = self.create_patient()
+        self.client.force_authenticate(user=self.user)
+        self.base_url = reverse("encounter-list")
+
+    def create_encounter_with_history(self, rows):
+        """
+        Creates an encounter with the given number of organizations and locations
+        in its location history
+        """
+        encounter = self.create_encounter(
+            self.patient, self.facility, self.organization
+        )
+        for _ in range(rows - 1):
+            EncounterOrganization.objects.create(
+                encounter=encounter,
+                organization=self.create_facility_organization(self.facility),
+            )
+        for _ in range(rows):
+            location = baker.make(
+                FacilityLocation, facility=self.facility, current_encounter=encounter
+            )
+            FacilityLocationEncounter.objects.create(
+                status=LocationEncounterAvailabilityStatusChoices.active.value,
+                location=location,
+                encounter=encounter,
+                start_datetime=timezone.now(),
+            )
+        encounter.current_location = location
+        encounter.save()
+        return encounter
+
+    def retrieve(self, encounter):
+        url = reverse("encounter-detail", kwargs={"external_id": encounter.external_id})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"facility": self.facility.external_id})
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        """Serializing encounters does not query the database per encounter."""
+        self.assert_list_queries_constant(
+            f"{self.base_url}?facility={self.facility.external_id}",
+            lambda: self.create_encounter(
+                self.create_patient(), self.facility, self.organization
+            ),
+        )
+
+    def test_retrieve_queries_do_not_grow_with_history(self):
+        """Organizations and location history are loaded with a query each."""
+        _, single_row = self.retrieve(self.create_encounter_with_history(1))
+        response, many_rows = self.retrieve(self.create_encounter_with_history(3))
+        self.assertEqual(len(response.data["organizations"]), 3)
+        self.assertEqual(len(response.data["location_history"]), 3)
+        self.assertLessEqual(
+            len(many_rows),
+            len(single_row),
+            "Queries grow with the encounter history:\n"
+            + "\n".join(query["sql"] for query in many_rows.captured_queries),
+        )
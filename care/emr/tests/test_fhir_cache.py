@@ -0,0 +1,149 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from care.emr.fhir import cache as fhir_cache
+from care.emr.fhir.resources.base import ResourceManger, default_fhir_client
+from care.emr.tasks.terminology import refresh_fhir_query
+
+LOCMEM_CACHES = {"default": {"BACKEND": "config.caches.LocMemCache"}}
+
+EXPANSION = {"expansion": {"contains": [{"code": "1", "display": "Fever"}]}}
+UPDATED_EXPANSION = {"expansion": {"contains": [{"code": "2", "display": "Cough"}]}}
+EMPTY_EXPANSION = {"expansion": {"total": 0}}
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    FHIR_CACHE_TTLS={"ValueSet/$expand": 60},
+    FHIR_CACHE_STALE_TTL=60,
+    FHIR_CACHE_NEGATIVE_TTL=60,
+)
+class FHIRCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        fhir_cache.reset_cache_stats()
+        # The test settings disable the in process cache
+        self.local_cache = fhir_cache.LRUCache(max_size=16, ttl=60)
+        patcher = patch.object(fhir_cache, "local_cache", self.local_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(default_fhir_client, "query", return_value=EXPANSION)
+        self.server_query = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(fhir_cache, "store", wraps=fhir_cache.store)
+        self.store = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def query(self):
+        return ResourceManger().query("POST", "ValueSet/$expand", {"filter": "fev"})
+
+    @property
+    def cache_key(self):
+        return self.store.call_args.args[0]
+
+    def expire(self):
+        """
+        Marks the cached entry as past its TTL, without evicting it
+        """
+        self.local_cache.clear()
+        entry = cache.get(self.cache_key)
+        entry.fresh_until = 0
+        cache.set(self.cache_key, entry)
+
+    def test_fresh_entry_served_without_querying_server(self):
+        self.assertEqual(self.query(), EXPANSION)
+        self.assertEqual(self.query(), EXPANSION)
+        self.local_cache.clear()
+        self.assertEqual(self.query(), EXPANSION)
+        self.assertEqual(self.server_query.call_count, 1)
+        self.assertEqual(
+            fhir_cache.get_cache_stats(), {"miss": 1, "local_hit": 1, "hit": 1}
+        )
+
+    def test_stale_entry_served_while_refreshed(self):
+        self.query()
+        self.expire()
+        self.server_query.return_value = UPDATED_EXPANSION
+        # The stale value is returned, the refresh task (eager in tests) stores
+        # the new one
+        self.assertEqual(self.query(), EXPANSION)
+        self.assertEqual(self.server_query.call_count, 2)
+        self.local_cache.clear()
+        self.assertEqual(self.query(), UPDATED_EXPANSION)
+        self.assertEqual(self.server_query.call_count, 2)
+        self.assertEqual(fhir_cache.get_cache_stats()["stale_hit"], 1)
+
+    def test_single_refresh_queued_per_stale_entry(self):
+        self.query()
+        self.expire()
+        with patch.object(refresh_fhir_query, "delay") as delay:
+            self.query()
+            self.local_cache.clear()
+            self.query()
+        delay.assert_called_once()
+
+    def test_refresh_lock_released_when_scheduling_fails(self):
+        self.query()
+        self.expire()
+        with patch.object(refresh_fhir_query, "delay", side_effect=OSError):
+            self.assertEqual(self.query(), EXPANSION)
+        self.assertTrue(fhir_cache.acquire_refresh(self.cache_key))
+
+    @override_settings(FHIR_CACHE_NEGATIVE_TTL=0)
+    def test_negative_result_cached_briefly(self):
+        self.server_query.return_value = EMPTY_EXPANSION
+        self.query()
+        entry = cache.get(self.cache_key)
+        self.assertTrue(entry.negative)
+        self.assertEqual(fhir_cache.get_cache_stats()["negative"], 1)
+        # Past the negative TTL at once, while positive results stay fresh
+        self.assertFalse(entry.is_fresh)
+        self.server_query.return_value = EXPANSION
+        self.local_cache.clear()
+        self.query()
+        self.assertTrue(cache.get(self.cache_key).is_fresh)
+
+    def test_negative_results(self):
+        self.assertTrue(ResourceManger.is_negative_result(EMPTY_EXPANSION))
+        self.assertTrue(
+            ResourceManger.is_negative_result({"resourceType": "OperationOutcome"})
+        )
+        self.assertTrue(
+            ResourceManger.is_negative_result(
+                {"parameter": [{"name": "result", "valueBoolean": False}]}
+            )
+        )
+        self.assertFalse(ResourceManger.is_negative_result(EXPANSION))
+        self.assertFalse(
+            ResourceManger.is_negative_result(
+                {"parameter": [{"name": "result", "valueBoolean": True}]}
+            )
+        )
+
+    def test_refresh_task_stores_result_and_releases_lock(self):
+        self.query()
+        cache_key = self.cache_key
+        self.assertTrue(fhir_cache.acquire_refresh(cache_key))
+        self.server_query.return_value = UPDATED_EXPANSION
+        refresh_fhir_query(
+            cache_key,
+            {
+                "method": "POST",
+                "resource": "ValueSet/$expand",
+                "parameters": {"filter": "fev"},
+            },
+        )
+        self.assertEqual(cache.get(cache_key).value, UPDATED_EXPANSION)
+        self.assertTrue(fhir_cache.acquire_refresh(cache_key))
+
+    def test_local_cache_evicts_least_recently_used(self):
+        local_cache = fhir_cache.LRUCache(max_size=2, ttl=60)
+        local_cache.set("a", 1)
+        local_cache.set("b", 2)
+        local_cache.get("a")
+        local_cache.set("c", 3)
+        self.assertIsNone(local_cache.get("b"))
+        self.assertEqual(local_cache.get("a"), 1)
+        self.assertEqual(local_cache.get("c"), 3)
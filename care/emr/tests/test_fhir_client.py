@@ -0,0 +1,146 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import requests
+from django.test import SimpleTestCase, override_settings
+from urllib3.util.retry import Retry
+
+from care.emr.fhir.client import FHIRClient, run_concurrently
+from care.emr.fhir.exceptions import FHIRServerUnavailableError
+
+
+class StubFHIRHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # noqa N802
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.respond()
+
+    def do_GET(self):  # noqa N802
+        self.respond()
+
+    def respond(self):
+        server = self.server
+        server.request_count += 1
+        server.connections.add(self.client_address)
+        status_code = server.status_code
+        if server.barrier:
+            # Only released once every expected request is in flight
+            try:
+                server.barrier.wait()
+            except threading.BrokenBarrierError:
+                status_code = 500
+        body = json.dumps({"resourceType": "Parameters", "path": self.path}).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FHIRClientTest(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubFHIRHandler)
+        self.server.request_count = 0
+        self.server.connections = set()
+        self.server.barrier = None
+        self.server.status_code = 200
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/fhir"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def query(self, client):
+        return client.query(method="POST", resource="ValueSet/$expand", parameters={})
+
+    def test_connections_are_reused(self):
+        client = FHIRClient(self.url, max_retries=0)
+        for _ in range(5):
+            self.assertEqual(self.query(client)["path"], "/fhir/ValueSet/$expand")
+        self.assertEqual(self.server.request_count, 5)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        self.server.status_code = 500
+        client = FHIRClient(
+            self.url, max_retries=0, failure_threshold=2, reset_timeout=60
+        )
+        self.query(client)
+        self.query(client)
+        with self.assertRaises(FHIRServerUnavailableError):
+            self.query(client)
+        self.assertEqual(self.server.request_count, 2)
+
+    def test_circuit_closes_after_successful_trial(self):
+        self.server.status_code = 500
+        client = FHIRClient(
+            self.url, max_retries=0, failure_threshold=1, reset_timeout=0
+        )
+        self.query(client)
+        self.assertTrue(client.circuit_breaker.is_open)
+        self.server.status_code = 200
+        self.query(client)
+        self.assertFalse(client.circuit_breaker.is_open)
+
+    @override_settings(SNOWSTORM_MAX_CONCURRENCY=3)
+    def test_concurrent_queries_are_in_flight_together(self):
+        # Requests that do not reach the server together break the barrier and
+        # get a 500
+        self.server.barrier = threading.Barrier(3, timeout=5)
+        client = FHIRClient(self.url, max_retries=0)
+        results = run_concurrently([lambda: self.query(client)] * 3)
+        self.assertEqual(
+            [result["path"] for result in results], ["/fhir/ValueSet/$expand"] * 3
+        )
+        self.assertFalse(client.circuit_breaker.is_open)
+
+    @override_settings(SNOWSTORM_MAX_CONCURRENCY=2)
+    def test_nested_calls_run_inline(self):
+        # Fanning out again from every pool thread would wait on the pool forever
+        # once all of its workers are taken by the outer calls
+        def fan_out():
+            inner = run_concurrently([threading.get_ident] * 2)
+            return threading.get_ident(), inner
+
+        results = run_concurrently([fan_out] * 2)
+        for thread, inner in results:
+            self.assertNotEqual(thread, threading.get_ident())
+            self.assertEqual(inner, [thread, thread])
+
+    def test_post_not_retried_on_gateway_error(self):
+        self.server.status_code = 503
+        client = FHIRClient(self.url, max_retries=2)
+        self.query(client)
+        self.assertEqual(self.server.request_count, 1)
+
+    def test_get_retried_on_gateway_error(self):
+        self.server.status_code = 503
+        client = FHIRClient(self.url, max_retries=2)
+        client.query(method="GET", resource="CodeSystem/$lookup", parameters={})
+        self.assertEqual(self.server.request_count, 3)
+
+    def test_post_retried_on_connection_error(self):
+        # Nothing listens on a port once its socket is closed
+        with socket.socket() as closed:
+            closed.bind(("127.0.0.1", 0))
+            port = closed.getsockname()[1]
+        client = FHIRClient(f"http://127.0.0.1:{port}/fhir", max_retries=2)
+        with (
+            patch.object(
+                Retry, "increment", autospec=True, side_effect=Retry.increment
+            ) as increment,
+            self.assertRaises(requests.ConnectionError),
+        ):
+            self.query(client)
+        # The first attempt and two retries, the third failure gives up
+        self.assertEqual(increment.call_count, 3)
@@ -5,6 +5,7 @@ from secrets import choice
 from django.test import ignore_warnings
 from django.urls import reverse
 from django.utils import timezone
+from model_bakery import baker
 
 from care.emr.models import (
     FacilityLocation,
@@ -158,6 +159,22 @@ class TestFacilityLocationViewSet(FacilityLocationMixin, CareAPITestBase):
         response = self.client.get(self.base_url)
         self.assertEqual(response.status_code, 200)
 
+    def test_list_queries_do_not_grow_with_rows(self):
+        """Serializing the current encounter of a location does not query per row."""
+        self.client.force_authenticate(user=self.super_user)
+
+        def create_occupied_location():
+            encounter = self.create_encounter(
+                self.create_patient(),
+                self.facility,
+                self.facility.default_internal_organization,
+            )
+            baker.make(
+                FacilityLocation, facility=self.facility, current_encounter=encounter
+            )
+
+        self.assert_list_queries_constant(self.base_url, create_occupied_location)
+
     def test_request_with_invalid_facility(self):
         response = self.client.get(self.base_url)
         self.assertEqual(response.status_code, 200)
@@ -0,0 +1,152 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from care.emr.models import FacilityLocation, FacilityOrganization
+from care.emr.utils.tree import rebuild_tree, refresh_subtree
+from care.utils.tests.base import CareAPITestBase
+
+
+class TestFacilityLocationTree(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.super_user = self.create_super_user()
+        self.facility = self.create_facility(user=self.super_user)
+        self.root_organization = FacilityOrganization.objects.filter(
+            facility=self.facility, org_type="root"
+        ).first()
+        self.client.force_authenticate(user=self.super_user)
+
+    def create_location(self, name, parent=None):
+        return FacilityLocation.objects.create(
+            facility=self.facility, name=name, parent=parent
+        )
+
+    def create_chain(self, *names, parent=None):
+        locations = []
+        for name in names:
+            parent = self.create_location(name, parent)
+            locations.append(parent)
+        return locations
+
+    def get_organizations_url(self, location, action):
+        return reverse(
+            f"location-organizations-{action}",
+            kwargs={
+                "facility_external_id": self.facility.external_id,
+                "external_id": location.external_id,
+            },
+        )
+
+    def assert_tree_position(self, location, ancestors):
+        location.refresh_from_db()
+        parent = ancestors[-1]
+        self.assertEqual(location.parent_cache, [node.id for node in ancestors])
+        self.assertEqual(location.level_cache, len(ancestors))
+        self.assertEqual(location.root_location_id, ancestors[0].id)
+        self.assertEqual(location.cached_parent_json["id"], str(parent.external_id))
+        self.assertEqual(location.cached_parent_json["name"], parent.name)
+
+    def test_reparenting_moves_descendants(self):
+        ward, room, bed, slot = self.create_chain("Ward", "Room", "Bed", "Slot")
+        building, floor = self.create_chain("Building", "Floor")
+        room.parent = floor
+        room.save()
+        self.assert_tree_position(room, [building, floor])
+        self.assert_tree_position(bed, [building, floor, room])
+        self.assert_tree_position(slot, [building, floor, room, bed])
+        self.assertEqual(
+            slot.cached_parent_json["parent"]["parent"]["id"], str(floor.external_id)
+        )
+
+        # Moved back to the top of the tree
+        room.parent = None
+        room.save()
+        room.refresh_from_db()
+        self.assertEqual((room.parent_cache, room.level_cache), ([], 0))
+        self.assertIsNone(room.root_location_id)
+        self.assert_tree_position(bed, [room])
+        self.assert_tree_position(slot, [room, bed])
+
+    def test_rename_is_written_through_to_descendants(self):
+        ward, room, bed = self.create_chain("Ward", "Room", "Bed")
+        ward.name = "General Ward"
+        ward.save()
+        room.refresh_from_db()
+        bed.refresh_from_db()
+        self.assertEqual(room.cached_parent_json["name"], "General Ward")
+        self.assertEqual(bed.cached_parent_json["parent"]["name"], "General Ward")
+
+    def test_save_of_fields_outside_json_skips_children(self):
+        ward, room = self.create_chain("Ward", "Room")
+        ward.metadata = {"beds": 10}
+        # Only the update, the children are not looked at
+        with self.assertNumQueries(1):
+            ward.save(update_fields=["metadata"])
+        ward.name = "General Ward"
+        ward.save(update_fields=["name"])
+        room.refresh_from_db()
+        self.assertEqual(room.cached_parent_json["name"], "General Ward")
+
+    def test_rebuild_tree(self):
+        ward, room, bed = self.create_chain("Ward", "Room", "Bed")
+        FacilityLocation.objects.filter(facility=self.facility).update(
+            parent_cache=[],
+            level_cache=0,
+            root_location=None,
+            cached_parent_json={},
+            facility_organization_cache=[],
+        )
+        rebuild_tree(FacilityLocation)
+        self.assert_tree_position(room, [ward])
+        self.assert_tree_position(bed, [ward, room])
+        self.assertEqual(bed.cached_parent_json["parent"]["name"], "Ward")
+        self.assertIn(self.root_organization.id, bed.facility_organization_cache)
+
+    def test_organizations_cascade_to_descendants(self):
+        ward, room, bed = self.create_chain("Ward", "Room", "Bed")
+        organization = self.create_facility_organization(facility=self.facility)
+        response = self.client.post(
+            self.get_organizations_url(room, "add"),
+            {"organization": organization.external_id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        for location in (room, bed):
+            location.refresh_from_db()
+            self.assertIn(organization.id, location.facility_organization_cache)
+            self.assertIn(
+                self.root_organization.id, location.facility_organization_cache
+            )
+        ward.refresh_from_db()
+        self.assertNotIn(organization.id, ward.facility_organization_cache)
+
+        response = self.client.post(
+            self.get_organizations_url(room, "remove"),
+            {"organization": organization.external_id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        for location in (room, bed):
+            location.refresh_from_db()
+            self.assertNotIn(organization.id, location.facility_organization_cache)
+            self.assertIn(
+                self.root_organization.id, location.facility_organization_cache
+            )
+
+    def test_subtree_refresh_queries_bounded_per_level(self):
+        def count_queries(width):
+            root = self.create_location(f"Root {width}")
+            parents = [root]
+            for level in range(2):
+                parents = [
+                    self.create_location(f"Node {level} {index}", parent)
+                    for parent in parents
+                    for index in range(width)
+                ]
+            with CaptureQueriesContext(connection) as queries:
+                refresh_subtree(root)
+            return len(queries)
+
+        # 2 and 12 descendants over the same number of levels
+        self.assertEqual(count_queries(1), count_queries(3))
@@ -4,6 +4,7 @@ from unittest.mock import patch
 from django.urls import reverse
 from model_bakery import baker
 
+from care.emr.models.medication_request import MedicationRequest
 from care.security.permissions.encounter import EncounterPermissions
 from care.security.permissions.patient import PatientPermissions
 from care.utils.tests.base import CareAPITestBase
@@ -228,3 +229,52 @@ class TestMedicationRequestApi(CareAPITestBase):
 
         obj.refresh_from_db()
         self.assertEqual(obj.requester, requester_initial)
+
+    def test_upsert_medication_requests_in_bulk(self):
+        """
+        Upserting creates and updates medication requests in bulk queries
+        """
+        permissions = [
+            PatientPermissions.can_view_clinical_data.name,
+            EncounterPermissions.can_write_encounter.name,
+        ]
+        role = self.create_role_with_permissions(permissions)
+        self.attach_role_facility_organization_user(self.organization, self.user, role)
+        obj = self.create_medication_request()
+        datapoints = [
+            self.get_medication_request_data(id=str(obj.external_id), status="on_hold"),
+            self.get_medication_request_data(),
+            self.get_medication_request_data(),
+        ]
+        response = self.client.post(
+            reverse(
+                "medication-request-upsert",
+                kwargs={"patient_external_id": self.patient.external_id},
+            ),
+            {"datapoints": datapoints},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        obj.refresh_from_db()
+        self.assertEqual(obj.status, "on_hold")
+        self.assertEqual(
+            MedicationRequest.objects.filter(
+                encounter=self.encounter, created_by=self.user
+            ).count(),
+            2,
+        )
+
+    def test_upsert_medication_requests_without_permission(self):
+        datapoints = [self.get_medication_request_data()]
+        response = self.client.post(
+            reverse(
+                "medication-request-upsert",
+                kwargs={"patient_external_id": self.patient.external_id},
+            ),
+            {"datapoints": datapoints},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(
+            MedicationRequest.objects.filter(encounter=self.encounter).exists()
+        )
@@ -0,0 +1,91 @@
+from datetime import UTC, datetime
+
+from django.urls import reverse
+from model_bakery import baker
+
+from care.emr.models.observation import Observation
+from care.utils.tests.base import CareAPITestBase
+
+CODE = {"system": "http://loinc.org", "code": "8310-5", "display": "Body temperature"}
+
+
+class TestObservationSeries(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_super_user()
+        self.facility = self.create_facility(user=self.user)
+        self.organization = self.create_facility_organization(facility=self.facility)
+        self.patient = self.create_patient()
+        self.encounter = self.create_encounter(
+            patient=self.patient,
+            facility=self.facility,
+            organization=self.organization,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse(
+            "observation-series",
+            kwargs={"patient_external_id": self.patient.external_id},
+        )
+
+    def create_observation(self, effective_datetime, value, **kwargs):
+        return baker.make(
+            Observation,
+            patient=self.patient,
+            encounter=self.encounter,
+            main_code=CODE,
+            value={"value": value},
+            effective_datetime=effective_datetime,
+            **kwargs,
+        )
+
+    def get_series(self, **kwargs):
+        data = {
+            "code": CODE,
+            "start": "2025-01-01T00:00:00Z",
+            "end": "2025-01-02T00:00:00Z",
+            "buckets": 24,
+            **kwargs,
+        }
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]
+
+    def test_observations_are_bucketed_in_utc(self):
+        self.create_observation(datetime(2025, 1, 1, 0, 30, tzinfo=UTC), "98")
+        self.create_observation(datetime(2025, 1, 1, 0, 45, tzinfo=UTC), "100")
+        self.create_observation(datetime(2025, 1, 1, 5, 45, tzinfo=UTC), "99")
+        self.create_observation(datetime(2025, 1, 1, 6, 10, tzinfo=UTC), "101.5")
+        self.create_observation(datetime(2025, 1, 1, 23, 59, tzinfo=UTC), "97")
+        results = self.get_series()
+        self.assertEqual(
+            [(result["start"].hour, result["count"]) for result in results],
+            [(0, 2), (5, 1), (6, 1), (23, 1)],
+        )
+        self.assertEqual(
+            (results[0]["min"], results[0]["max"], results[0]["avg"]),
+            (98, 100, 99),
+        )
+        self.assertEqual(results[2]["end"], datetime(2025, 1, 1, 7, tzinfo=UTC))
+
+    def test_series_skips_other_codes_and_values(self):
+        self.create_observation(datetime(2025, 1, 1, 1, tzinfo=UTC), "98")
+        self.create_observation(datetime(2025, 1, 1, 2, tzinfo=UTC), "not a number")
+        self.create_observation(datetime(2025, 1, 2, 1, tzinfo=UTC), "98")
+        baker.make(
+            Observation,
+            patient=self.patient,
+            encounter=self.encounter,
+            main_code={**CODE, "code": "8867-4"},
+            value={"value": "72"},
+            effective_datetime=datetime(2025, 1, 1, 3, tzinfo=UTC),
+        )
+        results = self.get_series()
+        self.assertEqual([result["start"].hour for result in results], [1])
+
+    def test_series_in_local_time_range(self):
+        # The range and the observations are converted to UTC alike
+        self.create_observation(datetime(2025, 1, 1, 0, 30, tzinfo=UTC), "98")
+        results = self.get_series(
+            start="2025-01-01T05:30:00+05:30", end="2025-01-02T05:30:00+05:30"
+        )
+        self.assertEqual(results[0]["start"], datetime(2025, 1, 1, tzinfo=UTC))
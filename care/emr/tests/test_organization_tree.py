@@ -0,0 +1,66 @@
+from care.emr.models import Organization
+from care.emr.utils.tree import rebuild_tree
+from care.utils.tests.base import CareAPITestBase
+
+
+class TestOrganizationTree(CareAPITestBase):
+    def create_chain(self, *names, parent=None):
+        organizations = []
+        for name in names:
+            parent = Organization.objects.create(
+                name=name, org_type="govt", parent=parent
+            )
+            organizations.append(parent)
+        return organizations
+
+    def assert_tree_position(self, organization, ancestors):
+        organization.refresh_from_db()
+        parent = ancestors[-1]
+        self.assertEqual(organization.parent_cache, [node.id for node in ancestors])
+        self.assertEqual(organization.level_cache, len(ancestors))
+        self.assertEqual(organization.root_org_id, ancestors[0].id)
+        self.assertEqual(organization.cached_parent_json["id"], str(parent.external_id))
+        self.assertEqual(organization.cached_parent_json["name"], parent.name)
+
+    def test_rename_is_written_through_to_descendants(self):
+        state, district, ward = self.create_chain("State", "District", "Ward")
+        state.name = "Renamed State"
+        state.save()
+        district.refresh_from_db()
+        ward.refresh_from_db()
+        self.assertEqual(district.cached_parent_json["name"], "Renamed State")
+        self.assertEqual(ward.cached_parent_json["parent"]["name"], "Renamed State")
+
+    def test_save_of_fields_outside_json_skips_children(self):
+        state, district = self.create_chain("State", "District")
+        state.active = False
+        # Only the update, the children are not looked at
+        with self.assertNumQueries(1):
+            state.save(update_fields=["active"])
+        state.description = "Updated"
+        state.save(update_fields=["description"])
+        district.refresh_from_db()
+        self.assertEqual(district.cached_parent_json["description"], "Updated")
+
+    def test_move_updates_descendants(self):
+        state, district, ward, booth = self.create_chain(
+            "State", "District", "Ward", "Booth"
+        )
+        other_state, other_district = self.create_chain("Other State", "Other")
+        ward.parent = other_district
+        ward.save()
+        self.assert_tree_position(ward, [other_state, other_district])
+        self.assert_tree_position(booth, [other_state, other_district, ward])
+        self.assertEqual(
+            booth.cached_parent_json["parent"]["id"], str(other_district.external_id)
+        )
+
+    def test_rebuild_tree(self):
+        state, district, ward = self.create_chain("State", "District", "Ward")
+        Organization.objects.filter(id__in=[district.id, ward.id]).update(
+            parent_cache=[], level_cache=0, root_org=None, cached_parent_json={}
+        )
+        rebuild_tree(Organization)
+        self.assert_tree_position(district, [state])
+        self.assert_tree_position(ward, [state, district])
+        self.assertEqual(ward.cached_parent_json["parent"]["name"], "State")
@@ -1,8 +1,15 @@
 import uuid
+from unittest.mock import patch
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from model_bakery import baker
 
+from care.emr.models import Questionnaire
+from care.emr.models.questionnaire import QuestionnaireResponse
+from care.emr.resources.questionnaire.spec import QuestionnaireReadSpec
+from care.emr.resources.user.spec import UserSpec
 from care.security.permissions.questionnaire import QuestionnairePermissions
 from care.utils.tests.base import CareAPITestBase
 
@@ -320,6 +327,178 @@ class RequiredFieldValidationTests(QuestionnaireTestBase):
         self.assertEqual(error["question_id"], question["id"])
         self.assertIn("No value provided for question", error["msg"])
 
+    def test_submission_validated_against_modified_questionnaire(self):
+        """
+        Verifies that submissions are validated against the current questions once
+        the questionnaire is modified.
+        """
+        question = self.questions[0]
+        payload = self._create_submission_payload(question["id"], None)
+        payload["results"][0]["values"] = []
+
+        status_code, _ = self._submit_questionnaire(payload)
+        self.assertEqual(status_code, 400)
+
+        questionnaire = Questionnaire.objects.get(slug=self.questionnaire_data["slug"])
+        questionnaire.questions[0]["required"] = False
+        questionnaire.save()
+
+        status_code, response_data = self._submit_questionnaire(payload)
+        self.assertEqual(status_code, 200, response_data)
+
+
+class QuestionnaireResponseListTests(QuestionnaireTestBase):
+    """
+    Test suite for the compact listing of questionnaire responses, where every
+    questionnaire is sent once for the whole page.
+    """
+
+    def _create_questionnaire(self):
+        questionnaire_definition = {
+            "title": "Daily Check",
+            "slug": "daily-check",
+            "status": "active",
+            "subject_type": "patient",
+            "organizations": [str(self.organization.external_id)],
+            "questions": [
+                {
+                    "link_id": "1",
+                    "type": "boolean",
+                    "text": "Symptom presence",
+                    "code": {
+                        "display": "Test Value",
+                        "system": "http://test_system.care/test",
+                        "code": "123",
+                    },
+                }
+            ],
+        }
+        response = self.client.post(
+            self.base_url, questionnaire_definition, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.json())
+        return response.json()
+
+    def setUp(self):
+        super().setUp()
+        payload = self._create_submission_payload(self.questions[0]["id"], "true")
+        for _ in range(3):
+            status_code, response_data = self._submit_questionnaire(payload)
+            self.assertEqual(status_code, 200, response_data)
+        self.list_url = reverse(
+            "questionnaire-response-list",
+            kwargs={"patient_external_id": self.patient.external_id},
+        )
+
+    def test_compact_list_references_questionnaire(self):
+        """
+        Verifies that compact rows reference the questionnaire, which is sent once
+        in the side table.
+        """
+        response = self.client.get(self.list_url, {"compact": "true"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["results"]), 3)
+        questionnaire_id = self.questionnaire_data["id"]
+        for result in data["results"]:
+            self.assertEqual(result["questionnaire"], questionnaire_id)
+        self.assertEqual(list(data["questionnaires"]), [questionnaire_id])
+        self.assertEqual(
+            data["questionnaires"][questionnaire_id]["questions"][0]["id"],
+            self.questions[0]["id"],
+        )
+
+    def test_plain_list_embeds_questionnaire(self):
+        """
+        Verifies that without compact or fields the regular listing is returned.
+        """
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["results"]), 3)
+        self.assertNotIn("questionnaires", data)
+        for result in data["results"]:
+            self.assertEqual(
+                result["questionnaire"]["id"], self.questionnaire_data["id"]
+            )
+
+    def test_list_field_selection(self):
+        """
+        Verifies that only the requested fields are returned and that unknown
+        fields are rejected.
+        """
+        response = self.client.get(
+            self.list_url, {"compact": "true", "fields": "id,created_date"}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        for result in data["results"]:
+            self.assertEqual(set(result), {"id", "created_date"})
+        self.assertEqual(data["questionnaires"], {})
+
+        response = self.client.get(self.list_url, {"fields": "id,unknown"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_field_selection_matches_full_rows(self):
+        """
+        Verifies that selected fields are serialized as in the full listing.
+        """
+        full = self.client.get(self.list_url).json()["results"]
+        fields = "id,questionnaire,encounter,created_by,responses"
+        response = self.client.get(self.list_url, {"fields": fields})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"],
+            [{field: row[field] for field in fields.split(",")} for row in full],
+        )
+
+        full = self.client.get(self.list_url, {"compact": "true"}).json()["results"]
+        fields = "questionnaire,questionnaire_version,updated_by"
+        response = self.client.get(self.list_url, {"compact": "true", "fields": fields})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"],
+            [{field: row[field] for field in fields.split(",")} for row in full],
+        )
+
+    def test_list_field_selection_queries_do_not_grow_with_rows(self):
+        """
+        Verifies that the relations of selected fields are fetched with the rows.
+        """
+        QuestionnaireResponse.objects.filter(patient=self.patient).delete()
+        self.assert_list_queries_constant(
+            f"{self.list_url}?fields=id,questionnaire,encounter,created_by",
+            lambda: self._submit_questionnaire(
+                self._create_submission_payload(self.questions[0]["id"], "true")
+            ),
+        )
+
+    def test_list_unselected_fields_are_not_built(self):
+        """
+        Verifies that related objects of unselected fields are neither fetched
+        nor serialized.
+        """
+        with (
+            patch.object(UserSpec, "serialize") as serialize_user,
+            patch.object(QuestionnaireReadSpec, "serialize") as serialize_questionnaire,
+            CaptureQueriesContext(connection) as queries,
+        ):
+            response = self.client.get(self.list_url, {"fields": "id,created_date"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 3)
+        serialize_user.assert_not_called()
+        serialize_questionnaire.assert_not_called()
+        response_query = next(
+            query["sql"]
+            for query in queries.captured_queries
+            if 'FROM "emr_questionnaireresponse"' in query["sql"]
+            and "LIMIT" in query["sql"]
+        )
+        columns = response_query.split(" FROM ")[0]
+        self.assertNotIn('"responses"', columns)
+        self.assertNotIn('"emr_questionnaire".', columns)
+        self.assertNotIn("users_user", columns)
+
 
 class RequiredGroupValidationTests(QuestionnaireTestBase):
     """
@@ -759,6 +938,16 @@ class QuestionnairePermissionTests(QuestionnaireTestBase):
         response = self.client.post(url, payload, format="json")
         self.assertEqual(response.status_code, 200)
 
+    def test_questionnaire_list_tag_queries_do_not_grow_with_rows(self):
+        """Tests that the tags of a page of questionnaires are resolved together."""
+        self.client.force_authenticate(user=self.super_user)
+
+        def create_tagged_questionnaire():
+            tags = [self.create_questionnaire_tag(), self.create_questionnaire_tag()]
+            baker.make(Questionnaire, tags=[tag.id for tag in tags])
+
+        self.assert_list_queries_constant(self.base_url, create_tagged_questionnaire)
+
     def test_set_organizations_without_authentication(self):
         """Tests that setting organizations without authentication returns 403 forbidden."""
         questionnaire = self.create_questionnaire_instance()
@@ -0,0 +1,147 @@
+import uuid
+
+from django.test import SimpleTestCase, override_settings
+from pydantic import UUID4
+
+from care.emr.models.notes import NoteMessage, NoteThread
+from care.emr.resources.base import EMRResource
+from care.emr.resources.timing import get_spec_timings, reset_spec_timings
+
+
+class ThreadMetadataSpec(EMRResource):
+    __model__ = NoteThread
+    __store_metadata__ = True
+
+    id: UUID4 | None = None
+    title: str | None = None
+    color: str | None = None
+    pinned: bool = False
+
+
+class ThreadSpec(EMRResource):
+    __model__ = NoteThread
+
+    id: UUID4 | None = None
+    title: str | None = None
+    color: str | None = None
+
+
+class MessageSpec(EMRResource):
+    __model__ = NoteMessage
+    __exclude__ = ["message_history"]
+    __store_metadata__ = True
+
+    message: str
+    message_history: dict = {}
+    edited: bool = False
+
+
+def legacy_de_serialize(spec, obj):
+    """
+    de_serialize as it was before the fields were routed through the serializer
+    plan
+    """
+    database_fields = spec.get_database_mapping()
+    meta = getattr(obj, "meta", {})
+    dump = spec.model_dump(mode="json", exclude_defaults=True)
+    for field in dump:
+        if (
+            field in database_fields
+            and field not in spec.__exclude__
+            and field not in ["id", "external_id"]
+        ):
+            obj.__setattr__(field, dump[field])
+        elif field not in spec.__exclude__ and spec.__store_metadata__:
+            meta[field] = dump[field]
+    obj.meta = meta
+    spec.perform_extra_deserialization(is_update=True, obj=obj)
+    return obj
+
+
+def get_columns(obj):
+    return {
+        field.attname: getattr(obj, field.attname)
+        for field in obj._meta.concrete_fields  # noqa SLF001
+    }
+
+
+class TestDeSerialize(SimpleTestCase):
+    def assert_same_as_legacy(self, spec, model, **kwargs):
+        external_id = uuid.uuid4()
+        expected = legacy_de_serialize(
+            spec, model(external_id=external_id, meta={"kept": True}, **kwargs)
+        )
+        obj = spec.de_serialize(
+            model(external_id=external_id, meta={"kept": True}, **kwargs)
+        )
+        self.assertEqual(get_columns(obj), get_columns(expected))
+        return obj
+
+    def test_metadata_spec(self):
+        obj = self.assert_same_as_legacy(
+            ThreadMetadataSpec(id=uuid.uuid4(), title="Admission", color="red"),
+            NoteThread,
+        )
+        self.assertEqual(obj.title, "Admission")
+        # Fields without a column are kept in meta, defaults are not
+        self.assertEqual(obj.meta["color"], "red")
+        self.assertTrue(obj.meta["kept"])
+        self.assertNotIn("pinned", obj.meta)
+
+    def test_spec_without_metadata(self):
+        obj = self.assert_same_as_legacy(
+            ThreadSpec(id=uuid.uuid4(), title="Admission", color="red"),
+            NoteThread,
+            title="Earlier",
+        )
+        self.assertEqual(obj.title, "Admission")
+        self.assertEqual(obj.meta, {"kept": True})
+
+    def test_spec_with_exclude(self):
+        obj = self.assert_same_as_legacy(
+            MessageSpec(message="Updated", message_history={"a": "b"}, edited=True),
+            NoteMessage,
+            message_history={"earlier": "message"},
+        )
+        self.assertEqual(obj.message, "Updated")
+        # Excluded fields are neither written to their column nor to meta
+        self.assertEqual(obj.message_history, {"earlier": "message"})
+        self.assertEqual(obj.meta, {"kept": True, "edited": True})
+
+    def test_new_object(self):
+        obj = ThreadSpec(title="Admission").de_serialize()
+        self.assertIsInstance(obj, NoteThread)
+        self.assertIsNone(obj.pk)
+        self.assertEqual(obj.title, "Admission")
+
+
+class TestSpecTimings(SimpleTestCase):
+    def setUp(self):
+        reset_spec_timings()
+        self.addCleanup(reset_spec_timings)
+
+    def serialize(self):
+        thread = NoteThread(title="Admission")
+        ThreadSpec.serialize(thread)
+        ThreadSpec.serialize(thread)
+        ThreadSpec(title="Admission").de_serialize()
+
+    @override_settings(SPEC_TIMING_ENABLED=True)
+    def test_timings_recorded_when_enabled(self):
+        self.serialize()
+        timings = {
+            (timing["spec"], timing["operation"]): timing
+            for timing in get_spec_timings()
+        }
+        self.assertEqual(
+            set(timings), {("ThreadSpec", "serialize"), ("ThreadSpec", "de_serialize")}
+        )
+        self.assertEqual(timings["ThreadSpec", "serialize"]["calls"], 2)
+        self.assertEqual(timings["ThreadSpec", "de_serialize"]["calls"], 1)
+        reset_spec_timings()
+        self.assertEqual(get_spec_timings(), [])
+
+    @override_settings(SPEC_TIMING_ENABLED=False)
+    def test_timings_not_recorded_when_disabled(self):
+        self.serialize()
+        self.assertEqual(get_spec_timings(), [])
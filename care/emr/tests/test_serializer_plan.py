@@ -0,0 +1,39 @@
+from model_bakery import baker
+
+from care.emr.models.notes import NoteThread
+from care.emr.resources.notes.thread_spec import NoteThreadReadSpec, NoteThreadSpec
+from care.utils.tests.base import CareAPITestBase
+
+
+class TestSerializeMany(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.patient = self.create_patient()
+        baker.make(
+            NoteThread,
+            patient=self.patient,
+            title="Admission notes",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        baker.make(NoteThread, patient=self.patient, title=None)
+        self.queryset = NoteThread.objects.filter(patient=self.patient).order_by("id")
+
+    def test_values_only_rows_match_serialize(self):
+        self.assertTrue(NoteThreadSpec.get_serializer_plan().values_only)
+        expected = [
+            NoteThreadSpec.serialize(thread).to_json() for thread in self.queryset
+        ]
+        # A single query fetching plain rows, no model instances
+        with self.assertNumQueries(1):
+            serialized = NoteThreadSpec.serialize_many(self.queryset)
+        self.assertEqual(serialized, expected)
+
+    def test_instance_rows_match_serialize(self):
+        self.assertFalse(NoteThreadReadSpec.get_serializer_plan().values_only)
+        threads = list(self.queryset.select_related("created_by", "updated_by"))
+        expected = [
+            NoteThreadReadSpec.serialize(thread).to_json() for thread in threads
+        ]
+        self.assertEqual(NoteThreadReadSpec.serialize_many(threads), expected)
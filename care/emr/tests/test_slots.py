@@ -0,0 +1,245 @@
+import datetime
+from datetime import UTC, timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import ignore_warnings
+from django.utils import timezone
+
+from care.emr.models.scheduling.booking import TokenSlot
+from care.emr.models.scheduling.schedule import (
+    Availability,
+    AvailabilityException,
+    SchedulableUserResource,
+    Schedule,
+)
+from care.emr.resources.scheduling.schedule.spec import SlotTypeOptions
+from care.emr.tasks.slots import materialize_resource_slots
+from care.emr.utils.slots import (
+    calculate_available_tokens,
+    generate_slot_intervals,
+    get_day_slots,
+    is_materialized,
+    materialize_slots,
+    materialize_slots_for_range,
+    merge_intervals,
+)
+from care.utils.tests.base import CareAPITestBase
+
+
+def at(hour, minute=0):
+    return datetime.datetime(2025, 1, 6, hour, minute)
+
+
+class TestSlotIntervals(SimpleTestCase):
+    def test_merge_intervals(self):
+        self.assertEqual(
+            merge_intervals(
+                [(at(11), at(12)), (at(9), at(10)), (at(9, 30), at(10, 30))]
+            ),
+            [(at(9), at(10, 30)), (at(11), at(12))],
+        )
+
+    def test_exception_splits_availability(self):
+        slots = list(generate_slot_intervals(at(9), at(13), 30, [(at(10, 15), at(11))]))
+        # The 10:00 and 10:30 slots overlap the exception, the grid is kept after it
+        self.assertEqual(
+            [start for start, _ in slots],
+            [at(9), at(9, 30), at(11), at(11, 30), at(12), at(12, 30)],
+        )
+
+    def test_exceptions_covering_availability(self):
+        self.assertEqual(
+            list(generate_slot_intervals(at(9), at(13), 30, [(at(8), at(14))])), []
+        )
+
+    def test_last_slot_may_run_past_end(self):
+        slots = list(generate_slot_intervals(at(9), at(10), 40, []))
+        self.assertEqual(slots, [(at(9), at(9, 40)), (at(9, 40), at(10, 20))])
+
+
+@ignore_warnings(category=RuntimeWarning, message=r".*received a naive datetime.*")
+class TestSlotMaterialization(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.facility = self.create_facility(user=self.user)
+        self.resource = SchedulableUserResource.objects.create(
+            user=self.user, facility=self.facility
+        )
+        self.schedule = Schedule.objects.create(
+            resource=self.resource,
+            name="Test Schedule",
+            valid_from=datetime.datetime.now(UTC) - timedelta(days=30),
+            valid_to=datetime.datetime.now(UTC) + timedelta(days=30),
+        )
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.availability = self.create_availability()
+
+    def create_availability(self):
+        return Availability.objects.create(
+            schedule=self.schedule,
+            name="Morning",
+            slot_type=SlotTypeOptions.appointment.value,
+            slot_size_in_minutes=30,
+            tokens_per_slot=3,
+            create_tokens=False,
+            reason="Regular schedule",
+            availability=[
+                {
+                    "day_of_week": self.day.weekday(),
+                    "start_time": "09:00:00",
+                    "end_time": "13:00:00",
+                }
+            ],
+        )
+
+    def create_exception(self, start_time, end_time):
+        return AvailabilityException.objects.create(
+            resource=self.resource,
+            name="Meeting",
+            valid_from=self.day,
+            valid_to=self.day,
+            start_time=start_time,
+            end_time=end_time,
+        )
+
+    def create_slot(self, hour, minute=0, **kwargs):
+        start = timezone.make_aware(
+            datetime.datetime.combine(self.day, datetime.time(hour, minute))
+        )
+        return TokenSlot.objects.create(
+            resource=self.resource,
+            availability=self.availability,
+            start_datetime=start,
+            end_datetime=start + timedelta(minutes=30),
+            **kwargs,
+        )
+
+    def get_slot_times(self):
+        return sorted(
+            timezone.localtime(start).time()
+            for start in get_day_slots(self.resource, self.day).values_list(
+                "start_datetime", flat=True
+            )
+        )
+
+    def test_tokens_per_slot(self):
+        tokens = calculate_available_tokens([self.resource], self.day, self.day)
+        self.assertEqual(tokens[self.resource.id][self.day], 8 * 3)
+
+    def test_tokens_exclude_exceptions(self):
+        self.create_exception(datetime.time(10, 15), datetime.time(11, 0))
+        tokens = calculate_available_tokens([self.resource], self.day, self.day)
+        self.assertEqual(tokens[self.resource.id][self.day], 6 * 3)
+
+    def test_materialize_splits_availability_around_exception(self):
+        self.create_exception(datetime.time(10, 15), datetime.time(11, 0))
+        materialize_slots(self.resource, self.day)
+        self.assertEqual(
+            self.get_slot_times(),
+            [
+                datetime.time(9, 0),
+                datetime.time(9, 30),
+                datetime.time(11, 0),
+                datetime.time(11, 30),
+                datetime.time(12, 0),
+                datetime.time(12, 30),
+            ],
+        )
+
+    def test_materialize_is_idempotent(self):
+        materialize_slots(self.resource, self.day)
+        self.assertEqual(materialize_slots(self.resource, self.day), [])
+        self.assertEqual(len(self.get_slot_times()), 8)
+
+    def test_prune_removes_only_unbooked_stale_slots(self):
+        materialize_slots(self.resource, self.day)
+        self.create_exception(datetime.time(9, 0), datetime.time(10, 0))
+        booked = TokenSlot.objects.get(
+            resource=self.resource,
+            start_datetime=timezone.make_aware(
+                datetime.datetime.combine(self.day, datetime.time(9, 30))
+            ),
+        )
+        booked.allocated = 1
+        booked.save()
+
+        # Without prune the slots the exception now covers are kept
+        materialize_slots(self.resource, self.day)
+        self.assertEqual(len(self.get_slot_times()), 8)
+
+        materialize_slots(self.resource, self.day, prune=True)
+        times = self.get_slot_times()
+        self.assertNotIn(datetime.time(9, 0), times)
+        # Booked slots are never pruned
+        self.assertIn(datetime.time(9, 30), times)
+        self.assertEqual(len(times), 7)
+
+    def test_concurrent_materialization_skips_existing_slots(self):
+        materialize_slots(self.resource, self.day)
+        # A materializer that read the day before the first one committed
+        with patch(
+            "care.emr.utils.slots.get_day_slots", return_value=TokenSlot.objects.none()
+        ):
+            materialize_slots(self.resource, self.day)
+        self.assertEqual(len(self.get_slot_times()), 8)
+
+    def test_pruned_slot_is_recreated(self):
+        materialize_slots(self.resource, self.day)
+        exception = self.create_exception(datetime.time(9, 0), datetime.time(10, 0))
+        materialize_slots(self.resource, self.day, prune=True)
+        self.assertEqual(len(self.get_slot_times()), 6)
+        # The soft deleted rows do not take part in the unique constraint
+        exception.delete()
+        materialize_slots(self.resource, self.day)
+        self.assertEqual(len(self.get_slot_times()), 8)
+
+    def test_prune_keeps_past_slots(self):
+        self.day = timezone.localdate() - timedelta(days=1)
+        slot = self.create_slot(15)
+        materialize_slots(self.resource, self.day, prune=True)
+        slot.refresh_from_db()
+        self.assertFalse(slot.deleted)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "config.caches.LocMemCache"}},
+    SLOT_MATERIALIZE_DAYS=7,
+)
+class TestSlotMaterializationTask(TestSlotMaterialization):
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_schedule_change_materializes_window(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.availability.save()
+        today = timezone.localdate()
+        for offset in range(8):
+            self.assertTrue(
+                is_materialized(self.resource.id, today + timedelta(days=offset))
+            )
+        self.assertFalse(is_materialized(self.resource.id, today + timedelta(days=8)))
+        self.assertEqual(len(self.get_slot_times()), 8)
+
+    def test_schedule_change_invalidates_materialized_days(self):
+        materialize_slots_for_range(self.resource, self.day, self.day)
+        self.assertTrue(is_materialized(self.resource.id, self.day))
+        with (
+            patch.object(materialize_resource_slots, "delay") as delay,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            self.create_exception(datetime.time(9, 0), datetime.time(10, 0))
+            # Nothing is invalidated until the change commits
+            self.assertTrue(is_materialized(self.resource.id, self.day))
+        delay.assert_called_once_with(self.resource.id)
+        self.assertFalse(is_materialized(self.resource.id, self.day))
+
+    def test_task_prunes_slots_removed_from_schedule(self):
+        materialize_slots(self.resource, self.day)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_exception(datetime.time(9, 0), datetime.time(10, 0))
+        self.assertTrue(is_materialized(self.resource.id, self.day))
+        self.assertEqual(len(self.get_slot_times()), 6)
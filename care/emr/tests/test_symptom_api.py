@@ -2,6 +2,7 @@ import uuid
 from secrets import choice
 from unittest.mock import patch
 
+from django.db.models.signals import post_save
 from django.forms import model_to_dict
 from django.urls import reverse
 from model_bakery import baker
@@ -14,6 +15,7 @@ from care.emr.resources.condition.spec import (
     VerificationStatusChoices,
 )
 from care.emr.resources.resource_request.spec import StatusChoices
+from care.security.authorization import AuthorizationController
 from care.security.permissions.encounter import EncounterPermissions
 from care.security.permissions.patient import PatientPermissions
 from care.utils.tests.base import CareAPITestBase
@@ -692,3 +694,95 @@ class TestSymptomViewSet(CareAPITestBase):
         url = self._get_symptom_url(symptom.external_id)
         delete_response = self.client.delete(url, {}, format="json")
         self.assertEqual(delete_response.status_code, 403)
+
+    # UPSERT TESTS
+    def test_upsert_symptoms_in_bulk(self):
+        """
+        Upserting creates and updates in bulk queries, sets the symptom category
+        and still sends the save signals of every row
+        """
+        permissions = [
+            EncounterPermissions.can_write_encounter.name,
+            PatientPermissions.can_view_clinical_data.name,
+        ]
+        role = self.create_role_with_permissions(permissions)
+        self.attach_role_facility_organization_user(self.organization, self.user, role)
+        encounter = self.create_encounter(
+            patient=self.patient,
+            facility=self.facility,
+            organization=self.organization,
+        )
+        symptom = self.create_symptom(encounter=encounter, patient=self.patient)
+        datapoints = [
+            self.generate_data_for_symptom(
+                encounter,
+                id=str(symptom.external_id),
+                clinical_status=ClinicalStatusChoices.resolved.value,
+            ),
+            self.generate_data_for_symptom(encounter),
+        ]
+
+        saved = []
+
+        def receiver(sender, instance, created, using, **kwargs):
+            saved.append((instance.id, created, using))
+
+        post_save.connect(receiver, sender=Condition, weak=False)
+        try:
+            with patch.object(
+                AuthorizationController,
+                "call_many",
+                wraps=AuthorizationController.call_many,
+            ) as call_many:
+                response = self.client.post(
+                    reverse(
+                        "symptom-upsert",
+                        kwargs={"patient_external_id": self.patient.external_id},
+                    ),
+                    {"datapoints": datapoints},
+                    format="json",
+                )
+        finally:
+            post_save.disconnect(receiver, sender=Condition)
+        self.assertEqual(response.status_code, 200)
+        # The encounters of the updated rows are authorized as a batch
+        call_many.assert_called_once_with(
+            "can_update_encounter_obj", self.user, [encounter]
+        )
+
+        symptom.refresh_from_db()
+        self.assertEqual(symptom.clinical_status, ClinicalStatusChoices.resolved.value)
+        created = Condition.objects.get(external_id=response.data[1]["id"])
+        self.assertEqual(created.category, CategoryChoices.problem_list_item.value)
+        self.assertEqual(created.created_by, self.user)
+        self.assertCountEqual(
+            saved, [(created.id, True, "default"), (symptom.id, False, "default")]
+        )
+
+    def test_upsert_symptoms_with_invalid_datapoint_writes_nothing(self):
+        permissions = [
+            EncounterPermissions.can_write_encounter.name,
+            PatientPermissions.can_view_clinical_data.name,
+        ]
+        role = self.create_role_with_permissions(permissions)
+        self.attach_role_facility_organization_user(self.organization, self.user, role)
+        encounter = self.create_encounter(
+            patient=self.patient,
+            facility=self.facility,
+            organization=self.organization,
+        )
+        datapoints = [
+            self.generate_data_for_symptom(encounter),
+            self.generate_data_for_symptom(encounter, clinical_status="invalid"),
+        ]
+        response = self.client.post(
+            reverse(
+                "symptom-upsert",
+                kwargs={"patient_external_id": self.patient.external_id},
+            ),
+            {"datapoints": datapoints},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("errors", response.data[1])
+        self.assertFalse(Condition.objects.filter(encounter=encounter).exists())
@@ -0,0 +1,123 @@
+from unittest.mock import patch
+
+from care.emr.fhir.resources.valueset import ValueSetResource
+from care.emr.models import ValueSet
+from care.emr.models.valueset import ValueSetConcept
+from care.emr.registries.care_valueset.care_valueset import validate_valueset_codings
+from care.emr.resources.common.coding import Coding
+from care.emr.resources.questionnaire.plan import QuestionPlan
+from care.emr.resources.questionnaire.spec import QuestionType
+from care.emr.resources.questionnaire.utils import validate_question_result
+from care.emr.resources.questionnaire_response.spec import (
+    QuestionnaireSubmitResult,
+    QuestionnaireSubmitResultValue,
+)
+from care.utils.tests.base import CareAPITestBase
+
+SYSTEM = "http://snomed.info/sct"
+
+# Codes the mocked terminology server knows
+REMOTE_CODES = {"1", "2"}
+
+
+def coding(code):
+    return Coding(system=SYSTEM, code=code, display="")
+
+
+class TestValidateValuesetCodings(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.valueset = ValueSet.objects.create(
+            slug="test-symptoms",
+            name="Test Symptoms",
+            status="active",
+            compose={"include": [{"system": SYSTEM}], "exclude": []},
+        )
+        patcher = patch.object(
+            ValueSetResource,
+            "lookup",
+            autospec=True,
+            side_effect=lambda resource, code: code.code in REMOTE_CODES,
+        )
+        self.lookup = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def looked_up_codes(self):
+        return sorted(call.args[1].code for call in self.lookup.call_args_list)
+
+    def test_duplicate_pairs_are_looked_up_once(self):
+        invalid = validate_valueset_codings(
+            [
+                (self.valueset.slug, coding("1")),
+                (self.valueset.slug, coding("3")),
+                (self.valueset.slug, coding("1")),
+                (self.valueset.slug, coding("3")),
+            ]
+        )
+        self.assertEqual(invalid, {1, 3})
+        self.assertEqual(self.looked_up_codes(), ["1", "3"])
+
+    def test_unknown_valueset_is_invalid(self):
+        invalid = validate_valueset_codings(
+            [("missing-valueset", coding("1")), (self.valueset.slug, coding("2"))]
+        )
+        self.assertEqual(invalid, {0})
+        self.assertEqual(self.looked_up_codes(), ["2"])
+
+    def test_indexed_codings_are_not_looked_up(self):
+        ValueSetConcept.objects.create(
+            valueset=self.valueset,
+            system=SYSTEM,
+            code="5",
+            display="Cough",
+            search_text="cough",
+        )
+        self.valueset.indexed_compose_hash = self.valueset.get_compose_hash()
+        self.valueset.save()
+        invalid = validate_valueset_codings(
+            [
+                (self.valueset.slug, coding("5")),
+                (self.valueset.slug, coding("2")),
+                (self.valueset.slug, coding("4")),
+            ]
+        )
+        # 5 is found in the index, 2 and 4 are sent to the terminology server
+        self.assertEqual(invalid, {2})
+        self.assertEqual(self.looked_up_codes(), ["2", "4"])
+
+
+class TestQuantityValuesetChecks(CareAPITestBase):
+    question = QuestionPlan(
+        id="weight",
+        type=QuestionType.quantity.value,
+        required=False,
+        effective_required=False,
+        repeats=False,
+        choices=frozenset(),
+        answer_value_set="test-units",
+    )
+
+    def validate(self, value):
+        errors = []
+        valueset_checks = []
+        response = QuestionnaireSubmitResult(
+            question_id="7c9b7a3e-3c1b-4d8f-9f53-5a1f2c3d4e5f", values=[value]
+        )
+        validate_question_result(self.question, response, errors, valueset_checks)
+        return errors, valueset_checks
+
+    def test_quantity_without_coding_is_not_validated(self):
+        errors, valueset_checks = self.validate(
+            QuestionnaireSubmitResultValue(value="70", unit=coding("kg"))
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(valueset_checks, [])
+
+    def test_quantity_coding_is_validated(self):
+        errors, valueset_checks = self.validate(
+            QuestionnaireSubmitResultValue(
+                value="70", unit=coding("kg"), coding=coding("1")
+            )
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(valueset_checks, [("test-units", coding("1"), "weight")])
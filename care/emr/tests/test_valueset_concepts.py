@@ -0,0 +1,126 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+
+from care.emr.fhir.resources.valueset import ValueSetResource
+from care.emr.models import ValueSet
+from care.emr.resources.common.coding import Coding
+from care.utils.tests.base import CareAPITestBase
+
+SYSTEM = "http://snomed.info/sct"
+
+CONCEPTS = [
+    {"system": SYSTEM, "code": "1", "display": "Fever"},
+    {
+        "system": SYSTEM,
+        "code": "2",
+        "display": "Headache",
+        "designation": [{"language": "hi", "value": "Sirdard"}],
+    },
+    {"system": SYSTEM, "code": "3", "display": "Chest pain"},
+    {"system": SYSTEM, "code": "4", "display": "Chronic fever"},
+    {"system": SYSTEM, "code": "5", "display": "Cough"},
+]
+
+
+def get_parameter(request_json, name):
+    for parameter in request_json["parameter"]:
+        if parameter["name"] == name:
+            return parameter.get("valueInteger", parameter.get("valueString"))
+    return None
+
+
+def fake_expand(method, resource, request_json):
+    """
+    Serves CONCEPTS through $expand, honouring count and offset
+    """
+    offset = get_parameter(request_json, "offset") or 0
+    count = get_parameter(request_json, "count") or len(CONCEPTS)
+    return {"expansion": {"contains": CONCEPTS[offset : offset + count]}}
+
+
+class TestSyncValueSetConcepts(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.valueset = ValueSet.objects.create(
+            slug="test-symptoms",
+            name="Test Symptoms",
+            status="active",
+            compose={"include": [{"system": SYSTEM}], "exclude": []},
+        )
+
+    def sync(self, *args):
+        stdout = StringIO()
+        call_command(
+            "sync_valueset_concepts", "--slug", self.valueset.slug, *args, stdout=stdout
+        )
+        self.valueset.refresh_from_db()
+        return stdout.getvalue()
+
+    def test_offset_filter_is_sent_to_expand(self):
+        with patch.object(ValueSetResource, "query", return_value={}) as query:
+            ValueSetResource().filter(count=2, offset=4).search()
+        request_json = query.call_args.args[2]
+        self.assertEqual(get_parameter(request_json, "offset"), 4)
+        self.assertEqual(get_parameter(request_json, "count"), 2)
+
+    def test_sync_pages_through_expand(self):
+        with patch.object(ValueSetResource, "query", side_effect=fake_expand) as query:
+            self.valueset.build_concept_index(max_concepts=100, page_size=2)
+        self.valueset.refresh_from_db()
+        # Pages of 2 at offsets 0, 2 and 4, the last one is short
+        self.assertEqual(
+            [get_parameter(call.args[2], "offset") for call in query.call_args_list],
+            [0, 2, 4],
+        )
+        self.assertEqual(
+            set(self.valueset.concepts.values_list("code", flat=True)),
+            {"1", "2", "3", "4", "5"},
+        )
+        self.assertTrue(self.valueset.has_concept_index())
+
+    def test_sync_command_builds_index(self):
+        with patch.object(ValueSetResource, "query", side_effect=fake_expand):
+            output = self.sync()
+        self.assertIn(f"Synced 5 concepts for {self.valueset.slug}", output)
+        self.assertTrue(self.valueset.has_concept_index())
+
+        # Served from the index without querying the terminology server
+        with patch.object(ValueSetResource, "query") as query:
+            results = self.valueset.search("fev")
+            self.assertTrue(
+                self.valueset.lookup(Coding(system=SYSTEM, code="2", display=""))
+            )
+        query.assert_not_called()
+        self.assertEqual([concept.code for concept in results], ["1", "4"])
+
+    def test_sync_command_skips_large_valueset(self):
+        with patch.object(ValueSetResource, "query", side_effect=fake_expand):
+            output = self.sync("--max-concepts", "3")
+        self.assertIn("Skipped", output)
+        self.assertFalse(self.valueset.has_concept_index())
+        self.assertFalse(self.valueset.concepts.exists())
+
+    def test_sync_command_skips_up_to_date_index(self):
+        with patch.object(ValueSetResource, "query", side_effect=fake_expand):
+            self.sync()
+        with patch.object(ValueSetResource, "query") as query:
+            self.sync()
+        query.assert_not_called()
+
+    def test_index_unused_after_compose_change(self):
+        with patch.object(ValueSetResource, "query", side_effect=fake_expand):
+            self.sync()
+        self.valueset.compose = {
+            "include": [{"system": SYSTEM, "concept": [{"code": "1"}]}],
+            "exclude": [],
+        }
+        self.valueset.save()
+        self.assertFalse(self.valueset.has_concept_index())
+
+    def test_search_uses_display_language(self):
+        with patch.object(ValueSetResource, "query", side_effect=fake_expand):
+            self.sync()
+        results = self.valueset.search("sird", display_language="hi")
+        self.assertEqual([concept.display for concept in results], ["Sirdard"])
@@ -1,15 +1,32 @@
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from django.db import transaction
+from django.conf import settings
+from django.db import connections, transaction
 from django.test.client import RequestFactory
 from django.urls import Resolver404, resolve
 from rest_framework.exceptions import ParseError
 
+from care.emr.api.viewsets.base import (
+    EMRBaseViewSet,
+    EMRCreateMixin,
+    EMRUpdateMixin,
+)
+
+logger = logging.getLogger(__name__)
+
 HEADERS_TO_INCLUDE = ["HTTP_USER_AGENT", "HTTP_AUTHORIZATION"]
 DEFAULT_CONTENT_TYPE = "application/json"
+READ_ONLY_METHODS = {"get", "head", "options"}
+BATCH_WRITE_ACTIONS = {
+    "create": EMRCreateMixin.create,
+    "update": EMRUpdateMixin.update,
+}
 
 
 def get_response(wsgi_request):
+    start = time.perf_counter()
     try:
         with transaction.atomic():
             view, args, kwargs = resolve(wsgi_request.path_info)
@@ -25,9 +42,14 @@ def get_response(wsgi_request):
     except Exception as exc:
         data = {"detail": "server_error"}
         headers = {}
-        logging.exception(exc)
+        logger.exception(exc)
         status_code = 500
-    return {"status_code": status_code, "headers": headers, "data": data}
+    return {
+        "status_code": status_code,
+        "headers": headers,
+        "data": data,
+        "duration_ms": (time.perf_counter() - start) * 1000,
+    }
 
 
 def pre_process_method_headers(method, headers):
@@ -89,6 +111,133 @@ def execute_serially(requests, resp_generator):
     return [resp_generator(request) for request in requests]
 
 
+def get_response_in_thread(wsgi_request):
+    try:
+        return get_response(wsgi_request)
+    finally:
+        # Connections opened by the worker thread are not reused
+        connections.close_all()
+
+
+def execute_concurrently(requests, resp_generator):
+    workers = min(settings.BATCH_REQUEST_READ_WORKERS, len(requests))
+    if workers <= 1:
+        return execute_serially(requests, resp_generator)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(resp_generator, requests))
+
+
+def get_batch_write_operation(wsgi_request, body):
+    """
+    Returns (view, operation) if the sub-request is a plain create / update of an
+    EMR viewset that can be grouped with other sub-requests to the same route,
+    None otherwise
+    """
+    try:
+        match = resolve(wsgi_request.path_info)
+    except Resolver404:
+        return None
+    view_cls = getattr(match.func, "cls", None)
+    if not (
+        view_cls
+        and issubclass(view_cls, EMRBaseViewSet)
+        and isinstance(body, dict)
+        and not match.args
+    ):
+        return None
+    action = match.func.actions.get(wsgi_request.method.lower())
+    if (
+        action not in BATCH_WRITE_ACTIONS
+        or getattr(view_cls, action) is not BATCH_WRITE_ACTIONS[action]
+    ):
+        # Viewsets that override the action can do more than handle_create /
+        # handle_update, keep them on the regular path
+        return None
+    return match.func, {"action": action, "kwargs": match.kwargs, "data": body}
+
+
+def get_batch_write_response(parent_request, view, wsgi_requests, operations):
+    """
+    Runs a group of create / update sub-requests against the same route in a
+    single dispatch of the viewset, returns one response per sub-request
+    """
+    start = time.perf_counter()
+    wsgi_request = get_wsgi_request_object(
+        parent_request,
+        "post",
+        wsgi_requests[0].path_info,
+        {},
+        {"operations": operations},
+    )
+    try:
+        with transaction.atomic():
+            resp = view.cls.as_view({"post": "batch_write"}, **view.initkwargs)(
+                wsgi_request, **operations[0]["kwargs"]
+            )
+            data = resp.data
+            status_code = resp.status_code
+    except Exception as exc:
+        data = {"detail": "server_error"}
+        logger.exception(exc)
+        status_code = 500
+    if status_code != 200:  # noqa PLR2004
+        # The dispatch itself failed, ex. authentication or throttling
+        duration = (time.perf_counter() - start) * 1000 / len(operations)
+        return [
+            {
+                "status_code": status_code,
+                "headers": {},
+                "data": data,
+                "duration_ms": duration,
+            }
+            for _ in operations
+        ]
+    return [{"headers": {}, **result} for result in data["results"]]
+
+
+def plan_batch(wsgi_requests, bodies):
+    """
+    Splits the sub-requests into steps, keeping the order of writes:
+
+    * ("concurrent", indices, None): read only sub-requests that come before any
+      write, they can only see committed data so they run on their own connections
+    * ("group", indices, (view, operations)): consecutive creates / updates to the
+      same EMR route
+    * ("serial", indices, None): everything else, run one by one in the batch
+      transaction
+    """
+    steps = []
+    index = 0
+    while index < len(wsgi_requests) and (
+        wsgi_requests[index].method.lower() in READ_ONLY_METHODS
+    ):
+        index += 1
+    if index:
+        steps.append(("concurrent", list(range(index)), None))
+    while index < len(wsgi_requests):
+        operation = get_batch_write_operation(wsgi_requests[index], bodies[index])
+        if not operation:
+            steps.append(("serial", [index], None))
+            index += 1
+            continue
+        view = operation[0]
+        indices = [index]
+        operations = [operation[1]]
+        index += 1
+        while index < len(wsgi_requests):
+            operation = get_batch_write_operation(wsgi_requests[index], bodies[index])
+            if not operation or operation[0] is not view:
+                break
+            indices.append(index)
+            operations.append(operation[1])
+            index += 1
+        if len(indices) > 1:
+            steps.append(("group", indices, (view, operations)))
+        else:
+            steps.append(("serial", indices, None))
+    return steps
+
+
 def construct_wsgi_from_data(request, data):
     url = data.url
     body = data.body
@@ -106,4 +255,18 @@ def convert_batch_request_to_wsgi(parent_request, batch_request_data):
 
 def execute_batch_requests(parent_request, batch_request_data):
     wsgi_requests = convert_batch_request_to_wsgi(parent_request, batch_request_data)
-    return execute_serially(wsgi_requests, get_response)
+    bodies = [data.body for data in batch_request_data.requests]
+    responses = [None] * len(wsgi_requests)
+    for step, indices, group in plan_batch(wsgi_requests, bodies):
+        requests = [wsgi_requests[index] for index in indices]
+        if step == "concurrent":
+            step_responses = execute_concurrently(requests, get_response_in_thread)
+        elif step == "group":
+            step_responses = get_batch_write_response(
+                parent_request, group[0], requests, group[1]
+            )
+        else:
+            step_responses = execute_serially(requests, get_response)
+        for index, response in zip(indices, step_responses, strict=True):
+            responses[index] = response
+    return responses
@@ -0,0 +1,350 @@
+"""
+Slot materialization engine.
+
+Slots of an availability are laid on a grid starting at the availability start
+time, a slot is kept when it fits entirely in what is left of the availability
+once the exceptions of that day are subtracted from it.
+Everything is computed on sorted interval sets, so the cost is linear in the
+number of slots and exceptions instead of their product.
+"""
+
+import datetime
+from collections import defaultdict
+from datetime import time, timedelta
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from care.emr.models.scheduling.booking import TokenSlot
+from care.emr.models.scheduling.schedule import (
+    Availability,
+    AvailabilityException,
+    Schedule,
+)
+from care.emr.resources.scheduling.schedule.spec import SlotTypeOptions
+
+SLOT_MATERIALIZATION_VERSION_KEY = "slots:materialized:version:{resource_id}"
+SLOT_MATERIALIZATION_KEY = "slots:materialized:{resource_id}:{version}"
+SLOT_MATERIALIZATION_TIMEOUT = 60 * 60 * 48  # 2 Days
+
+
+def merge_intervals(intervals):
+    """
+    Merges overlapping (start, end) intervals into a sorted disjoint list
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(interval, removals):
+    """
+    Returns the sorted parts of `interval` not covered by any of the sorted,
+    disjoint `removals`
+    """
+    start, end = interval
+    remaining = []
+    for removal_start, removal_end in removals:
+        if removal_end <= start:
+            continue
+        if removal_start >= end:
+            break
+        if removal_start > start:
+            remaining.append((start, removal_start))
+        start = max(start, removal_end)
+    if start < end:
+        remaining.append((start, end))
+    return remaining
+
+
+def get_exception_intervals(exceptions, day):
+    """
+    Exceptions can either be model instances or `.values()` dicts
+    """
+    intervals = []
+    for exception in exceptions:
+        if isinstance(exception, dict):
+            start_time, end_time = exception["start_time"], exception["end_time"]
+        else:
+            start_time, end_time = exception.start_time, exception.end_time
+        intervals.append(
+            (
+                datetime.datetime.combine(day, start_time, tzinfo=None),
+                datetime.datetime.combine(day, end_time, tzinfo=None),
+            )
+        )
+    return merge_intervals(intervals)
+
+
+def generate_slot_intervals(start_time, end_time, slot_size_in_minutes, exceptions):
+    """
+    Yields the (start, end) of every slot between start_time and end_time that
+    does not overlap the sorted, disjoint exception intervals.
+    As slots are only started before end_time, the last one may run past it.
+    """
+    slot_size = timedelta(minutes=slot_size_in_minutes)
+    if slot_size <= timedelta(0) or start_time >= end_time:
+        return
+    slot_count = -((start_time - end_time) // slot_size)
+    window = (start_time, start_time + slot_size * slot_count)
+    for free_start, free_end in subtract_intervals(window, exceptions):
+        # First slot on the grid that starts in this free interval
+        slot_index = -((start_time - free_start) // slot_size)
+        current_time = start_time + slot_index * slot_size
+        while current_time + slot_size <= free_end:
+            yield current_time, current_time + slot_size
+            current_time += slot_size
+
+
+def get_day_availabilities(availabilities, day):
+    """
+    Flattens the availability of the given day out of Availability objects or
+    `.values()` dicts
+    """
+    day_availabilities = []
+    for availability_obj in availabilities:
+        availability = availability_obj
+        if not isinstance(availability_obj, dict):
+            availability = {
+                "id": availability_obj.id,
+                "availability": availability_obj.availability,
+                "slot_size_in_minutes": availability_obj.slot_size_in_minutes,
+                "tokens_per_slot": availability_obj.tokens_per_slot,
+            }
+        for day_availability in availability["availability"]:
+            if day_availability["day_of_week"] == day.weekday():
+                day_availabilities.append(
+                    {
+                        "availability": day_availability,
+                        "slot_size_in_minutes": availability["slot_size_in_minutes"],
+                        "tokens_per_slot": availability["tokens_per_slot"],
+                        "availability_id": availability["id"],
+                    }
+                )
+    return day_availabilities
+
+
+def iter_day_slots(day_availabilities, exceptions, day):
+    """
+    Yields (start, end, day_availability) for every slot of the day
+    """
+    exception_intervals = get_exception_intervals(exceptions, day)
+    for day_availability in day_availabilities:
+        start_time = datetime.datetime.combine(
+            day,
+            time.fromisoformat(day_availability["availability"]["start_time"]),
+            tzinfo=None,
+        )
+        end_time = datetime.datetime.combine(
+            day,
+            time.fromisoformat(day_availability["availability"]["end_time"]),
+            tzinfo=None,
+        )
+        for slot_start, slot_end in generate_slot_intervals(
+            start_time,
+            end_time,
+            day_availability["slot_size_in_minutes"],
+            exception_intervals,
+        ):
+            yield slot_start, slot_end, day_availability
+
+
+def convert_availability_and_exceptions_to_slots(availabilities, exceptions, day):
+    slots = {}
+    for slot_start, slot_end, day_availability in iter_day_slots(
+        availabilities, exceptions, day
+    ):
+        slots[f"{slot_start.time()}-{slot_end.time()}"] = {
+            "start_time": slot_start.time(),
+            "end_time": slot_end.time(),
+            "availability_id": day_availability["availability_id"],
+        }
+    return slots
+
+
+def get_resource_availabilities(resource, day):
+    return Availability.objects.filter(
+        slot_type=SlotTypeOptions.appointment.value,
+        schedule__valid_from__lte=day,
+        schedule__valid_to__gte=day,
+        schedule__resource=resource,
+    )
+
+
+def get_day_range(day):
+    """
+    Aware datetime bounds of the day, lets slot reads use the
+    (resource, start_datetime) index instead of casting every row to a date
+    """
+    start = timezone.make_aware(datetime.datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def get_day_slots(resource, day):
+    day_start, day_end = get_day_range(day)
+    return TokenSlot.objects.filter(
+        resource=resource,
+        start_datetime__gte=day_start,
+        start_datetime__lt=day_end,
+        end_datetime__gte=day_start,
+        end_datetime__lt=day_end,
+    )
+
+
+def materialize_slots(resource, day, prune=False):
+    """
+    Creates the TokenSlot rows of the day that do not exist yet, in one query.
+    Slots inserted concurrently by another materializer are skipped.
+    With `prune`, future slots without bookings that the current availability and
+    exceptions no longer produce are removed as well.
+    """
+    slots = convert_availability_and_exceptions_to_slots(
+        get_day_availabilities(get_resource_availabilities(resource, day), day),
+        AvailabilityException.objects.filter(
+            resource=resource, valid_from__lte=day, valid_to__gte=day
+        ),
+        day,
+    )
+    created_slots = get_day_slots(resource, day).values_list(
+        "id", "start_datetime", "end_datetime", "availability_id"
+    )
+    stale_slot_ids = []
+    for slot_id, start_datetime, end_datetime, availability_id in created_slots:
+        slot_key = (
+            f"{timezone.make_naive(start_datetime).time()}"
+            f"-{timezone.make_naive(end_datetime).time()}"
+        )
+        if slot_key in slots and slots[slot_key]["availability_id"] == availability_id:
+            slots.pop(slot_key)
+        else:
+            stale_slot_ids.append(slot_id)
+    if prune and stale_slot_ids:
+        TokenSlot.objects.filter(
+            id__in=stale_slot_ids, allocated=0, start_datetime__gt=timezone.now()
+        ).update(deleted=True)
+    if not slots:
+        return []
+    return TokenSlot.objects.bulk_create(
+        [
+            TokenSlot(
+                resource=resource,
+                start_datetime=timezone.make_aware(
+                    datetime.datetime.combine(day, slot["start_time"])
+                ),
+                end_datetime=timezone.make_aware(
+                    datetime.datetime.combine(day, slot["end_time"])
+                ),
+                availability_id=slot["availability_id"],
+            )
+            for slot in slots.values()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def get_materialization_version(resource_id):
+    return cache.get_or_set(
+        SLOT_MATERIALIZATION_VERSION_KEY.format(resource_id=resource_id),
+        lambda: uuid4().hex,
+        timeout=None,
+    )
+
+
+def invalidate_materialized_slots(resource_id):
+    """
+    Marks every materialized day of the resource as outdated, until the
+    pre-materializer runs again slots are materialized when they are read
+    """
+    cache.set(
+        SLOT_MATERIALIZATION_VERSION_KEY.format(resource_id=resource_id),
+        uuid4().hex,
+        timeout=None,
+    )
+
+
+def is_materialized(resource_id, day):
+    materialized = cache.get(
+        SLOT_MATERIALIZATION_KEY.format(
+            resource_id=resource_id, version=get_materialization_version(resource_id)
+        )
+    )
+    return bool(materialized) and materialized[0] <= day <= materialized[1]
+
+
+def materialize_slots_for_range(resource, from_date, to_date):
+    """
+    Materializes (and prunes) the slots of every day in the range, then records
+    the range as materialized for the version the schedule was read at
+    """
+    version = get_materialization_version(resource.id)
+    day = from_date
+    while day <= to_date:
+        materialize_slots(resource, day, prune=True)
+        day += timedelta(days=1)
+    cache.set(
+        SLOT_MATERIALIZATION_KEY.format(resource_id=resource.id, version=version),
+        (from_date, to_date),
+        SLOT_MATERIALIZATION_TIMEOUT,
+    )
+
+
+def calculate_available_tokens(resources, from_date, to_date):
+    """
+    Returns {resource_id: {date: total tokens}} for every day in the range, with
+    the schedules, availabilities and exceptions of all resources fetched once
+    """
+    resource_ids = [resource.id for resource in resources]
+    schedules = defaultdict(list)
+    for schedule in Schedule.objects.filter(
+        valid_from__lte=to_date, valid_to__gte=from_date, resource_id__in=resource_ids
+    ).values("id", "resource_id", "valid_from", "valid_to"):
+        schedules[schedule["resource_id"]].append(schedule)
+    availabilities = defaultdict(list)
+    for availability in Availability.objects.filter(
+        schedule_id__in=[
+            schedule["id"]
+            for resource_schedules in schedules.values()
+            for schedule in resource_schedules
+        ],
+        slot_type=SlotTypeOptions.appointment.value,
+    ).values(
+        "id", "schedule_id", "availability", "slot_size_in_minutes", "tokens_per_slot"
+    ):
+        availabilities[availability["schedule_id"]].append(availability)
+    exceptions = defaultdict(list)
+    for exception in AvailabilityException.objects.filter(
+        valid_from__lte=to_date, valid_to__gte=from_date, resource_id__in=resource_ids
+    ).values("resource_id", "valid_from", "valid_to", "start_time", "end_time"):
+        exceptions[exception["resource_id"]].append(exception)
+
+    results = {}
+    for resource_id in resource_ids:
+        results[resource_id] = {}
+        day = from_date
+        while day <= to_date:
+            day_availabilities = []
+            for schedule in schedules[resource_id]:
+                valid_from = timezone.make_naive(schedule["valid_from"]).date()
+                valid_to = timezone.make_naive(schedule["valid_to"]).date()
+                if valid_from <= day <= valid_to:
+                    day_availabilities.extend(
+                        get_day_availabilities(availabilities[schedule["id"]], day)
+                    )
+            day_exceptions = [
+                exception
+                for exception in exceptions[resource_id]
+                if exception["valid_from"] <= day <= exception["valid_to"]
+            ]
+            results[resource_id][day] = sum(
+                day_availability["tokens_per_slot"]
+                for _, _, day_availability in iter_day_slots(
+                    day_availabilities, day_exceptions, day
+                )
+            )
+            day += timedelta(days=1)
+    return results
@@ -0,0 +1,156 @@
+"""
+Set based maintenance of the denormalized columns of self referencing trees
+(organizations and facility locations).
+
+The tree columns of a node (parent_cache, level_cache, the root and
+cached_parent_json, plus model specific ones) only depend on its parent and on
+the node itself, so a subtree is refreshed one level at a time. Every level
+costs one SELECT and a bulk UPDATE per TREE_BATCH_SIZE nodes, however many
+nodes it has.
+
+Models taking part define:
+
+* ``tree_root_field``, the attname of the root foreign key
+* ``tree_extra_fields``, columns set by ``refresh_tree_level``
+* ``tree_json_fields``, the columns ``get_subtree_json()`` is built from
+* ``get_subtree_json()``, the json its children store as ``cached_parent_json``
+* ``refresh_tree_level(nodes)``, a classmethod setting the model specific
+  columns of a whole level of nodes at once
+
+The columns are written through whenever a node changes and never expire, so
+reading them never has to touch the database.
+"""
+
+TREE_BATCH_SIZE = 500
+
+
+def get_tree_values(node):
+    return (node.parent_cache, node.level_cache, getattr(node, node.tree_root_field))
+
+
+def set_tree_cache(node, parent):
+    """
+    Sets the position columns of the node from its parent, returns whether they
+    changed
+    """
+    previous = get_tree_values(node)
+    if parent is None:
+        node.parent_cache = []
+        node.level_cache = 0
+        setattr(node, node.tree_root_field, None)
+    else:
+        node.parent_cache = [*parent.parent_cache, parent.id]
+        node.level_cache = parent.level_cache + 1
+        root_id = getattr(parent, node.tree_root_field) or parent.id
+        setattr(node, node.tree_root_field, root_id)
+    return previous != get_tree_values(node)
+
+
+def update_tree_cache(node, force=False):
+    """
+    Sets the tree columns of a node about to be saved from its parent, returns
+    whether the node moved in the tree.
+    The parent json and model specific columns are only recomputed for nodes
+    that moved, or with `force` (new nodes)
+    """
+    parent = node.parent
+    if parent and not parent.has_children:
+        parent.has_children = True
+        parent.save(update_fields=["has_children"])
+    moved = set_tree_cache(node, parent)
+    if moved or force:
+        node.cached_parent_json = parent.get_subtree_json() if parent else {}
+        type(node).refresh_tree_level([node])
+    return moved
+
+
+def get_tree_fields(model):
+    return [
+        "parent_cache",
+        "level_cache",
+        model.tree_root_field,
+        "cached_parent_json",
+        *model.tree_extra_fields,
+    ]
+
+
+def refresh_subtrees(nodes):
+    """
+    Recomputes the tree columns of every descendant of the saved nodes, all of
+    the same model
+    """
+    from care.security.authorization.base import clear_authorization_memo
+
+    if not nodes:
+        return
+    model = type(nodes[0])
+    fields = get_tree_fields(model)
+    visited = {node.id for node in nodes}
+    parents = nodes
+    while parents:
+        parents_by_id = {parent.id: parent for parent in parents}
+        children = [
+            child
+            for child in model.objects.filter(parent_id__in=parents_by_id).order_by(
+                "id"
+            )
+            # Guards against parent cycles
+            if child.id not in visited
+        ]
+        parent_json = {}
+        for child in children:
+            parent = parents_by_id[child.parent_id]
+            if parent.id not in parent_json:
+                parent_json[parent.id] = parent.get_subtree_json()
+            child.parent = parent
+            set_tree_cache(child, parent)
+            child.cached_parent_json = parent_json[parent.id]
+        if children:
+            model.refresh_tree_level(children)
+            model.objects.bulk_update(children, fields, batch_size=TREE_BATCH_SIZE)
+        visited.update(child.id for child in children)
+        parents = children
+    # The bulk updates send no save signals, while authorization checks read the
+    # organization caches
+    clear_authorization_memo()
+
+
+def refresh_subtree(node):
+    refresh_subtrees([node])
+
+
+def refresh_children_json(node, update_fields=None):
+    """
+    Write through of the json the children of the node store, after the node
+    was saved with `update_fields`. The subtree is only refreshed when the json
+    went stale, which is checked against a single child.
+    """
+    if not node.has_children:
+        return
+    if update_fields is not None and node.tree_json_fields.isdisjoint(update_fields):
+        return
+    child_json = (
+        type(node)
+        .objects.filter(parent_id=node.id)
+        .values_list("cached_parent_json", flat=True)
+        .first()
+    )
+    if child_json is not None and child_json != node.get_subtree_json():
+        refresh_subtree(node)
+
+
+def rebuild_tree(model):
+    """
+    Recomputes the tree columns of every node of the model, starting from the
+    roots
+    """
+    roots = list(model.objects.filter(parent__isnull=True).order_by("id"))
+    for root in roots:
+        set_tree_cache(root, None)
+        root.cached_parent_json = {}
+    if roots:
+        model.refresh_tree_level(roots)
+        model.objects.bulk_update(
+            roots, get_tree_fields(model), batch_size=TREE_BATCH_SIZE
+        )
+    refresh_subtrees(roots)
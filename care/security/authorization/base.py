@@ -1,13 +1,75 @@
 import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
 
-from care.emr.models.organization import FacilityOrganizationUser, OrganizationUser
-from care.security.models import RolePermission
+from django.db import models
+
+from care.security.authorization.cache import (
+    get_permissions_for_roles,
+    get_roles_with_permissions,
+    get_user_role_assignments,
+)
 
 
 class PermissionDeniedError(Exception):
     pass
 
 
+# Answers to authorization actions for the current scope (usually a request),
+# keyed by (action, memo key of each argument). None when no scope is active.
+_authorization_memo: ContextVar[dict | None] = ContextVar(
+    "authorization_memo", default=None
+)
+
+
+@contextmanager
+def authorization_memo():
+    """
+    Remember the answer to every authorization action performed within the block
+
+    Model arguments are keyed by primary key and the memo is only cleared by the
+    post_save / post_delete of the models in care.security.signals. An instance
+    changed in memory but not saved, or rows written with ``QuerySet.update()``
+    or ``bulk_update()``, keep the earlier answers: code doing such writes within
+    a scope has to call ``clear_authorization_memo`` itself.
+    """
+    token = _authorization_memo.set({})
+    try:
+        yield
+    finally:
+        _authorization_memo.reset(token)
+
+
+def clear_authorization_memo():
+    memo = _authorization_memo.get()
+    if memo:
+        memo.clear()
+
+
+def _memo_key(value):
+    """
+    Model instances are keyed by their primary key, raises TypeError if the value
+    cannot be used to build a memo key
+    """
+    if isinstance(value, models.Model):
+        if value.pk is None:
+            raise TypeError
+        return value._meta.label, value.pk  # noqa SLF001
+    if isinstance(value, list | tuple):
+        return tuple(_memo_key(item) for item in value)
+    if isinstance(value, set | frozenset):
+        return frozenset(_memo_key(item) for item in value)
+    hash(value)
+    return value
+
+
+def _action_memo_key(item, args, kwargs):
+    try:
+        return item, _memo_key(args), _memo_key(tuple(sorted(kwargs.items())))
+    except TypeError:
+        return None
+
+
 class AuthorizationHandler:
     """
     This is the base class for Authorization Handlers
@@ -24,14 +86,22 @@ class AuthorizationHandler:
     actions = []
     queries = []
 
+    def call_many(self, item, user, objs, *args, **kwargs):
+        """
+        Answers the action for each obj in objs, handlers can override this to
+        answer the whole batch with a constant number of queries
+        """
+        return [getattr(self, item)(user, obj, *args, **kwargs) for obj in objs]
+
     def check_permission_in_organization(self, permissions, user, orgs=None):
         if user.is_superuser:
             return True
         roles = self.get_role_from_permissions(permissions)
-        filters = {"role_id__in": roles, "user": user}
-        if orgs:
-            filters["organization_id__in"] = orgs
-        return OrganizationUser.objects.filter(**filters).exists()
+        orgs = set(orgs) if orgs else None
+        return any(
+            role_id in roles and (orgs is None or organization_id in orgs)
+            for organization_id, role_id in get_user_role_assignments(user).organization
+        )
 
     def check_permission_in_facility_organization(
         self, permissions, user, orgs=None, facility=None
@@ -39,28 +109,31 @@ class AuthorizationHandler:
         if user.is_superuser:
             return True
 
+        orgs = set(orgs) if orgs else None
+        facility_id = getattr(facility, "id", facility)
+        assignments = [
+            (organization_id, role_id)
+            for organization_id, role_id, organization_facility_id in (
+                get_user_role_assignments(user).facility_organization
+            )
+            if (orgs is None or organization_id in orgs)
+            and (not facility_id or organization_facility_id == facility_id)
+        ]
         for perm in permissions:
             roles = self.get_role_from_permissions([perm])
-            filters = {"role_id__in": roles, "user": user}
-            if orgs:
-                filters["organization_id__in"] = orgs
-            if facility:
-                filters["organization__facility"] = facility
-
-            if not FacilityOrganizationUser.objects.filter(**filters).exists():
+            if not any(role_id in roles for _, role_id in assignments):
                 return False
 
         return True
 
     def get_role_from_permissions(self, permissions):
-        # TODO Cache this endpoint
-        return list(
-            set(
-                RolePermission.objects.filter(
-                    permission__slug__in=permissions
-                ).values_list("role_id", flat=True)
-            )
-        )
+        return get_roles_with_permissions(permissions)
+
+    def check_permission_in_roles(self, permissions, roles):
+        """
+        Check if any of the given roles grants any of the given permissions
+        """
+        return not get_permissions_for_roles(roles).isdisjoint(permissions)
 
 
 class AuthorizationController:
@@ -81,26 +154,73 @@ class AuthorizationController:
         for controller in (
             cls.internal_authz_controllers + cls.override_authz_controllers
         ):
-            for method in inspect.getmembers(controller(), predicate=inspect.ismethod):
+            handler = controller()
+            for method in inspect.getmembers(handler, predicate=inspect.ismethod):
                 if method[0].startswith("can_"):
-                    cls.cache["actions"][method[0]] = controller
+                    cls.cache["actions"][method[0]] = handler
                 if method[0].startswith("get_"):
-                    cls.cache["queries"][method[0]] = controller
+                    cls.cache["queries"][method[0]] = handler
+
+    @classmethod
+    def get_action_handler(cls, item):
+        if not cls.cache["actions"]:
+            cls.build_cache()
+        if not item.startswith("can_"):
+            raise ValueError("Invalid Item")
+        if item not in cls.cache["actions"]:
+            raise ValueError("Invalid Action")
+        return cls.cache["actions"][item]
 
     @classmethod
     def call(cls, item, *args, **kwargs):
         if not cls.cache["actions"]:
             cls.build_cache()
         if item.startswith("can_"):
-            if item in cls.cache["actions"]:
-                return getattr(cls.cache["actions"][item](), item)(*args, **kwargs)
-            raise ValueError("Invalid Action")
+            handler = cls.get_action_handler(item)
+            memo = _authorization_memo.get()
+            memo_key = (
+                _action_memo_key(item, args, kwargs) if memo is not None else None
+            )
+            if memo_key is None:
+                return getattr(handler, item)(*args, **kwargs)
+            if memo_key not in memo:
+                memo[memo_key] = getattr(handler, item)(*args, **kwargs)
+            return memo[memo_key]
         if item.startswith("get_"):
             if item in cls.cache["queries"]:
-                return getattr(cls.cache["queries"][item](), item)(*args, **kwargs)
+                return getattr(cls.cache["queries"][item], item)(*args, **kwargs)
             raise ValueError("Invalid Query")
         raise ValueError("Invalid Item")
 
+    @classmethod
+    def call_many(cls, item, user, objs, *args, **kwargs):
+        """
+        Batch form of call for actions of the signature (user, obj, ...),
+        returns a list of answers in the same order as objs
+        """
+        handler = cls.get_action_handler(item)
+        memo = _authorization_memo.get()
+        objs = list(objs)
+        results = [None] * len(objs)
+        memo_keys = [None] * len(objs)
+        pending = []
+        for index, obj in enumerate(objs):
+            if memo is not None:
+                memo_keys[index] = _action_memo_key(item, (user, obj, *args), kwargs)
+                if memo_keys[index] in memo:
+                    results[index] = memo[memo_keys[index]]
+                    continue
+            pending.append(index)
+        if pending:
+            answers = handler.call_many(
+                item, user, [objs[index] for index in pending], *args, **kwargs
+            )
+            for index, answer in zip(pending, answers, strict=True):
+                results[index] = answer
+                if memo_keys[index] is not None:
+                    memo[memo_keys[index]] = answer
+        return results
+
     @classmethod
     def register_internal_controller(cls, controller):
         # TODO : Do some deduplication Logic
@@ -0,0 +1,146 @@
+"""
+Versioned cache of the data every authorization check is built from.
+
+Two kinds of entries are kept in the shared cache:
+
+* The role -> permission map, global to the deployment. It is keyed by a version
+  token that is rotated whenever a ``RolePermission`` changes.
+* The role assignments of a user, ie. every (organization, role),
+  (facility organization, role, facility) and (patient, role) pair the user holds.
+  It is keyed by a per user version token that is rotated whenever an
+  ``OrganizationUser``, ``FacilityOrganizationUser`` or ``PatientUser`` row of
+  that user changes.
+
+Readers never delete entries, rotating the version is enough to make every stale
+entry unreachable, which also means a reader racing with a writer can at worst
+populate a key that is never read again.
+"""
+
+from dataclasses import dataclass, field
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from care.emr.models.organization import FacilityOrganizationUser, OrganizationUser
+from care.emr.models.patient import PatientUser
+from care.security.models import RolePermission
+
+AUTHZ_CACHE_TIMEOUT = 60 * 60 * 24  # 1 Day
+
+ROLE_PERMISSION_MAP_VERSION_KEY = "authz:role_permission_map:version"
+ROLE_PERMISSION_MAP_CACHE_KEY = "authz:role_permission_map:{version}"
+USER_ROLES_VERSION_KEY = "authz:user_roles:version:{user_id}"
+USER_ROLES_CACHE_KEY = "authz:user_roles:{user_id}:{version}"
+
+
+@dataclass
+class UserRoleAssignments:
+    """
+    All role assignments of a single user
+    """
+
+    # (organization_id, role_id)
+    organization: list[tuple[int, int]] = field(default_factory=list)
+    # (facility_organization_id, role_id, facility_id)
+    facility_organization: list[tuple[int, int, int]] = field(default_factory=list)
+    # (patient_id, role_id)
+    patient: list[tuple[int, int]] = field(default_factory=list)
+
+
+def _get_version(key):
+    return cache.get_or_set(key, lambda: uuid4().hex, timeout=None)
+
+
+def _rotate_version(key):
+    cache.set(key, uuid4().hex, timeout=None)
+
+
+def get_role_permission_map():
+    """
+    Returns a dict of role_id -> frozenset of permission slugs
+    """
+    cache_key = ROLE_PERMISSION_MAP_CACHE_KEY.format(
+        version=_get_version(ROLE_PERMISSION_MAP_VERSION_KEY)
+    )
+    role_permission_map = cache.get(cache_key)
+    if role_permission_map is not None:
+        return role_permission_map
+
+    role_permissions = {}
+    for role_id, slug in RolePermission.objects.values_list(
+        "role_id", "permission__slug"
+    ):
+        role_permissions.setdefault(role_id, set()).add(slug)
+    role_permission_map = {
+        role_id: frozenset(slugs) for role_id, slugs in role_permissions.items()
+    }
+    cache.set(cache_key, role_permission_map, AUTHZ_CACHE_TIMEOUT)
+    return role_permission_map
+
+
+def get_roles_with_permissions(permissions):
+    """
+    Returns the set of role ids that grant at least one of the given permissions
+    """
+    permissions = set(permissions)
+    return {
+        role_id
+        for role_id, slugs in get_role_permission_map().items()
+        if not permissions.isdisjoint(slugs)
+    }
+
+
+def get_permissions_for_roles(role_ids):
+    """
+    Returns the merged set of permission slugs granted by the given roles
+    """
+    role_permission_map = get_role_permission_map()
+    permissions = set()
+    for role_id in role_ids:
+        permissions.update(role_permission_map.get(role_id, ()))
+    return permissions
+
+
+def get_user_role_assignments(user) -> UserRoleAssignments:
+    cache_key = USER_ROLES_CACHE_KEY.format(
+        user_id=user.id,
+        version=_get_version(USER_ROLES_VERSION_KEY.format(user_id=user.id)),
+    )
+    assignments = cache.get(cache_key)
+    if assignments is not None:
+        return assignments
+
+    assignments = UserRoleAssignments(
+        organization=list(
+            OrganizationUser.objects.filter(user_id=user.id).values_list(
+                "organization_id", "role_id"
+            )
+        ),
+        facility_organization=list(
+            FacilityOrganizationUser.objects.filter(user_id=user.id).values_list(
+                "organization_id", "role_id", "organization__facility_id"
+            )
+        ),
+        patient=list(
+            PatientUser.objects.filter(user_id=user.id).values_list(
+                "patient_id", "role_id"
+            )
+        ),
+    )
+    cache.set(cache_key, assignments, AUTHZ_CACHE_TIMEOUT)
+    return assignments
+
+
+def invalidate_role_permission_map():
+    """
+    Rotated once the current transaction commits, so that no other process can
+    repopulate the new version with rows that are not yet visible to it
+    """
+    transaction.on_commit(lambda: _rotate_version(ROLE_PERMISSION_MAP_VERSION_KEY))
+
+
+def invalidate_user_role_assignments(user_id):
+    transaction.on_commit(
+        lambda: _rotate_version(USER_ROLES_VERSION_KEY.format(user_id=user_id))
+    )
@@ -1,15 +1,95 @@
 from django.db.models import Q
 
-from care.emr.models.organization import FacilityOrganizationUser
+from care.emr.models import Encounter, FacilityLocation
 from care.emr.resources.encounter.constants import COMPLETED_CHOICES
 from care.security.authorization.base import (
     AuthorizationController,
     AuthorizationHandler,
 )
+from care.security.authorization.cache import get_user_role_assignments
 from care.security.permissions.encounter import EncounterPermissions
 
 
 class EncounterAccess(AuthorizationHandler):
+    # Actions of the signature (user, encounter), the permission they check and
+    # whether they are allowed on completed encounters
+    encounter_obj_permissions = {
+        "can_view_encounter_obj": (EncounterPermissions.can_read_encounter.name, True),
+        "can_submit_encounter_questionnaire_obj": (
+            EncounterPermissions.can_submit_encounter_questionnaire.name,
+            False,
+        ),
+        "can_update_encounter_obj": (
+            EncounterPermissions.can_write_encounter.name,
+            False,
+        ),
+    }
+
+    def find_encounter_organizations(self, encounter, location_organizations=None):
+        orgs = [*encounter.facility_organization_cache]
+        if location_organizations is not None:
+            orgs.extend(location_organizations.get(encounter.current_location_id, []))
+        elif encounter.current_location:
+            orgs.extend(encounter.current_location.facility_organization_cache)
+        return orgs
+
+    def check_permission_on_encounter(self, item, user, encounter):
+        permission, allow_completed = self.encounter_obj_permissions[item]
+        if not allow_completed and encounter.status in COMPLETED_CHOICES:
+            # Cannot write to a closed encounter
+            return False
+        return self.check_permission_in_facility_organization(
+            [permission],
+            user,
+            orgs=self.find_encounter_organizations(encounter),
+        )
+
+    def call_many(self, item, user, objs, *args, **kwargs):
+        if item not in self.encounter_obj_permissions or args or kwargs:
+            return super().call_many(item, user, objs, *args, **kwargs)
+        # Fetch the organizations of all current locations that are not loaded yet
+        location_ids = {
+            encounter.current_location_id
+            for encounter in objs
+            if encounter.current_location_id
+            and not Encounter.current_location.is_cached(encounter)
+        }
+        location_organizations = dict(
+            FacilityLocation.objects.filter(id__in=location_ids).values_list(
+                "id", "facility_organization_cache"
+            )
+        )
+        for encounter in objs:
+            if Encounter.current_location.is_cached(encounter):
+                location = encounter.current_location
+                if location:
+                    location_organizations[location.id] = (
+                        location.facility_organization_cache
+                    )
+        # Same checks as check_permission_on_encounter, with the roles and
+        # assignments read once for the batch
+        permission, allow_completed = self.encounter_obj_permissions[item]
+        roles = self.get_role_from_permissions([permission])
+        assignments = get_user_role_assignments(user).facility_organization
+        results = []
+        for encounter in objs:
+            if not allow_completed and encounter.status in COMPLETED_CHOICES:
+                results.append(False)
+                continue
+            if user.is_superuser:
+                results.append(True)
+                continue
+            orgs = set(
+                self.find_encounter_organizations(encounter, location_organizations)
+            )
+            results.append(
+                any(
+                    role_id in roles and (not orgs or organization_id in orgs)
+                    for organization_id, role_id, _ in assignments
+                )
+            )
+        return results
+
     def can_create_encounter_obj(self, user, facility):
         """
         Check if the user has permission to create encounter under this facility
@@ -22,48 +102,24 @@ class EncounterAccess(AuthorizationHandler):
         """
         Check if the user has permission to read encounter under this facility
         """
-        orgs = [*encounter.facility_organization_cache]
-        if encounter.current_location:
-            orgs.extend(encounter.current_location.facility_organization_cache)
-
-        return self.check_permission_in_facility_organization(
-            [EncounterPermissions.can_read_encounter.name],
-            user,
-            orgs=orgs,
+        return self.check_permission_on_encounter(
+            "can_view_encounter_obj", user, encounter
         )
 
     def can_submit_encounter_questionnaire_obj(self, user, encounter):
         """
         Check if the user has permission to read encounter under this facility
         """
-        if encounter.status in COMPLETED_CHOICES:
-            # Cannot write to a closed encounter
-            return False
-
-        orgs = [*encounter.facility_organization_cache]
-        if encounter.current_location:
-            orgs.extend(encounter.current_location.facility_organization_cache)
-
-        return self.check_permission_in_facility_organization(
-            [EncounterPermissions.can_submit_encounter_questionnaire.name],
-            user,
-            orgs=orgs,
+        return self.check_permission_on_encounter(
+            "can_submit_encounter_questionnaire_obj", user, encounter
         )
 
     def can_update_encounter_obj(self, user, encounter):
         """
         Check if the user has permission to create encounter under this facility
         """
-        if encounter.status in COMPLETED_CHOICES:
-            # Cannot write to a closed encounter
-            return False
-        orgs = [*encounter.facility_organization_cache]
-        if encounter.current_location:
-            orgs.extend(encounter.current_location.facility_organization_cache)
-        return self.check_permission_in_facility_organization(
-            [EncounterPermissions.can_write_encounter.name],
-            user,
-            orgs=orgs,
+        return self.check_permission_on_encounter(
+            "can_update_encounter_obj", user, encounter
         )
 
     def get_filtered_encounters(self, qs, user, facility):
@@ -72,11 +128,13 @@ class EncounterAccess(AuthorizationHandler):
         roles = self.get_role_from_permissions(
             [EncounterPermissions.can_list_encounter.name]
         )
-        organization_ids = list(
-            FacilityOrganizationUser.objects.filter(
-                user=user, organization__facility=facility, role_id__in=roles
-            ).values_list("organization_id", flat=True)
-        )
+        organization_ids = [
+            organization_id
+            for organization_id, role_id, facility_id in get_user_role_assignments(
+                user
+            ).facility_organization
+            if role_id in roles and facility_id == facility.id
+        ]
         return qs.filter(
             Q(facility_organization_cache__overlap=organization_ids)
             | Q(current_location__facility_organization_cache__overlap=organization_ids)
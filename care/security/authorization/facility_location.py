@@ -1,9 +1,9 @@
 from care.emr.models import FacilityOrganization
-from care.emr.models.organization import FacilityOrganizationUser
 from care.security.authorization.base import (
     AuthorizationController,
     AuthorizationHandler,
 )
+from care.security.authorization.cache import get_user_role_assignments
 from care.security.permissions.facility_organization import (
     FacilityOrganizationPermissions,
 )
@@ -59,11 +59,13 @@ class FacilityLocationAccess(AuthorizationHandler):
         roles = self.get_role_from_permissions(
             [FacilityLocationPermissions.can_list_facility_locations.name]
         )
-        organization_ids = list(
-            FacilityOrganizationUser.objects.filter(
-                user=user, organization__facility=facility, role_id__in=roles
-            ).values_list("organization_id", flat=True)
-        )
+        organization_ids = [
+            organization_id
+            for organization_id, role_id, facility_id in get_user_role_assignments(
+                user
+            ).facility_organization
+            if role_id in roles and facility_id == facility.id
+        ]
         return qs.filter(facility_organization_cache__overlap=organization_ids)
 
 
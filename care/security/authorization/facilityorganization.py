@@ -1,10 +1,12 @@
 from care.emr.models import FacilityOrganization
-from care.emr.models.organization import FacilityOrganizationUser
 from care.security.authorization.base import (
     AuthorizationController,
     AuthorizationHandler,
 )
-from care.security.models import RoleModel
+from care.security.authorization.cache import (
+    get_permissions_for_roles,
+    get_user_role_assignments,
+)
 from care.security.permissions.facility_organization import (
     FacilityOrganizationPermissions,
 )
@@ -16,17 +18,16 @@ class FacilityOrganizationAccess(AuthorizationHandler):
         Check if the requested role is a subset of user's roles in an organization
         """
         # Get users roles on organization, ideally only one role should be present at some level
-        user_roles = RoleModel.objects.filter(
-            id__in=FacilityOrganizationUser.objects.filter(
-                organization_id__in=organization_parents, user=user
-            ).values("role_id")
-        )
-        merged_permissions = set()
+        organization_parents = set(organization_parents)
+        user_roles = {
+            role_id
+            for organization_id, role_id, _ in get_user_role_assignments(
+                user
+            ).facility_organization
+            if organization_id in organization_parents
+        }
         # Convert role into a list of permissions for the user
-        for role in user_roles:
-            merged_permissions = merged_permissions.union(
-                set(role.get_permission_sk_for_role())
-            )
+        merged_permissions = get_permissions_for_roles(user_roles)
         # Get the requested role's permissions
         requested_role = set(requested_role.get_permission_sk_for_role())
         # Confirm if requested role's permission are the subset of the users roles
@@ -141,17 +142,15 @@ class FacilityOrganizationAccess(AuthorizationHandler):
 
     def get_permission_on_facility_organization(self, organization, user):
         organization_parents = [*organization.parent_cache, organization.id]
-        user_roles = RoleModel.objects.filter(
-            id__in=FacilityOrganizationUser.objects.filter(
-                organization_id__in=organization_parents, user=user
-            ).values("role_id")
-        )
-        merged_permissions = set()
-        for role in user_roles:
-            merged_permissions = merged_permissions.union(
-                set(role.get_permission_sk_for_role())
-            )
-        return merged_permissions
+        organization_parents = set(organization_parents)
+        user_roles = {
+            role_id
+            for organization_id, role_id, _ in get_user_role_assignments(
+                user
+            ).facility_organization
+            if organization_id in organization_parents
+        }
+        return get_permissions_for_roles(user_roles)
 
 
 AuthorizationController.register_internal_controller(FacilityOrganizationAccess)
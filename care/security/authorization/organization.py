@@ -1,11 +1,13 @@
 from django.db.models import Q
 
-from care.emr.models.organization import OrganizationUser
 from care.security.authorization.base import (
     AuthorizationController,
     AuthorizationHandler,
 )
-from care.security.models import RoleModel
+from care.security.authorization.cache import (
+    get_permissions_for_roles,
+    get_user_role_assignments,
+)
 from care.security.permissions.organization import OrganizationPermissions
 
 
@@ -35,17 +37,14 @@ class OrganizationAccess(AuthorizationHandler):
         Check if the requested role is a subset of user's roles in an organization
         """
         # Get users roles on organization, ideally only one role should be present at some level
-        user_roles = RoleModel.objects.filter(
-            id__in=OrganizationUser.objects.filter(
-                organization_id__in=organization_parents, user=user
-            ).values("role_id")
-        )
-        merged_permissions = set()
+        organization_parents = set(organization_parents)
+        user_roles = {
+            role_id
+            for organization_id, role_id in get_user_role_assignments(user).organization
+            if organization_id in organization_parents
+        }
         # Convert role into a list of permissions for the user
-        for role in user_roles:
-            merged_permissions = merged_permissions.union(
-                set(role.get_permission_sk_for_role())
-            )
+        merged_permissions = get_permissions_for_roles(user_roles)
         # Get the requested role's permissions
         requested_role = set(requested_role.get_permission_sk_for_role())
         # Confirm if requested role's permission are the subset of the users roles
@@ -96,11 +95,11 @@ class OrganizationAccess(AuthorizationHandler):
         roles = self.get_role_from_permissions(
             [OrganizationPermissions.can_view_organization.name]
         )
-        organization_ids = list(
-            OrganizationUser.objects.filter(user=user, role_id__in=roles).values_list(
-                "organization_id", flat=True
-            )
-        )
+        organization_ids = [
+            organization_id
+            for organization_id, role_id in get_user_role_assignments(user).organization
+            if role_id in roles
+        ]
         return qs.filter(
             Q(parent_cache__overlap=organization_ids)
             | Q(org_type=OrganizationTypeChoices.govt.value)
@@ -109,17 +108,13 @@ class OrganizationAccess(AuthorizationHandler):
 
     def get_permission_on_organization(self, organization, user):
         organization_parents = [*organization.parent_cache, organization.id]
-        user_roles = RoleModel.objects.filter(
-            id__in=OrganizationUser.objects.filter(
-                organization_id__in=organization_parents, user=user
-            ).values("role_id")
-        )
-        merged_permissions = set()
-        for role in user_roles:
-            merged_permissions = merged_permissions.union(
-                set(role.get_permission_sk_for_role())
-            )
-        return merged_permissions
+        organization_parents = set(organization_parents)
+        user_roles = {
+            role_id
+            for organization_id, role_id in get_user_role_assignments(user).organization
+            if organization_id in organization_parents
+        }
+        return get_permissions_for_roles(user_roles)
 
 
 AuthorizationController.register_internal_controller(OrganizationAccess)
@@ -1,78 +1,121 @@
 from django.db.models import Q
 
-from care.emr.models import Encounter, PatientUser
-from care.emr.models.organization import FacilityOrganizationUser, OrganizationUser
+from care.emr.models import Encounter
 from care.emr.resources.encounter.constants import COMPLETED_CHOICES
 from care.security.authorization.base import (
     AuthorizationController,
     AuthorizationHandler,
 )
-from care.security.models import RolePermission
+from care.security.authorization.cache import get_user_role_assignments
 from care.security.permissions.patient import PatientPermissions
 
 
 class PatientAccess(AuthorizationHandler):
-    def find_roles_on_patient(self, user, patient):
-        role_ids = set()
-        # Through Encounter
+    # Actions of the signature (user, patient) and the permission they check
+    patient_obj_permissions = {
+        "can_view_patient_obj": PatientPermissions.can_list_patients.name,
+        "can_write_patient_obj": PatientPermissions.can_write_patient.name,
+        "can_submit_questionnaire_patient_obj": (
+            PatientPermissions.can_submit_patient_questionnaire.name
+        ),
+        "can_view_clinical_data": PatientPermissions.can_view_clinical_data.name,
+        "can_view_patient_questionnaire_responses": (
+            PatientPermissions.can_view_questionnaire_responses.name
+        ),
+    }
+
+    def find_encounter_organizations(self, patients):
+        """
+        Returns patient_id -> facility organizations of the patient's active
+        encounters and their current locations, in a single query
+        """
+        encounter_organizations = {patient.id: set() for patient in patients}
         encounters = (
-            Encounter.objects.filter(patient=patient)
+            Encounter.objects.filter(patient_id__in=encounter_organizations)
             .exclude(status__in=COMPLETED_CHOICES)
             .values_list(
+                "patient_id",
                 "facility_organization_cache",
                 "current_location__facility_organization_cache",
             )
         )
-        encounter_set = set()
-        for encounter in encounters:
-            encounter_set = encounter_set.union(set(encounter[0]))
+        for patient_id, encounter_cache, location_cache in encounters:
+            encounter_organizations[patient_id].update(encounter_cache)
             # Through Location
-            if encounter[1]:
-                encounter_set = encounter_set.union(set(encounter[1]))
+            if location_cache:
+                encounter_organizations[patient_id].update(location_cache)
+        return encounter_organizations
+
+    def find_roles_on_patient(
+        self, user, patient, encounter_organizations=None, assignments=None
+    ):
+        role_ids = set()
+        # Through Encounter
+        if encounter_organizations is None:
+            encounter_organizations = self.find_encounter_organizations([patient])[
+                patient.id
+            ]
+        if assignments is None:
+            assignments = get_user_role_assignments(user)
         # Find roles based on Location and
-        roles = FacilityOrganizationUser.objects.filter(
-            organization_id__in=encounter_set, user=user
-        ).values_list("role_id", flat=True)
-        role_ids = role_ids.union(set(roles))
+        role_ids.update(
+            role_id
+            for organization_id, role_id, _ in assignments.facility_organization
+            if organization_id in encounter_organizations
+        )
         # Through Organization
-        roles = OrganizationUser.objects.filter(
-            organization_id__in=patient.organization_cache, user=user
-        ).values_list("role_id", flat=True)
-        role_ids = role_ids.union(set(roles))
+        patient_organizations = set(patient.organization_cache)
+        role_ids.update(
+            role_id
+            for organization_id, role_id in assignments.organization
+            if organization_id in patient_organizations
+        )
         # Through Direct association
-        roles = PatientUser.objects.filter(patient=patient, user=user).values_list(
-            "role_id", flat=True
+        role_ids.update(
+            role_id
+            for patient_id, role_id in assignments.patient
+            if patient_id == patient.id
         )
-        return role_ids.union(set(roles))
+        return role_ids
 
-    def can_view_patient_obj(self, user, patient):
+    def check_permission_on_patient(self, permission, user, patient):
         if user.is_superuser:
             return True
         user_roles = self.find_roles_on_patient(user, patient)
-        return RolePermission.objects.filter(
-            permission__slug__in=[PatientPermissions.can_list_patients.name],
-            role__in=user_roles,
-        ).exists()
+        return self.check_permission_in_roles([permission], user_roles)
 
-    def can_write_patient_obj(self, user, patient):
+    def call_many(self, item, user, objs, *args, **kwargs):
+        if item not in self.patient_obj_permissions or args or kwargs:
+            return super().call_many(item, user, objs, *args, **kwargs)
         if user.is_superuser:
-            return True
-        user_roles = self.find_roles_on_patient(user, patient)
-        return RolePermission.objects.filter(
-            permission__slug__in=[PatientPermissions.can_write_patient.name],
-            role__in=user_roles,
-        ).exists()
+            return [True] * len(objs)
+        # The roles, assignments and encounters are read once for the batch
+        roles = self.get_role_from_permissions([self.patient_obj_permissions[item]])
+        assignments = get_user_role_assignments(user)
+        encounter_organizations = self.find_encounter_organizations(objs)
+        return [
+            not roles.isdisjoint(
+                self.find_roles_on_patient(
+                    user, patient, encounter_organizations[patient.id], assignments
+                )
+            )
+            for patient in objs
+        ]
+
+    def can_view_patient_obj(self, user, patient):
+        return self.check_permission_on_patient(
+            PatientPermissions.can_list_patients.name, user, patient
+        )
+
+    def can_write_patient_obj(self, user, patient):
+        return self.check_permission_on_patient(
+            PatientPermissions.can_write_patient.name, user, patient
+        )
 
     def can_submit_questionnaire_patient_obj(self, user, patient):
-        if user.is_superuser:
-            return True
-        user_roles = self.find_roles_on_patient(user, patient)
-        return RolePermission.objects.filter(
-            permission__slug__in=[
-                PatientPermissions.can_submit_patient_questionnaire.name
-            ],
-            role__in=user_roles,
-        ).exists()
+        return self.check_permission_on_patient(
+            PatientPermissions.can_submit_patient_questionnaire.name, user, patient
+        )
 
     def can_create_patient(self, user):
         return self.check_permission_in_facility_organization(
@@ -82,24 +125,14 @@ class PatientAccess(AuthorizationHandler):
         )
 
     def can_view_clinical_data(self, user, patient):
-        if user.is_superuser:
-            return True
-        user_roles = self.find_roles_on_patient(user, patient)
-        return RolePermission.objects.filter(
-            permission__slug__in=[PatientPermissions.can_view_clinical_data.name],
-            role__in=user_roles,
-        ).exists()
+        return self.check_permission_on_patient(
+            PatientPermissions.can_view_clinical_data.name, user, patient
+        )
 
     def can_view_patient_questionnaire_responses(self, user, patient):
-        if user.is_superuser:
-            return True
-        user_roles = self.find_roles_on_patient(user, patient)
-        return RolePermission.objects.filter(
-            permission__slug__in=[
-                PatientPermissions.can_view_questionnaire_responses.name
-            ],
-            role__in=user_roles,
-        ).exists()
+        return self.check_permission_on_patient(
+            PatientPermissions.can_view_questionnaire_responses.name, user, patient
+        )
 
     def get_filtered_patients(self, qs, user):
         if user.is_superuser:
@@ -107,11 +140,11 @@ class PatientAccess(AuthorizationHandler):
         roles = self.get_role_from_permissions(
             [PatientPermissions.can_list_patients.name]
         )
-        organization_ids = list(
-            OrganizationUser.objects.filter(user=user, role_id__in=roles).values_list(
-                "organization_id", flat=True
-            )
-        )
+        organization_ids = [
+            organization_id
+            for organization_id, role_id in get_user_role_assignments(user).organization
+            if role_id in roles
+        ]
         return qs.filter(
             Q(organization_cache__overlap=organization_ids)
             | Q(users_cache__overlap=[user.id])
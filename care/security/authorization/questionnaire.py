@@ -1,8 +1,8 @@
-from care.emr.models.organization import OrganizationUser
 from care.security.authorization.base import (
     AuthorizationController,
     AuthorizationHandler,
 )
+from care.security.authorization.cache import get_user_role_assignments
 from care.security.permissions.questionnaire import QuestionnairePermissions
 
 
@@ -39,11 +39,11 @@ class QuestionnaireAccess(AuthorizationHandler):
         roles = self.get_role_from_permissions(
             [QuestionnairePermissions.can_read_questionnaire.name]
         )
-        organization_ids = list(
-            OrganizationUser.objects.filter(user=user, role_id__in=roles).values_list(
-                "organization_id", flat=True
-            )
-        )
+        organization_ids = [
+            organization_id
+            for organization_id, role_id in get_user_role_assignments(user).organization
+            if role_id in roles
+        ]
         return qs.filter(organization_cache__overlap=organization_ids)
 
 
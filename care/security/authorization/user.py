@@ -1,8 +1,8 @@
-from care.emr.models.organization import FacilityOrganizationUser, OrganizationUser
 from care.security.authorization.base import (
     AuthorizationController,
     AuthorizationHandler,
 )
+from care.security.authorization.cache import get_user_role_assignments
 from care.security.permissions.user import UserPermissions
 
 
@@ -14,11 +14,11 @@ class UserAccess(AuthorizationHandler):
         if user.is_superuser:
             return True
         roles = self.get_role_from_permissions([UserPermissions.can_create_user.name])
-        return (
-            OrganizationUser.objects.filter(user=user, role_id__in=roles).exists()
-            or FacilityOrganizationUser.objects.filter(
-                user=user, role_id__in=roles
-            ).exists()
+        assignments = get_user_role_assignments(user)
+        if any(role_id in roles for _, role_id in assignments.organization):
+            return True
+        return any(
+            role_id in roles for _, role_id, _ in assignments.facility_organization
         )
 
 
@@ -0,0 +1,15 @@
+from care.security.authorization.base import authorization_memo
+
+
+class AuthorizationMemoMiddleware:
+    """
+    Scopes the authorization memo to the request, so that repeated authorization
+    actions within a request are answered once
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with authorization_memo():
+            return self.get_response(request)
@@ -0,0 +1,93 @@
+"""
+Invalidation of the authorization caches, see care.security.authorization.cache
+
+Queryset ``update()``, ``bulk_create()`` and ``bulk_update()`` do not send these
+signals. Code writing the models below in bulk has to call
+``invalidate_role_permission_map`` / ``invalidate_user_role_assignments`` itself,
+as ``sync_permissions_roles`` does.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from care.emr.models.device import Device
+from care.emr.models.encounter import Encounter, EncounterOrganization
+from care.emr.models.location import (
+    FacilityLocation,
+    FacilityLocationEncounter,
+    FacilityLocationOrganization,
+)
+from care.emr.models.organization import (
+    FacilityOrganization,
+    FacilityOrganizationUser,
+    Organization,
+    OrganizationUser,
+)
+from care.emr.models.patient import Patient, PatientOrganization, PatientUser
+from care.emr.models.questionnaire import Questionnaire, QuestionnaireOrganization
+from care.facility.models import Facility
+from care.security.authorization.base import clear_authorization_memo
+from care.security.authorization.cache import (
+    invalidate_role_permission_map,
+    invalidate_user_role_assignments,
+)
+from care.security.models import RoleModel, RolePermission
+from care.users.models import User
+
+# Models whose instances are passed to authorization actions, or whose writes
+# change the caches and role assignments those actions read
+AUTHORIZATION_MEMO_MODELS = (
+    User,
+    Patient,
+    PatientOrganization,
+    PatientUser,
+    Encounter,
+    EncounterOrganization,
+    Facility,
+    FacilityLocation,
+    FacilityLocationEncounter,
+    FacilityLocationOrganization,
+    Organization,
+    OrganizationUser,
+    FacilityOrganization,
+    FacilityOrganizationUser,
+    Device,
+    Questionnaire,
+    QuestionnaireOrganization,
+    RoleModel,
+    RolePermission,
+)
+
+
+@receiver([post_save, post_delete], sender=OrganizationUser)
+@receiver([post_save, post_delete], sender=FacilityOrganizationUser)
+@receiver([post_save, post_delete], sender=PatientUser)
+def invalidate_user_role_assignments_cache(sender, instance, **kwargs):
+    """
+    Invalidate the cached role assignments of the user when a role is assigned,
+    updated or removed
+    """
+    invalidate_user_role_assignments(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=RolePermission)
+@receiver([post_save, post_delete], sender=RoleModel)
+def invalidate_role_permission_map_cache(sender, instance, **kwargs):
+    """
+    Invalidate the cached role -> permission map when roles or their permissions
+    change
+    """
+    invalidate_role_permission_map()
+
+
+def clear_authorization_memo_on_write(sender, instance, **kwargs):
+    """
+    A write within the memo scope can change the answer to an action that was
+    already memoized, ex. an encounter being completed
+    """
+    clear_authorization_memo()
+
+
+for model in AUTHORIZATION_MEMO_MODELS:
+    post_save.connect(clear_authorization_memo_on_write, sender=model)
+    post_delete.connect(clear_authorization_memo_on_write, sender=model)
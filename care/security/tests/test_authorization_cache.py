@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from model_bakery import baker
+
+from care.security.authorization.cache import (
+    get_role_permission_map,
+    get_user_role_assignments,
+)
+from care.security.models import PermissionModel, RolePermission
+from care.utils.tests.base import CareAPITestBase
+
+LOCMEM_CACHES = {"default": {"BACKEND": "config.caches.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AuthorizationCacheTests(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_role_permission_map_invalidated_on_permission_change(self):
+        role = self.create_role_with_permissions(["can_read_test"])
+        self.assertEqual(get_role_permission_map()[role.id], {"can_read_test"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RolePermission.objects.create(
+                role=role, permission=baker.make(PermissionModel, slug="can_write_test")
+            )
+        self.assertEqual(
+            get_role_permission_map()[role.id], {"can_read_test", "can_write_test"}
+        )
+
+    def test_role_permission_map_invalidated_on_role_delete(self):
+        role = self.create_role_with_permissions(["can_read_test"])
+        self.assertIn(role.id, get_role_permission_map())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RolePermission.objects.filter(role=role).delete()
+        self.assertNotIn(role.id, get_role_permission_map())
+
+    def test_role_permission_map_invalidated_by_permission_sync(self):
+        role = self.create_role_with_permissions(["can_read_test"])
+        self.assertIn(role.id, get_role_permission_map())
+
+        # The sync removes rows with queryset deletes and updates
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("sync_permissions_roles")
+        self.assertNotIn(role.id, get_role_permission_map())
+
+    def test_user_role_assignments_invalidated_on_membership_change(self):
+        user = self.create_user()
+        organization = self.create_organization(org_type="govt")
+        role = self.create_role_with_permissions(["can_read_test"])
+        self.assertEqual(get_user_role_assignments(user).organization, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.attach_role_organization_user(organization, user, role)
+        self.assertEqual(
+            get_user_role_assignments(user).organization, [(organization.id, role.id)]
+        )
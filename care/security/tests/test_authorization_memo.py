@@ -0,0 +1,205 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from care.emr.models import Encounter, FacilityLocation, FacilityLocationOrganization
+from care.emr.resources.encounter.constants import StatusChoices
+from care.emr.utils.tree import refresh_subtree
+from care.security.authorization import AuthorizationController
+from care.security.authorization.base import (
+    authorization_memo,
+    clear_authorization_memo,
+)
+from care.security.models import PermissionModel
+from care.utils.tests.base import CareAPITestBase
+
+
+class AuthorizationMemoTests(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.organization = self.create_organization(org_type="govt")
+        self.patient = self.create_patient(geo_organization=self.organization)
+        role = self.create_role_with_permissions(["can_list_patients"])
+        self.attach_role_organization_user(self.organization, self.user, role)
+        self.patient.organization_cache = [self.organization.id]
+
+    def can_view_patient(self):
+        return AuthorizationController.call(
+            "can_view_patient_obj", self.user, self.patient
+        )
+
+    def test_repeated_action_does_not_query_again(self):
+        with authorization_memo():
+            with CaptureQueriesContext(connection) as first:
+                self.assertTrue(self.can_view_patient())
+            self.assertGreater(len(first), 0)
+            with self.assertNumQueries(0):
+                self.assertTrue(self.can_view_patient())
+
+    def test_action_queries_again_without_memo(self):
+        with CaptureQueriesContext(connection) as first:
+            self.can_view_patient()
+        with CaptureQueriesContext(connection) as second:
+            self.can_view_patient()
+        self.assertEqual(len(second), len(first))
+
+    def test_memo_cleared_by_write_to_authorization_model(self):
+        facility = self.create_facility(user=self.user)
+        encounter = self.create_encounter(
+            self.patient, facility, self.create_facility_organization(facility)
+        )
+        with authorization_memo():
+            self.can_view_patient()
+            Encounter.objects.get(id=encounter.id).save()
+            with CaptureQueriesContext(connection) as after_write:
+                self.can_view_patient()
+        self.assertGreater(len(after_write), 0)
+
+    def test_memo_kept_on_write_to_unrelated_model(self):
+        with authorization_memo():
+            self.can_view_patient()
+            PermissionModel.objects.create(slug="can_read_unrelated")
+            with self.assertNumQueries(0):
+                self.can_view_patient()
+
+    def test_encounter_write_answered_again_after_completion(self):
+        facility = self.create_facility(user=self.user)
+        facility_organization = self.create_facility_organization(facility)
+        role = self.create_role_with_permissions(["can_write_encounter"])
+        self.attach_role_facility_organization_user(
+            facility_organization, self.user, role
+        )
+        encounter = self.create_encounter(self.patient, facility, facility_organization)
+        with authorization_memo():
+            self.assertTrue(
+                AuthorizationController.call(
+                    "can_update_encounter_obj", self.user, encounter
+                )
+            )
+            encounter.status = StatusChoices.completed.value
+            encounter.save()
+            self.assertFalse(
+                AuthorizationController.call(
+                    "can_update_encounter_obj", self.user, encounter
+                )
+            )
+
+    def test_memo_kept_on_bulk_update(self):
+        facility = self.create_facility(user=self.user)
+        encounter = self.create_encounter(
+            self.patient, facility, self.create_facility_organization(facility)
+        )
+        with authorization_memo():
+            self.can_view_patient()
+            # Queryset updates send no signals, the earlier answer is kept until
+            # the memo is cleared
+            Encounter.objects.filter(id=encounter.id).update(
+                status=StatusChoices.completed.value
+            )
+            with self.assertNumQueries(0):
+                self.can_view_patient()
+            clear_authorization_memo()
+            with CaptureQueriesContext(connection) as after_clear:
+                self.can_view_patient()
+        self.assertGreater(len(after_clear), 0)
+
+    def test_memo_cleared_by_tree_refresh(self):
+        facility = self.create_facility(user=self.user)
+        location = FacilityLocation.objects.create(facility=facility, name="Ward")
+        with authorization_memo():
+            self.can_view_patient()
+            refresh_subtree(location)
+            with CaptureQueriesContext(connection) as after_refresh:
+                self.can_view_patient()
+        self.assertGreater(len(after_refresh), 0)
+
+
+class AuthorizationBatchTests(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.facility = self.create_facility(user=self.user)
+        self.organization = self.create_facility_organization(self.facility)
+        self.other_organization = self.create_facility_organization(self.facility)
+        role = self.create_role_with_permissions(
+            ["can_list_patients", "can_write_encounter"]
+        )
+        self.attach_role_facility_organization_user(self.organization, self.user, role)
+        self.location = FacilityLocation.objects.create(
+            facility=self.facility, name="Ward"
+        )
+        FacilityLocationOrganization.objects.create(
+            location=self.location, organization=self.organization
+        )
+
+    def create_patients(self, count):
+        """
+        Every other patient is under an active encounter the user can access
+        """
+        patients = []
+        for index in range(count):
+            patient = self.create_patient()
+            organization = self.organization if index % 2 else self.other_organization
+            self.create_encounter(patient, self.facility, organization)
+            patients.append(patient)
+        return patients
+
+    def create_encounters(self, count):
+        """
+        Every other encounter is in a location the user can access
+        """
+        encounter_ids = []
+        for index in range(count):
+            encounter = self.create_encounter(
+                self.create_patient(),
+                self.facility,
+                self.other_organization,
+                current_location=self.location if index % 2 else None,
+            )
+            encounter_ids.append(encounter.id)
+        return list(Encounter.objects.filter(id__in=encounter_ids).order_by("id"))
+
+    def call_many(self, action, objs):
+        with CaptureQueriesContext(connection) as queries:
+            answers = AuthorizationController.call_many(action, self.user, objs)
+        return answers, len(queries)
+
+    def test_patients_answered_with_constant_queries(self):
+        few, few_queries = self.call_many(
+            "can_view_patient_obj", self.create_patients(2)
+        )
+        patients = self.create_patients(6)
+        many, many_queries = self.call_many("can_view_patient_obj", patients)
+        self.assertEqual(few, [False, True])
+        self.assertEqual(many, [False, True] * 3)
+        self.assertEqual(many_queries, few_queries)
+        self.assertEqual(
+            many,
+            [
+                AuthorizationController.call("can_view_patient_obj", self.user, patient)
+                for patient in patients
+            ],
+        )
+
+    def test_encounters_answered_with_constant_queries(self):
+        few, few_queries = self.call_many(
+            "can_update_encounter_obj", self.create_encounters(2)
+        )
+        encounters = self.create_encounters(6)
+        many, many_queries = self.call_many("can_update_encounter_obj", encounters)
+        self.assertEqual(few, [False, True])
+        self.assertEqual(many, [False, True] * 3)
+        self.assertEqual(many_queries, few_queries)
+
+    def test_batch_answers_are_memoized(self):
+        encounters = self.create_encounters(2)
+        with authorization_memo():
+            AuthorizationController.call_many(
+                "can_update_encounter_obj", self.user, encounters
+            )
+            with self.assertNumQueries(0):
+                self.assertTrue(
+                    AuthorizationController.call(
+                        "can_update_encounter_obj", self.user, encounters[1]
+                    )
+                )
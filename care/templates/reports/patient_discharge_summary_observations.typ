@@ -0,0 +1,21 @@
+{% load data_formatting_extras %}
+{% load discharge_summary_utils %}
+{% for observation in observations %}
+    {% if observation.main_code.display and observation|observation_value_display %}
+        [#grid(
+            columns: (1fr, 3fr),
+            row-gutter: 1.2em,
+            align: (left),
+            [Name:], "{{ observation.main_code.display }} ({{ observation.main_code.system }} {{ observation.main_code.code }})",
+            [Value:], "{{ observation|observation_value_display|field_name_to_label|format_empty_data }}",
+            {% if observation.body_site %}
+                [Body Site:], "{{ observation.body_site.display }}",
+            {% endif %}
+            [Date:], "{{ observation.effective_datetime  }}",
+            [Data Entered By:], "{{ observation.data_entered_by.fullname|default:observation.data_entered_by.username }}",
+            {% if observation.note %}
+                [Note:], "{{ observation.note }}",
+            {% endif %}
+        )],
+    {% endif %}
+{% endfor %}
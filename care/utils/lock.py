@@ -1,7 +1,31 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from uuid import uuid4
+
 from django.conf import settings
 from django.core.cache import cache
+from redis.exceptions import RedisError
 from rest_framework.exceptions import APIException
 
+logger = logging.getLogger(__name__)
+
+# Deletes / extends the lock only if it is still held by the given owner token
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+EXTEND_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
 
 class ObjectLocked(APIException):
     status_code = 423
@@ -9,18 +33,142 @@ class ObjectLocked(APIException):
     default_code = "object_locked"
 
 
+_stats = defaultdict(lambda: defaultdict(float))
+_stats_lock = threading.Lock()
+
+
+def record_lock_stats(key, *, acquired, wait_time, contended):
+    prefix = key.split(":", 2)[1]
+    with _stats_lock:
+        stats = _stats[prefix]
+        stats["acquired" if acquired else "failed"] += 1
+        stats["contended"] += contended
+        stats["wait_ms"] += wait_time * 1000
+        stats["max_wait_ms"] = max(stats["max_wait_ms"], wait_time * 1000)
+
+
+def get_lock_stats():
+    """
+    Returns the in process acquire / contention / wait counters per key prefix
+    """
+    with _stats_lock:
+        return {prefix: dict(stats) for prefix, stats in _stats.items()}
+
+
+def reset_lock_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def get_redis_client():
+    """
+    The raw redis client when the cache is backed by django-redis
+    """
+    get_client = getattr(getattr(cache, "client", None), "get_client", None)
+    return get_client(write=True) if get_client else None
+
+
 class Lock:
-    def __init__(self, key, timeout=settings.LOCK_TIMEOUT):
+    """
+    Cache based distributed lock.
+
+    Every acquisition stores a unique owner token, so that only the owner can
+    release or extend the lock, even after it expired and someone else took it.
+    `wait` is the number of seconds to keep retrying (with jittered exponential
+    backoff) when the lock is held by someone else before giving up with
+    ObjectLocked.
+    """
+
+    min_retry_interval = 0.02
+    max_retry_interval = 0.5
+
+    def __init__(self, key, timeout=settings.LOCK_TIMEOUT, wait=0):
         self.key = f"lock:{key}"
         self.timeout = timeout
+        self.wait = wait
+        self.token = None
+
+    def _run_script(self, script, *args):
+        """
+        Runs a lua script on the lock key, returns None without a redis backed
+        cache. Like the cache itself (IGNORE_EXCEPTIONS), redis being
+        unreachable is treated as the operation not going through.
+        """
+        client = get_redis_client()
+        if client is None:
+            return None
+        try:
+            return bool(client.eval(script, 1, cache.make_key(self.key), *args))
+        except RedisError:
+            logger.warning("Could not reach redis for %s", self.key, exc_info=True)
+            return False
+
+    def _try_acquire(self, token):
+        client = get_redis_client()
+        if client is None:
+            return cache.add(self.key, token, self.timeout)
+        try:
+            return bool(
+                client.set(cache.make_key(self.key), token, nx=True, ex=self.timeout)
+            )
+        except RedisError:
+            logger.warning("Could not reach redis for %s", self.key, exc_info=True)
+            return False
 
     def acquire(self):
-        if not cache.set(self.key, value=True, timeout=self.timeout, nx=True):
-            raise ObjectLocked
+        token = uuid4().hex
+        start = time.monotonic()
+        deadline = start + self.wait
+        retry_interval = self.min_retry_interval
+        contended = False
+        while not self._try_acquire(token):
+            contended = True
+            now = time.monotonic()
+            if now >= deadline:
+                record_lock_stats(
+                    self.key, acquired=False, wait_time=now - start, contended=contended
+                )
+                raise ObjectLocked
+            jitter = random.uniform(0, retry_interval)  # noqa S311
+            time.sleep(min(jitter, deadline - now))
+            retry_interval = min(retry_interval * 2, self.max_retry_interval)
+        record_lock_stats(
+            self.key,
+            acquired=True,
+            wait_time=time.monotonic() - start,
+            contended=contended,
+        )
+        self.token = token
 
     def release(self):
+        """
+        Returns False if the lock was no longer held by this owner
+        """
+        if self.token is None:
+            return False
+        token, self.token = self.token, None
+        released = self._run_script(RELEASE_SCRIPT, token)
+        if released is not None:
+            return released
+        if cache.get(self.key) != token:
+            return False
         return cache.delete(self.key)
 
+    def extend(self, timeout=None):
+        """
+        Resets the expiry of a held lock to `timeout` (defaults to the lock
+        timeout) seconds from now, for operations that outlive the lease
+        """
+        if self.token is None:
+            return False
+        timeout = timeout or self.timeout
+        extended = self._run_script(EXTEND_SCRIPT, self.token, int(timeout * 1000))
+        if extended is not None:
+            return extended
+        if cache.get(self.key) != self.token:
+            return False
+        return cache.touch(self.key, timeout)
+
     def __enter__(self):
         self.acquire()
         return self
@@ -1,10 +1,14 @@
+import enum
 import json
 import logging
+from collections import defaultdict
 
 from celery import shared_task
 from django.apps import apps
 from django.conf import settings
+from django.db.models import Q
 from pywebpush import WebPushException, webpush
+from requests import RequestException
 
 from care.facility.models.daily_round import DailyRound
 from care.facility.models.facility import Facility, FacilityUser
@@ -21,11 +25,134 @@ from care.utils.sms.send_sms import send_sms
 
 logger = logging.getLogger(__name__)
 
+# Push service replies for subscriptions that were removed / expired
+WEBPUSH_EXPIRED_STATUS_CODES = (404, 410)
+WEBPUSH_RETRY_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+WEBPUSH_RETRY_BACKOFF = 30  # seconds
+WEBPUSH_MAX_RETRY_BACKOFF = 60 * 15  # 15 Minutes
+
 
 class NotificationCreationError(Exception):
     pass
 
 
+class WebPushResult(enum.Enum):
+    SENT = "sent"
+    # The push service will not accept messages for the subscription anymore
+    EXPIRED = "expired"
+    # Transient failure, the message can be sent again later
+    RETRY = "retry"
+    FAILED = "failed"
+
+
+def has_webpush_subscription(user):
+    return bool(user.pf_endpoint and user.pf_p256dh and user.pf_auth)
+
+
+def get_webpush_failure_result(status_code):
+    """
+    Result of a message the push service rejected with `status_code`, None when
+    no response was received
+    """
+    if status_code in WEBPUSH_EXPIRED_STATUS_CODES:
+        return WebPushResult.EXPIRED
+    if status_code is None or status_code in WEBPUSH_RETRY_STATUS_CODES:
+        return WebPushResult.RETRY
+    return WebPushResult.FAILED
+
+
+def send_webpush_message(user, message):
+    """
+    Sends a web push message to the subscription of the user
+    """
+    if not has_webpush_subscription(user):
+        return WebPushResult.FAILED
+    try:
+        webpush(
+            subscription_info={
+                "endpoint": user.pf_endpoint,
+                "keys": {"p256dh": user.pf_p256dh, "auth": user.pf_auth},
+            },
+            data=message,
+            vapid_private_key=settings.VAPID_PRIVATE_KEY,
+            vapid_claims={
+                "sub": "mailto:info@ohc.network",
+            },
+        )
+    except WebPushException as ex:
+        status_code = ex.response.status_code if ex.response is not None else None
+        logger.info(
+            "Web Push to user %s failed with status %s: %s",
+            user.id,
+            status_code,
+            repr(ex),
+        )
+        return get_webpush_failure_result(status_code)
+    except RequestException as e:
+        logger.info("Web Push to user %s failed: %s", user.id, e)
+        return WebPushResult.RETRY
+    except Exception as e:
+        logger.info("Error When Doing WebPush: %s", e)
+        return WebPushResult.FAILED
+    return WebPushResult.SENT
+
+
+def get_webpush_retry_countdown(attempt):
+    return min(WEBPUSH_RETRY_BACKOFF * 2**attempt, WEBPUSH_MAX_RETRY_BACKOFF)
+
+
+@shared_task
+def send_webpush_chunk(messages, attempt=0):
+    """
+    Delivers a chunk of (user_id, message) web push messages.
+    Subscriptions are read when the chunk is sent, so that they are not carried
+    through the broker. Subscriptions the push service reports as gone are
+    removed. Messages that failed transiently are sent again with exponential
+    backoff by a task per endpoint, so that attempts are counted per endpoint
+    and a failing push service does not delay the messages of the others.
+    """
+    users = User.objects.filter(id__in={user_id for user_id, _ in messages}).only(
+        "id", "pf_endpoint", "pf_p256dh", "pf_auth"
+    )
+    users = {user.id: user for user in users}
+    retry = defaultdict(list)
+    expired = []
+    for user_id, message in messages:
+        user = users.get(user_id)
+        if not user:
+            continue
+        result = send_webpush_message(user, message)
+        if result == WebPushResult.RETRY:
+            retry[user.pf_endpoint].append((user_id, message))
+        elif result == WebPushResult.EXPIRED:
+            expired.append(user)
+    for user in expired:
+        # Unless the user subscribed again in the meantime
+        User.objects.filter(id=user.id, pf_endpoint=user.pf_endpoint).update(
+            pf_endpoint=None, pf_p256dh=None, pf_auth=None
+        )
+    for endpoint_messages in retry.values():
+        if attempt + 1 < settings.NOTIFICATION_WEBPUSH_MAX_ATTEMPTS:
+            send_webpush_chunk.apply_async(
+                args=(endpoint_messages, attempt + 1),
+                countdown=get_webpush_retry_countdown(attempt),
+            )
+        else:
+            logger.info(
+                "Dropping %s web push messages after retries", len(endpoint_messages)
+            )
+
+
+def dispatch_webpush(messages):
+    """
+    Splits (user_id, message) web push messages into chunks delivered by
+    concurrent tasks
+    """
+    chunk_size = settings.NOTIFICATION_WEBPUSH_CHUNK_SIZE
+    for start in range(0, len(messages), chunk_size):
+        send_webpush_chunk.delay(messages[start : start + chunk_size])
+
+
 @shared_task
 def notification_task_generator(**kwargs):
     NotificationGenerator(**kwargs).generate()
@@ -33,9 +160,9 @@ def notification_task_generator(**kwargs):
 
 @shared_task
 def send_webpush(**kwargs):
-    user = User.objects.get(username=kwargs.get("username"))
-    message = kwargs.get("message")
-    NotificationGenerator.send_webpush_user(None, user, message)
+    user = User.objects.filter(username=kwargs.get("username")).first()
+    if user:
+        dispatch_webpush([(user.id, kwargs.get("message"))])
 
 
 def get_model_class(model_name):
@@ -304,64 +431,40 @@ class NotificationGenerator:
         return True
 
     def generate_system_users(self):
-        users = []
-        extra_users = self.extra_users
-        caused_user = self.caused_by
-        facility_users = FacilityUser.objects.filter(facility_id=self.facility.id)
-        if self.event != Notification.Event.MESSAGE:
-            facility_users.exclude(
-                user__user_type__in=(
+        """
+        Users of the facility and the extra users to notify, in a single query
+        """
+        facility_users = Q(
+            id__in=FacilityUser.objects.filter(facility_id=self.facility.id).values(
+                "user_id"
+            )
+        )
+        if self.event != Notification.Event.MESSAGE.value:
+            facility_users &= ~Q(
+                user_type__in=(
                     User.TYPE_VALUE_MAP["Staff"],
                     User.TYPE_VALUE_MAP["StaffReadOnly"],
                 )
             )
-        for facility_user in facility_users:
-            if facility_user.user.id != caused_user.id:
-                users.append(facility_user.user)
-        for user_id in extra_users:
-            user_obj = User.objects.get(id=user_id)
-            if user_obj.id != caused_user.id:
-                users.append(user_obj)
-        return users
+        return list(
+            User.objects.filter(facility_users | Q(id__in=self.extra_users))
+            .exclude(id=self.caused_by.id)
+            .order_by("id")
+        )
 
     def generate_message_for_user(self, user, message, medium):
-        notification = Notification()
-        notification.intended_for = user
-        notification.caused_objects = self.caused_objects
-        notification.message = message
-        notification.medium_sent = medium
-        notification.event = self.event
-        notification.event_type = self.event_type
-        notification.caused_by = self.caused_by
-        notification.save()
-        return notification
-
-    def send_webpush_user(self, user, message):
-        try:
-            if user.pf_endpoint and user.pf_p256dh and user.pf_auth:
-                webpush(
-                    subscription_info={
-                        "endpoint": user.pf_endpoint,
-                        "keys": {"p256dh": user.pf_p256dh, "auth": user.pf_auth},
-                    },
-                    data=message,
-                    vapid_private_key=settings.VAPID_PRIVATE_KEY,
-                    vapid_claims={
-                        "sub": "mailto:info@ohc.network",
-                    },
-                )
-        except WebPushException as ex:
-            logger.info("Web Push Failed with Exception: %s", repr(ex))
-            if ex.response and ex.response.json():
-                extra = ex.response.json()
-                logger.info(
-                    "Remote service replied with a %s:%s, %s",
-                    extra.code,
-                    extra.errno,
-                    extra.message,
-                )
-        except Exception as e:
-            logger.info("Error When Doing WebPush: %s", e)
+        """
+        Builds the unsaved notification of the user
+        """
+        return Notification(
+            intended_for=user,
+            caused_objects=self.caused_objects,
+            message=message,
+            medium_sent=medium,
+            event=self.event,
+            event_type=self.event_type,
+            caused_by=self.caused_by,
+        )
 
     def generate(self):
         if not self.worker_initiated:
@@ -379,20 +482,31 @@ class NotificationGenerator:
             elif medium == Notification.Medium.SYSTEM.value:
                 if not self.message:
                     self.message = self.generate_system_message()
-                for user in self.generate_system_users():
-                    notification_obj = self.generate_message_for_user(
-                        user, self.message, Notification.Medium.SYSTEM.value
-                    )
-                    if not self.defer_notifications:
-                        self.send_webpush_user(
-                            user,
+                users = self.generate_system_users()
+                notifications = Notification.objects.bulk_create(
+                    [
+                        self.generate_message_for_user(
+                            user, self.message, Notification.Medium.SYSTEM.value
+                        )
+                        for user in users
+                    ]
+                )
+                if self.defer_notifications:
+                    continue
+                event_name = Notification.Event(self.event).name
+                dispatch_webpush(
+                    [
+                        (
+                            user.id,
                             json.dumps(
                                 {
-                                    "external_id": str(notification_obj.external_id),
+                                    "external_id": str(notification.external_id),
                                     "message": self.message,
-                                    "type": Notification.Event(
-                                        notification_obj.event
-                                    ).name,
+                                    "type": event_name,
                                 }
                             ),
                         )
+                        for user, notification in zip(users, notifications, strict=True)
+                        if has_webpush_subscription(user)
+                    ]
+                )
@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from faker import Faker
 from model_bakery import baker
 from rest_framework.test import APITestCase
@@ -80,3 +82,25 @@ class CareAPITestBase(APITestCase):
         FacilityOrganizationUser.objects.create(
             organization=organization, user=user, role=role
         )
+
+    def assert_list_queries_constant(self, url, create_object, rows=3):
+        """
+        Fails when the number of queries of a list endpoint grows with the
+        number of rows it returns, ie. when serializing a row queries the database
+        """
+        create_object()
+        with CaptureQueriesContext(connection) as single_row:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for _ in range(rows - 1):
+            create_object()
+        with CaptureQueriesContext(connection) as many_rows:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), rows)
+        self.assertLessEqual(
+            len(many_rows),
+            len(single_row),
+            "Queries grow with the number of rows:\n"
+            + "\n".join(query["sql"] for query in many_rows.captured_queries),
+        )
@@ -0,0 +1,109 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from care.utils.lock import Lock, ObjectLocked, get_lock_stats, reset_lock_stats
+
+
+@override_settings(CACHES={"default": {"BACKEND": "config.caches.LocMemCache"}})
+class LockTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        reset_lock_stats()
+
+    def test_held_lock_is_exclusive(self):
+        with Lock("test:1"):
+            with self.assertRaises(ObjectLocked):
+                Lock("test:1").acquire()
+            # Other keys are independent
+            with Lock("test:2"):
+                pass
+        with Lock("test:1"):
+            pass
+
+    def test_only_owner_releases(self):
+        lock = Lock("test:1")
+        lock.acquire()
+        # The lock expired and was taken by someone else
+        cache.delete(lock.key)
+        other = Lock("test:1")
+        other.acquire()
+        self.assertFalse(lock.release())
+        self.assertFalse(lock.extend())
+        with self.assertRaises(ObjectLocked):
+            Lock("test:1").acquire()
+        self.assertTrue(other.extend())
+        self.assertTrue(other.release())
+        self.assertFalse(other.release())
+
+    def test_lock_expires_after_timeout(self):
+        Lock("test:1", timeout=1).acquire()
+        time.sleep(1.1)
+        with Lock("test:1"):
+            pass
+
+    def test_wait_gives_up_after_deadline(self):
+        Lock("test:1").acquire()
+        start = time.monotonic()
+        with self.assertRaises(ObjectLocked):
+            Lock("test:1", wait=0.2).acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_wait_acquires_once_released(self):
+        lock = Lock("test:1")
+        lock.acquire()
+        timer = threading.Timer(0.1, lock.release)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        with Lock("test:1", wait=5):
+            pass
+
+    def test_contention_stats(self):
+        with Lock("test:1"), self.assertRaises(ObjectLocked):
+            Lock("test:1", wait=0.05).acquire()
+        Lock("other:1").acquire()
+        stats = get_lock_stats()
+        self.assertEqual(stats["test"]["acquired"], 1)
+        self.assertEqual(stats["test"]["failed"], 1)
+        self.assertEqual(stats["test"]["contended"], 1)
+        self.assertGreaterEqual(stats["test"]["max_wait_ms"], 50)
+        self.assertEqual(stats["other"]["contended"], 0)
+
+
+class RedisLockTest(SimpleTestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        patcher = patch("care.utils.lock.get_redis_client", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_owner_token_used_for_release(self):
+        self.client.set.return_value = True
+        self.client.eval.return_value = 1
+        lock = Lock("test:1")
+        lock.acquire()
+        token = self.client.set.call_args.args[1]
+        self.assertTrue(lock.release())
+        self.assertEqual(self.client.eval.call_args.args[-1], token)
+
+    def test_unreachable_redis_is_not_acquired(self):
+        self.client.set.side_effect = RedisConnectionError
+        with (
+            self.assertLogs("care.utils.lock", "WARNING"),
+            self.assertRaises(ObjectLocked),
+        ):
+            Lock("test:1").acquire()
+
+    def test_unreachable_redis_on_release(self):
+        self.client.set.return_value = True
+        self.client.eval.side_effect = RedisConnectionError
+        lock = Lock("test:1")
+        lock.acquire()
+        with self.assertLogs("care.utils.lock", "WARNING") as logs:
+            self.assertFalse(lock.extend())
+            self.assertFalse(lock.release())
+        self.assertEqual(len(logs.records), 2)
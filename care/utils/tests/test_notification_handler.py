@@ -0,0 +1,164 @@
+from unittest.mock import Mock, call, patch
+
+from django.test import override_settings
+from pywebpush import WebPushException
+from requests import ConnectionError as RequestsConnectionError
+
+from care.facility.models.facility import FacilityUser
+from care.facility.models.notification import Notification
+from care.users.models import User
+from care.utils import notification_handler
+from care.utils.notification_handler import (
+    NotificationGenerator,
+    WebPushResult,
+    send_webpush_chunk,
+    send_webpush_message,
+)
+from care.utils.tests.base import CareAPITestBase
+
+
+def push_error(status_code):
+    response = Mock(status_code=status_code) if status_code else None
+    return WebPushException("Push failed", response=response)
+
+
+class TestNotificationRecipients(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.caused_by = self.create_user()
+        self.facility = self.create_facility(user=self.caused_by)
+        self.doctor = self.create_user(user_type=User.TYPE_VALUE_MAP["Doctor"])
+        self.staff = self.create_user(user_type=User.TYPE_VALUE_MAP["Staff"])
+        self.extra_user = self.create_user()
+        for user in (self.caused_by, self.doctor, self.staff):
+            FacilityUser.objects.get_or_create(
+                facility=self.facility, user=user, created_by=self.caused_by
+            )
+
+    def get_recipients(self, event):
+        generator = NotificationGenerator(
+            event=event.value,
+            caused_by=self.caused_by.id,
+            caused_object="User",
+            caused_object_pk=self.doctor.id,
+            facility=self.facility.id,
+            worker_initated=True,
+        )
+        generator.extra_users = [self.extra_user.id]
+        return set(generator.generate_system_users())
+
+    def test_staff_excluded_for_events(self):
+        self.assertEqual(
+            self.get_recipients(Notification.Event.PATIENT_UPDATED),
+            {self.doctor, self.extra_user},
+        )
+
+    def test_staff_included_for_messages(self):
+        self.assertEqual(
+            self.get_recipients(Notification.Event.MESSAGE),
+            {self.doctor, self.staff, self.extra_user},
+        )
+
+    def test_caused_by_excluded_when_extra_user(self):
+        generator = NotificationGenerator(
+            event=Notification.Event.MESSAGE.value,
+            caused_by=self.caused_by.id,
+            caused_object="User",
+            caused_object_pk=self.doctor.id,
+            facility=self.facility.id,
+            worker_initated=True,
+        )
+        generator.extra_users = [self.caused_by.id]
+        self.assertNotIn(self.caused_by, generator.generate_system_users())
+
+
+@patch.object(notification_handler, "webpush")
+class TestWebPush(CareAPITestBase):
+    def create_subscriber(self, endpoint):
+        return self.create_user(
+            pf_endpoint=endpoint, pf_p256dh="p256dh", pf_auth="auth"
+        )
+
+    def test_message_results(self, webpush):
+        user = self.create_subscriber("https://push.example.com/1")
+        self.assertEqual(send_webpush_message(user, "{}"), WebPushResult.SENT)
+        for error, result in (
+            (push_error(410), WebPushResult.EXPIRED),
+            (push_error(404), WebPushResult.EXPIRED),
+            (push_error(503), WebPushResult.RETRY),
+            (push_error(429), WebPushResult.RETRY),
+            (push_error(None), WebPushResult.RETRY),
+            (push_error(400), WebPushResult.FAILED),
+            (RequestsConnectionError(), WebPushResult.RETRY),
+        ):
+            webpush.side_effect = error
+            self.assertEqual(send_webpush_message(user, "{}"), result)
+
+    def test_message_without_subscription(self, webpush):
+        user = self.create_user(pf_endpoint=None)
+        self.assertEqual(send_webpush_message(user, "{}"), WebPushResult.FAILED)
+        webpush.assert_not_called()
+
+    @override_settings(NOTIFICATION_WEBPUSH_MAX_ATTEMPTS=3)
+    def test_chunk_removes_expired_and_retries_transient(self, webpush):
+        sent = self.create_subscriber("https://push.example.com/sent")
+        expired = self.create_subscriber("https://push.example.com/expired")
+        retried = self.create_subscriber("https://push.example.com/retried")
+        errors = {
+            expired.pf_endpoint: push_error(410),
+            retried.pf_endpoint: push_error(503),
+        }
+
+        def fake_webpush(subscription_info, **kwargs):
+            error = errors.get(subscription_info["endpoint"])
+            if error:
+                raise error
+
+        webpush.side_effect = fake_webpush
+        messages = [(sent.id, "a"), (expired.id, "b"), (retried.id, "c")]
+        with patch.object(send_webpush_chunk, "apply_async") as apply_async:
+            send_webpush_chunk(messages)
+        apply_async.assert_called_once_with(
+            args=([(retried.id, "c")], 1),
+            countdown=notification_handler.WEBPUSH_RETRY_BACKOFF,
+        )
+        expired.refresh_from_db()
+        self.assertIsNone(expired.pf_endpoint)
+        retried.refresh_from_db()
+        self.assertEqual(retried.pf_endpoint, "https://push.example.com/retried")
+
+        # The last attempt drops the messages
+        with patch.object(send_webpush_chunk, "apply_async") as apply_async:
+            send_webpush_chunk([(retried.id, "c")], attempt=2)
+        apply_async.assert_not_called()
+
+    @override_settings(NOTIFICATION_WEBPUSH_MAX_ATTEMPTS=3)
+    def test_chunk_retries_each_endpoint_on_its_own(self, webpush):
+        first = self.create_subscriber("https://push.example.com/first")
+        second = self.create_subscriber("https://push.example.com/second")
+        webpush.side_effect = push_error(503)
+        messages = [(first.id, "a"), (second.id, "b"), (first.id, "c")]
+        with patch.object(send_webpush_chunk, "apply_async") as apply_async:
+            send_webpush_chunk(messages, attempt=1)
+        countdown = notification_handler.get_webpush_retry_countdown(1)
+        self.assertEqual(
+            apply_async.call_args_list,
+            [
+                call(args=([(first.id, "a"), (first.id, "c")], 2), countdown=countdown),
+                call(args=([(second.id, "b")], 2), countdown=countdown),
+            ],
+        )
+
+    def test_expired_subscription_kept_when_resubscribed(self, webpush):
+        user = self.create_subscriber("https://push.example.com/old")
+
+        def resubscribe(**kwargs):
+            User.objects.filter(id=user.id).update(
+                pf_endpoint="https://push.example.com/new"
+            )
+            raise push_error(410)
+
+        webpush.side_effect = resubscribe
+        send_webpush_chunk([(user.id, "a")])
+        user.refresh_from_db()
+        self.assertEqual(user.pf_endpoint, "https://push.example.com/new")
@@ -73,6 +73,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # timeout for setnx lock
 LOCK_TIMEOUT = env.int("LOCK_TIMEOUT", default=32)
+# Seconds a request waits for a lock held by another request before failing
+LOCK_WAIT = env.int("LOCK_WAIT", default=5)
 
 REDIS_URL = env("REDIS_URL", default="redis://localhost:6379")
 
@@ -204,6 +206,7 @@ MIDDLEWARE = [
     "simple_history.middleware.HistoryRequestMiddleware",
     "maintenance_mode.middleware.MaintenanceModeMiddleware",
     "care.audit_log.middleware.AuditLogMiddleware",
+    "care.security.middleware.AuthorizationMemoMiddleware",
 ]
 
 # add RequestTimeLoggingMiddleware based on the environment variable
@@ -466,6 +469,10 @@ HEALTHY_DJANGO = [
 # Audit logs
 # ------------------------------------------------------------------------------
 AUDIT_LOG_ENABLED = env.bool("AUDIT_LOG_ENABLED", default=False)
+# Write the audit events of a request from a background thread once it ends
+AUDIT_LOG_BACKGROUND_WRITER = env.bool("AUDIT_LOG_BACKGROUND_WRITER", default=True)
+# Instances snapshotted on load per request, the diff of the others reads their row
+AUDIT_LOG_MAX_SNAPSHOTS = env.int("AUDIT_LOG_MAX_SNAPSHOTS", default=1000)
 AUDIT_LOG = {
     "globals": {
         "exclude": {
@@ -493,7 +500,9 @@ AUDIT_LOG = {
                 ],
                 "facility.PatientExternalTest": ["name", "address", "mobile_number"],
             },
-        }
+        },
+        # Fraction of the events logged per model, eg. {"plain:emr.Observation": 0.1}
+        "sample_rates": {},
     },
 }
 
@@ -537,6 +546,12 @@ VAPID_PUBLIC_KEY = env(
 VAPID_PRIVATE_KEY = env(
     "VAPID_PRIVATE_KEY", default="7mf3OFreFsgFF4jd8A71ZGdVaj8kpJdOto4cFbfAS-s"
 )
+# Number of web push messages delivered by a single task of a notification fan-out
+NOTIFICATION_WEBPUSH_CHUNK_SIZE = env.int("NOTIFICATION_WEBPUSH_CHUNK_SIZE", default=50)
+# Attempts at delivering a web push message before it is dropped
+NOTIFICATION_WEBPUSH_MAX_ATTEMPTS = env.int(
+    "NOTIFICATION_WEBPUSH_MAX_ATTEMPTS", default=5
+)
 SEND_SMS_NOTIFICATION = False
 NOTIFICATION_RETENTION_DAYS = env.int("NOTIFICATION_RETENTION_DAYS", default=30)
 
@@ -719,6 +734,44 @@ MIDDLEWARE_REQUEST_TIMEOUT = env.int("MIDDLEWARE_REQUEST_TIMEOUT", 20)
 SNOWSTORM_DEPLOYMENT_URL = env(
     "SNOWSTORM_DEPLOYMENT_URL", default="http://165.22.211.144/fhir"
 )
+# Terminology server client, see care.emr.fhir.client.FHIRClient
+SNOWSTORM_CONNECT_TIMEOUT = env.float("SNOWSTORM_CONNECT_TIMEOUT", default=5)
+SNOWSTORM_READ_TIMEOUT = env.float("SNOWSTORM_READ_TIMEOUT", default=60)
+SNOWSTORM_POOL_SIZE = env.int("SNOWSTORM_POOL_SIZE", default=10)
+SNOWSTORM_MAX_RETRIES = env.int("SNOWSTORM_MAX_RETRIES", default=2)
+SNOWSTORM_CIRCUIT_FAILURE_THRESHOLD = env.int(
+    "SNOWSTORM_CIRCUIT_FAILURE_THRESHOLD", default=5
+)
+SNOWSTORM_CIRCUIT_RESET_TIMEOUT = env.int("SNOWSTORM_CIRCUIT_RESET_TIMEOUT", default=30)
+# Number of code systems of a value set queried concurrently
+SNOWSTORM_MAX_CONCURRENCY = env.int("SNOWSTORM_MAX_CONCURRENCY", default=4)
+
+# Terminology server response cache, see care.emr.fhir.cache
+FHIR_LOCAL_CACHE_SIZE = env.int("FHIR_LOCAL_CACHE_SIZE", default=1024)
+FHIR_LOCAL_CACHE_TTL = env.int("FHIR_LOCAL_CACHE_TTL", default=60)
+FHIR_CACHE_DEFAULT_TTL = env.int("FHIR_CACHE_DEFAULT_TTL", default=60 * 60)
+FHIR_CACHE_TTLS = {
+    "ValueSet/$expand": env.int("FHIR_CACHE_EXPAND_TTL", default=6 * 60 * 60),
+    "ValueSet/$validate-code": env.int(
+        "FHIR_CACHE_VALIDATE_CODE_TTL", default=24 * 60 * 60
+    ),
+    "CodeSystem/$lookup": env.int("FHIR_CACHE_LOOKUP_TTL", default=24 * 60 * 60),
+}
+FHIR_CACHE_STALE_TTL = env.int("FHIR_CACHE_STALE_TTL", default=24 * 60 * 60)
+FHIR_CACHE_NEGATIVE_TTL = env.int("FHIR_CACHE_NEGATIVE_TTL", default=60)
+
+# Maximum number of sub-requests in a batch request and the number of threads used
+# to run the read only sub-requests of a batch concurrently
+BATCH_REQUEST_MAX_REQUESTS = env.int("BATCH_REQUEST_MAX_REQUESTS", default=20)
+BATCH_REQUEST_READ_WORKERS = env.int("BATCH_REQUEST_READ_WORKERS", default=4)
+
+# Number of days ahead the TokenSlots of every schedulable resource are created
+SLOT_MATERIALIZE_DAYS = env.int("SLOT_MATERIALIZE_DAYS", default=14)
+
+# Collect per spec serialize / de_serialize timings, see care.emr.resources.timing
+SPEC_TIMING_ENABLED = env.bool("SPEC_TIMING_ENABLED", default=False)
 
 # Path to the typst binary, see scripts/install_typst.sh
 TYPST_BIN = env("TYPST_BIN", default="typst")
+# Number of typst processes a worker runs in parallel for batches of reports
+TYPST_RENDER_WORKERS = env.int("TYPST_RENDER_WORKERS", default=4)
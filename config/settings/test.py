@@ -45,6 +45,8 @@ CACHES = {
         "BACKEND": "config.caches.DummyCache",
     }
 }
+# the terminology cache has an in process tier that outlives the dummy cache
+FHIR_LOCAL_CACHE_SIZE = 0
 # for testing retelimit use override_settings decorator
 SILENCED_SYSTEM_CHECKS = ["django_ratelimit.E003", "django_ratelimit.W001"]
 
@@ -79,6 +81,11 @@ LOGGING = {
 
 CELERY_TASK_ALWAYS_EAGER = True
 
+# test data lives in the test transaction, worker threads cannot see it
+BATCH_REQUEST_READ_WORKERS = 1
+
+AUDIT_LOG_BACKGROUND_WRITER = False
+
 
 # open id connect
 JWKS = JsonWebKey.import_key_set(